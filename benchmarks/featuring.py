@@ -0,0 +1,72 @@
+"""Compares the per-song featuring lookup with the batched one on a big playlist.
+
+Usage:
+  python -m benchmarks.featuring [<songs>]
+
+Options:
+  <songs>  The amount of songs in the playlist [default: 10000].
+"""
+import os
+import sys
+import tempfile
+import time
+
+from libs.database import DBMuziek
+
+SONGS = 10000
+
+
+def populate(db: DBMuziek, amount: int) -> int:
+    groups = [db.create_group(f"Group {i}", [f"Member {i}"]) for i in range(100)]
+    playlist_id = db.create_playlist("Benchmark", "bench")
+
+    for i in range(amount):
+        featuring = [groups[(i + 1) % len(groups)]] if i % 3 == 0 else []
+        song_id = db.create_song(f"Song {i}", "link", "Genre", 200, groups[i % len(groups)], featuring)
+        db.add_song_playlist(playlist_id, song_id)
+
+    db.commit()
+    return playlist_id
+
+
+def per_song(db: DBMuziek, playlist_id: int):
+    songs = list(map(dict, db.execute("""
+        SELECT p.song_id as song_id, s.name as song_name, duration, g.name as group_name, link, genre
+            FROM playlistSongs as p
+                LEFT JOIN songs AS s ON s.song_id = p.song_id
+                LEFT JOIN groups AS g ON g.group_id = s.group_id
+            WHERE p.playlist_id = ?;""", (playlist_id,)).fetchall()))
+
+    for song in songs:
+        song["featuring"] = db.get_song_featuring(song["song_id"])
+
+    return songs
+
+
+def batched(db: DBMuziek, playlist_id: int):
+    return db.get_playlist_songs(playlist_id)
+
+
+def measure(db: DBMuziek, name: str, function, playlist_id: int):
+    statements = []
+    db.connection.set_trace_callback(statements.append)
+
+    start = time.perf_counter()
+    songs = function(db, playlist_id)
+    elapsed = time.perf_counter() - start
+
+    db.connection.set_trace_callback(None)
+    print(f"{name:>10}: {len(statements):>6} queries, {elapsed * 1000:>8.1f} ms for {len(songs)} songs")
+
+
+def main(amount: int):
+    with tempfile.TemporaryDirectory() as folder:
+        with DBMuziek(os.path.join(folder, "bench.db")) as db:
+            playlist_id = populate(db, amount)
+
+            measure(db, "per song", per_song, playlist_id)
+            measure(db, "batched", batched, playlist_id)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SONGS)
@@ -0,0 +1,42 @@
+"""Measures the import of a big exported playlist.
+
+Usage:
+  python -m benchmarks.import_playlist [<songs>]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from libs.console_interface import utils
+from libs.database import DBMuziek
+
+
+def export_code(amount: int) -> str:
+    groups = [{"name": f"Group {i}", "members": [f"Member {i}"]} for i in range(amount // 10 + 1)]
+    songs = [{
+        "group_name": groups[i % len(groups)]["name"],
+        "song_name": f"Song {i}",
+        "link": f"https://www.youtube.com/watch?v={i:011d}",
+        "genre": "Genre",
+        "duration": 200,
+        "featuring": [groups[(i + 1) % len(groups)]["name"]] if i % 4 == 0 else []
+    } for i in range(amount)]
+
+    return utils.encode({"groups": groups, "songs": songs, "playlist": {"author": "bench"}})
+
+
+def main(amount: int):
+    code = export_code(amount)
+
+    with tempfile.TemporaryDirectory() as folder:
+        with DBMuziek(os.path.join(folder, "bench.db")) as db:
+            start = time.perf_counter()
+            with db.connection:
+                utils.import_playlist(db, code, "Imported")
+            elapsed = time.perf_counter() - start
+            print(f"{amount} songs imported in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
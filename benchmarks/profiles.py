@@ -0,0 +1,78 @@
+"""Compares the write and read throughput of the connection profiles on a big library.
+
+Usage:
+  python -m benchmarks.profiles [<songs>]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from libs.database import PROFILES, DBMuziek
+
+
+def writes(db: DBMuziek, amount: int) -> int:
+    """Creates the songs in small transactions, like the application does."""
+    groups = [db.create_group(f"Group {i}", [f"Member {i}"]) for i in range(100)]
+    db.commit()
+
+    for i in range(amount):
+        db.create_song(f"Song {i}", "link", "Genre", 200, groups[i % len(groups)], [])
+        if i % 100 == 99:
+            db.commit()
+    db.commit()
+
+    return amount
+
+
+def single_writes(db: DBMuziek, amount: int) -> int:
+    """Commits after every song, like the interactive commands do."""
+    for i in range(amount):
+        db.create_song(f"Single {i}", "link", "Genre", 200, 1, [])
+        db.commit()
+
+    return amount
+
+
+def reads(db: DBMuziek, amount: int) -> int:
+    for song_id in random.sample(range(1, amount + 1), 20000):
+        db.get_song(song_id=song_id)
+
+    return 20000
+
+
+def pages(db: DBMuziek, amount: int) -> int:
+    total = 0
+    songs, cursor = db.get_songs_after(limit=500)
+    while cursor:
+        total += len(songs)
+        songs, cursor = db.get_songs_after(cursor=cursor, limit=500)
+
+    return total + len(songs)
+
+
+def measure(name: str, function, db: DBMuziek, amount: int):
+    start = time.perf_counter()
+    count = function(db, amount)
+    elapsed = time.perf_counter() - start
+    print(f"  {name:>14}: {count / elapsed:>10.0f} ops/s ({elapsed:.2f} s)")
+
+
+def main(amount: int):
+    random.seed(42)
+    for profile in PROFILES:
+        print(f"Profile {profile}:")
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "bench.db")
+            with DBMuziek(path, profile) as db:
+                measure("writes", writes, db, amount)
+                measure("single writes", single_writes, db, min(amount, 2000))
+
+            with DBMuziek(path) as db:
+                measure("random reads", reads, db, amount)
+                measure("paged reads", pages, db, amount)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,57 @@
+"""Compares the LIKE filters with the full-text search index on a big library.
+
+Usage:
+  python -m benchmarks.search [<songs>]
+"""
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+from libs.database import DBMuziek
+
+
+def word(length: int = 7) -> str:
+    return ''.join(random.choices(string.ascii_lowercase, k=length))
+
+
+def populate(db: DBMuziek, amount: int):
+    groups = [(i, f"{word()} {word(4)}", word()) for i in range(1, amount // 10 + 2)]
+    db.connection.executemany("INSERT INTO groups(group_id, name, members) VALUES (?, ?, ?);", groups)
+    db.connection.executemany(
+        "INSERT INTO songs(name, link, genre, group_id, duration) VALUES (?, 'link', ?, ?, 200);",
+        ((f"{word()} {word(5)}", random.choice(["rock", "pop", "jazz"]), random.randint(1, len(groups)))
+         for _ in range(amount))
+    )
+    db.commit()
+
+
+def measure(db: DBMuziek, name: str, function, repeat: int = 5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{name:>24}: {elapsed * 1000:>9.2f} ms ({result})")
+
+
+def main(amount: int):
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as folder:
+        with DBMuziek(os.path.join(folder, "bench.db")) as db:
+            start = time.perf_counter()
+            populate(db, amount)
+            print(f"{amount} songs indexed in {time.perf_counter() - start:.1f} s")
+
+            name = db.get_songs(limit=1, offset=amount // 2)[0]["song_name"][:5]
+            for indexed in (False, True):
+                db._search = indexed
+                label = "fts" if indexed else "like"
+                measure(db, f"{label} count name", lambda: db.count_songs({"name": name}))
+                measure(db, f"{label} first page name", lambda: len(db.get_songs({"name": name}, limit=20)))
+                measure(db, f"{label} search", lambda: len(db.search(name, limit=20)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -1,15 +1,19 @@
+import sys
 from typing import List, Optional
 
 from ..logger import get_logger
-from ..database import DBMuziek
-from ..downloader import SongDownloader
+from ..database import DBMuziek, name_key
+from ..database.pager import SongPager
+from ..downloader.manager import downloaders
+from ..downloader.scheduler import DOWNLOAD_WORKERS, FETCH_WORKERS, TRANSCODE_WORKERS, DownloadScheduler
 from ..youtube_api import YoutubeAPI
+from ..youtube_api.sync import sync_playlist
 from . import utils
 
 logger = get_logger("cli")
 
 
-def add_song(db: DBMuziek, name: Optional[str] = None, group_id: Optional[int] = None):
+def add_song(db: DBMuziek, name: Optional[str] = None, group_id: Optional[int] = None, refresh: bool = False):
     """Add a song to the database and ask the user for the needed info.
         There's also the option to modify a song that already exists in the database,
         and to create the group if it doesn't exist yet.
@@ -18,6 +22,7 @@ def add_song(db: DBMuziek, name: Optional[str] = None, group_id: Optional[int] =
     :param db: The database used.
     :param name: The name of the song. Optional.
     :param group_id: The name of the group who made the song. Optional.
+    :param refresh: If the video information should be fetched again instead of being read from the cache.
     :PRE: The database object needs to be connected.
     :POST: Asks the user of the relevant info and creates/modifies a song.
            Returns the id of the created/modified song. None if nothing was created/modified.
@@ -49,10 +54,12 @@ def add_song(db: DBMuziek, name: Optional[str] = None, group_id: Optional[int] =
             return song["song_id"]
 
     link = ""
-    downloader = SongDownloader()
+    video_info = None
     while not link:
         link = utils.question("Youtube link", song["link"] if song else None)
-        if not (downloader.fetch_song(link)):
+        with downloaders.lease() as downloader:
+            video_info = downloader.fetch_song(link, refresh)
+        if not video_info:
             print("No video could be found with the provided link.")
             link = ""
 
@@ -80,25 +87,27 @@ def add_song(db: DBMuziek, name: Optional[str] = None, group_id: Optional[int] =
 
     with db.connection:
         if update == 'y':
-            db.update_song(song["song_id"], link, genre, downloader['duration'], featuring)
+            db.update_song(song["song_id"], link, genre, video_info['duration'], featuring)
             song_id = song["song_id"]
             logger.info(f"The song {name} has been updated.")
 
-            if downloader.is_downloaded(song_id):
+            if downloaders.get().is_downloaded(song_id):
                 download = utils.question_choice("Do you want to redownload the song?", ['y', 'n'])
                 if download == 'n':
-                    downloader.update_metadata(db.get_song(name, group_id))
+                    downloaders.get().update_metadata(db.get_song(name, group_id), defer=True)
                     logger.info(f"The metadata of the local song {name} has been updated.")
             else:
                 download = utils.question_choice("Do you want to download the song?", ['y', 'n'])
 
         else:
-            song_id = db.create_song(name, link, genre, downloader['duration'], group_id, featuring)
+            song_id = db.create_song(name, link, genre, video_info['duration'], group_id, featuring)
             logger.info(f"The song {name} has been added with the ID {song_id}.")
             download = utils.question_choice("Do you want to download the song?", ['y', 'n'])
 
     if download == 'y':
-        downloader.download_song(db.get_song(name, group_id))
+        utils.configure_throttle(db)
+        with downloaders.lease(utils.download_config(db)) as downloader:
+            downloader.download_song(db.get_song(name, group_id), video_info)
         print("Download complete.")
         logger.info(f"The song {name} has been downloaded.")
     return song_id
@@ -266,14 +275,13 @@ def list_songs(db: DBMuziek, filters: Optional[dict] = None):
     :POST: Shows all the songs that match the filters.
     """
     # Make pages of 20 songs
-    pages, rem = divmod(db.count_songs(filters), 20)
-    pages += rem > 0  # then add the last page if there are remaining songs
+    pager = SongPager(db, filters, per_page=20)
 
     page = 0
     while page > -1:
-        songs = db.get_songs(filters, offset=page * 20, limit=20)
+        songs = pager.page(page)
         utils.display_songs(songs)
-        page = utils.pagination(pages, page + 1) - 1
+        page = utils.pagination(pager.pages, page + 1) - 1
 
 
 def list_group(db: DBMuziek, name: str):
@@ -374,30 +382,30 @@ def list_playlists(db: DBMuziek):
         print(f" \"{playlist['playlist_name']}\" created by {playlist['author']}")
 
 
-def download_song(db: DBMuziek, name: str, group_id: Optional[int] = None):
+def download_song(db: DBMuziek, name: str, group_id: Optional[int] = None, refresh: bool = False):
     """Downloads the song requested based on the url stored in the database.
 
     :author: Carlos
     :param db: The database used.
     :param name: Name of the song to download.
     :param group_id: Id of the group. Optional.
+    :param refresh: If the video information should be fetched again instead of being read from the cache.
     :PRE: The database object needs to be connected.
     :POST: The song requested is downloaded.
     """
-    downloader = SongDownloader()
-
     song_query = utils.choose_song(db.get_song(name, group_id))
     if not song_query:
         reply = utils.question_choice(f'The song "{name}" doesn\'t. exist yet. Do you want to create it?',
                                       ['y', 'n'])
         if reply == 'y':
-            return add_song(db, name)
+            return add_song(db, name, refresh=refresh)
         else:
             return None
 
     print('Checking if the link is valid...')
 
-    video_info = downloader.fetch_song(song_query["link"])
+    with downloaders.lease() as downloader:
+        video_info = downloader.fetch_song(song_query["link"], refresh)
     if not video_info:
         print("No video could be found with the provided link. Modify the song entry to change it.")
         return None
@@ -408,30 +416,36 @@ def download_song(db: DBMuziek, name: str, group_id: Optional[int] = None):
 
     print('Checking if the song has already been downloaded...')
 
-    if downloader.is_downloaded(song_query["song_id"]):
+    if downloaders.get().is_downloaded(song_query["song_id"]):
         reply = utils.question_choice(f'The song {name} has already been downloaded. Do you want to override it?',
                                       ['y', 'n'])
         if reply == "n":
             return None
         else:
-            downloader.delete_song(song_query["song_id"])
+            downloaders.get().delete_song(song_query["song_id"])
 
     print(f'The video called {video_info["title"]} is being downloaded...')
+    utils.configure_throttle(db)
 
-    downloader.download_song(song_query)
+    with downloaders.lease(utils.download_config(db)) as downloader:
+        downloader.download_song(song_query, video_info)
 
     print("Download complete.")
     logger.info(f'The song {name} has been downloaded.')
 
 
-def download_playlist(db: DBMuziek, name: str):
+def download_playlist(db: DBMuziek, name: str, refresh: bool = False):
     """Downloads the playlist requested based on the urls stored in the database.
 
     :author: Carlos
     :param db: The database used.
     :param name: Name of the playlist to download.
+    :param refresh: If the videos information should be fetched again instead of being read from the cache.
     :PRE: The database object needs to be connected.
-    :POST: All the songs in the playlist are downloaded
+    :POST: All the songs in the playlist are downloaded, several at once.
+           The concurrency of each stage can be changed with the settings "download.fetchers",
+           "download.downloaders" and "download.transcoders", the audio format with "download.codec"
+           and "download.preset", the bandwidth and the requests with the ones of utils.configure_throttle.
     """
     playlist_query = db.get_playlist(name)
     if not playlist_query:
@@ -442,8 +456,103 @@ def download_playlist(db: DBMuziek, name: str):
         print(f"The playlist {name} is empty.")
         return
 
-    for song in songs:
-        download_song(db, song["song_name"], song["group_id"])
+    downloaded = sum(downloaders.get().is_downloaded(song["song_id"]) for song in songs)
+    overwrite = False
+    if downloaded:
+        reply = utils.question_choice(f'{downloaded} songs have already been downloaded. Do you want to override them?',
+                                      ['y', 'n'])
+        overwrite = reply == 'y'
+
+    utils.configure_throttle(db)
+    scheduler = DownloadScheduler(
+        utils.download_config(db),
+        fetchers=int(db.get_setting("download.fetchers", FETCH_WORKERS)),
+        downloaders=int(db.get_setting("download.downloaders", DOWNLOAD_WORKERS)),
+        transcoders=int(db.get_setting("download.transcoders", TRANSCODE_WORKERS)),
+        refresh=refresh
+    )
+    results = scheduler.run(songs, overwrite, sys.stdout)
+
+    with db.connection:
+        for result in results:
+            song = result.song
+            if result.duration is not None and song["duration"] != result.duration:
+                db.update_song(song["song_id"], song["link"], song["genre"], result.duration)
+
+    failed = [result for result in results if result.failed]
+    for result in failed:
+        print(f" {result.song['song_name']} - {result.song['group_name']}: {result.error}")
+
+
+def verify_downloads(db: DBMuziek):
+    """Checks the index of the songs downloaded against the files stored, and fixes it.
+
+    :param db: The database used.
+    :PRE: The database object needs to be connected.
+    :POST: The index matches the files, what changed is displayed.
+    """
+    report = downloaders.get().verify_downloads()
+
+    total = sum(len(song_ids) for song_ids in report.values())
+    print(f"{total} songs checked: {len(report['ok'])} ok, {len(report['missing'])} missing, "
+          f"{len(report['untracked'])} untracked, {len(report['modified'])} modified, "
+          f"{len(report['partial'])} partially downloaded.")
+
+    labels = {
+        "missing": "The file has been removed",
+        "untracked": "The file wasn't indexed",
+        "modified": "The file has been modified"
+    }
+    for outcome, label in labels.items():
+        for song_id in report[outcome]:
+            song = db.get_song(song_id=song_id)
+            name = f"{song['song_name']} - {song['group_name']}" if song else f"Unknown song {song_id}"
+            print(f" {name}: {label}.")
+
+    stored = [*report["ok"], *report["untracked"], *report["modified"]]
+    orphans = [song_id for song_id in stored if db.get_song(song_id=song_id) is None]
+    if orphans:
+        print(f"{len(orphans)} songs stored aren't in the database anymore: {', '.join(map(str, orphans))}.")
+
+
+def downloads_space(db: DBMuziek):
+    """Displays the space taken by the songs downloaded, and the space saved by the songs sharing their video.
+
+    :param db: The database used.
+    :PRE: The database object needs to be connected.
+    :POST: The space used is displayed.
+    """
+    report = downloaders.get().downloads_space()
+
+    print(f"{report['songs']} songs stored, {report['disk'] / 1024 / 1024:.1f} MiB on disk.")
+    print(f"{report['shared']} songs share their file with another one, "
+          f"{report['reclaimed'] / 1024 / 1024:.1f} MiB reclaimed.")
+
+
+def retag_songs(db: DBMuziek):
+    """Writes the tags of every song downloaded from the information stored in the database, several at once.
+
+    :param db: The database used.
+    :PRE: The database object needs to be connected.
+    :POST: The tags of the songs match the database, the files already matching aren't rewritten.
+    """
+    downloader = downloaders.get()
+    songs = []
+    cursor = None
+    while True:
+        page, cursor = db.get_songs_after(cursor=cursor, limit=500)
+        songs.extend(song for song in page if downloader.is_downloaded(song["song_id"]))
+        if cursor is None:
+            break
+
+    print(f"Checking the tags of {len(songs)} songs...")
+    report = downloader.retag(songs)
+    print(f"{len(report['updated'])} updated, {len(report['unchanged'])} already up to date, "
+          f"{len(report['failed'])} failed.")
+
+    for song_id in report["failed"]:
+        song = db.get_song(song_id=song_id)
+        print(f" {song['song_name']} - {song['group_name']}: The tags couldn't be written.")
 
 
 def list_yt_playlist(db: DBMuziek, name: Optional[str] = None):
@@ -455,19 +564,19 @@ def list_yt_playlist(db: DBMuziek, name: Optional[str] = None):
     :PRE: The database object needs to be connected.
     :POST: Connects you to YT and lists all your existing playlists there, or the specific one if the name is provided.
     """
-    yt = YoutubeAPI(db)
-    for playlist in yt.playlists:
-        if name is None or playlist.title == name:
-            print(playlist)
+    with YoutubeAPI(db) as yt:
+        for playlist in yt.iter_playlists():
+            if name is None or playlist.title == name:
+                print(playlist)
 
-            if name is not None:
-                for song in playlist.songs:
-                    print(f'\t- {song}')
+                if name is not None:
+                    for song in playlist.iter_songs():
+                        print(f'\t- {song}')
 
-                break
-    else:
-        if name is not None:
-            print(f'The playlist "{name}" does not exists.')
+                    break
+        else:
+            if name is not None:
+                print(f'The playlist "{name}" does not exists.')
 
 
 def import_from_yt(db: DBMuziek, name: str):
@@ -484,44 +593,55 @@ def import_from_yt(db: DBMuziek, name: str):
         print(f'The playlist "{name}" already exists.')
         return
 
-    yt = YoutubeAPI(db)
-    playlist = yt.get_playlist(name)
-    if playlist is None:
-        print(f'Cannot find the playlist "{name}" on your Youtube library.')
-        return
-
-    playlist_id = utils.create_playlist(db, name)[0]
-    for song in playlist.songs:
-        print(f"Video Title: {song.title}")
-        author, title = utils.get_info_from_title(song.title)
-
-        print(f'Author: {author}')
-        if utils.question_choice("Would you like to rename the song's author ?", ['y', 'n']) == 'y':
-            author = utils.question('Author').strip()
-
-        group_id = db.get_group(author)
-        if group_id is None:
-            group_id = db.create_group(author, [author])
-        else:
-            group_id = group_id['group_id']
-
-        print(f'Title: {title}')
-        if utils.question_choice("Would you like to rename the song's title ?", ['y', 'n']) == 'y':
-            title = utils.question('Title').strip()
-
-        song_id = db.get_song(title, group_id)
-        if song_id is None:
-            genre = utils.question("Song's genre").strip()
-            song_id = db.create_song(title, song.url, genre, None, group_id, [])
-        else:
-            song_id = song_id['song_id']
-
-        db.add_song_playlist(playlist_id, song_id)
+    with YoutubeAPI(db) as yt:
+        playlist = yt.get_playlist(name)
+        if playlist is None:
+            print(f'Cannot find the playlist "{name}" on your Youtube library.')
+            return
+
+        songs = []
+        genres = {}
+        # The songs are asked about as soon as their page arrives.
+        for song in playlist.iter_songs():
+            print(f"Video Title: {song.title}")
+            author, title = utils.get_info_from_title(song.title)
+
+            print(f'Author: {author}')
+            if utils.question_choice("Would you like to rename the song's author ?", ['y', 'n']) == 'y':
+                author = utils.question('Author').strip()
+
+            print(f'Title: {title}')
+            if utils.question_choice("Would you like to rename the song's title ?", ['y', 'n']) == 'y':
+                title = utils.question('Title').strip()
+
+            # The genre is only needed for the songs that will be created.
+            key = (name_key(author), name_key(title))
+            if key not in genres:
+                group = db.get_group(author)
+                if group is None or db.get_song(title, group['group_id']) is None:
+                    genres[key] = utils.question("Song's genre").strip()
+                else:
+                    genres[key] = None
+
+            songs.append((author, title, song.url, genres[key]))
 
-        print("Song successfully imported.")
+    with db.connection:
+        group_ids = db.bulk_create_groups((author, [author]) for author, *_ in songs)
+        song_ids = db.bulk_create_songs([{
+            "name": title,
+            "link": link,
+            "genre": genre,
+            "duration": None,
+            "group_id": group_ids[name_key(author)],
+            "featuring": []
+        } for author, title, link, genre in songs])
+
+        playlist_id = utils.create_playlist(db, name)[0]
+        db.bulk_link_playlist(playlist_id, song_ids)
+
+    for author, title, *_ in songs:
         logger.info(f"Added song {title} to the playlist {name} from YouTube.")
-
-    db.commit()
+    print(f"{len(songs)} songs successfully imported.")
 
 
 def export_to_yt(db: DBMuziek, name: str):
@@ -539,42 +659,81 @@ def export_to_yt(db: DBMuziek, name: str):
         print(f'The playlist "{name}" does not exists.')
         return
 
-    yt = YoutubeAPI(db)
     songs = db.get_playlist_songs(playlist['playlist_id'])
 
-    while True:
-        name = utils.question('Youtube playlist name', default=name).strip()
-        playlist = yt.get_playlist(name)
-        if playlist is None:
-            description = utils.question('Playlist description', default='<empty>')
-            if description == '<empty>':
-                description = ''
+    with YoutubeAPI(db) as yt:
+        while True:
+            name = utils.question('Youtube playlist name', default=name).strip()
+            playlist = yt.get_playlist(name)
+            if playlist is None:
+                description = utils.question('Playlist description', default='<empty>')
+                if description == '<empty>':
+                    description = ''
 
-            playlist = yt.create_playlist(name, description)
-            break
+                playlist = yt.create_playlist(name, description)
+                break
 
-        print('A Youtube playlist with the same name already exist.')
-        if utils.question_choice("Add the songs to that playlist ?", ['y', 'n']) == 'y':
-            break
+            print('A Youtube playlist with the same name already exist.')
+            if utils.question_choice("Add the songs to that playlist ?", ['y', 'n']) == 'y':
+                break
 
-    for song in songs:
-        link = song['link']
-        title = song['song_name']
-        if link is None:
-            print(f'The song "{title}" has no Youtube link.')
-            link = utils.question('Give a youtube link for this song or nothing to ignore it.', default='').strip()
-            if not link:
-                print(f'The song "{title}" will not be added to your Youtube playlist.')
-                continue
+        exported = []
+        for song in songs:
+            link = song['link']
+            title = song['song_name']
+            if link is None:
+                print(f'The song "{title}" has no Youtube link.')
+                link = utils.question('Give a youtube link for this song or nothing to ignore it.', default='').strip()
+                if not link:
+                    print(f'The song "{title}" will not be added to your Youtube playlist.')
+                    continue
+
+            exported.append((title, link, f'{song["group_name"]} - {title}'))
+
+        # The songs are sent several at once, they're added in the same order.
+        results = yt.add_songs(playlist, [(link, note) for _, link, note in exported])
+        for (title, _, _), result in zip(exported, results):
+            if isinstance(result, ValueError):
+                print(f'Unable to export the song "{title}". Reason: invalid link.')
+            elif isinstance(result, Exception):
+                print(f'Unable to export the song "{title}". Reason: {result}')
+
+        print(f'You can find the exported playlist here : https://www.youtube.com/playlist?list={playlist.id}')
+
+
+def sync_yt_playlist(db: DBMuziek, name: str):
+    """Syncs a playlist with the Youtube playlist of the same name, both ways.
+
+    :param db: The database used.
+    :param name: The playlist to sync.
+    :PRE: The database object needs to be connected.
+    :POST: The songs added or removed on one side since the last sync are added or removed on the other side,
+           the playlist missing on one side is created. The songs downloaded from Youtube are created if needed.
+    """
+    local = db.get_playlist(name)
+    with YoutubeAPI(db) as yt:
+        playlist = yt.get_playlist(name)
+        if local is None and playlist is None:
+            print(f'The playlist "{name}" does not exists.')
+            return
+
+        if local is None:
+            with db.connection:
+                playlist_id = utils.create_playlist(db, name)[0]
+        else:
+            playlist_id = local['playlist_id']
+        if playlist is None:
+            playlist = yt.create_playlist(name, '')
 
-        try:
-            yt.add_song(playlist, link, note=f'{song["group_name"]} - {title}')
-        except ValueError:
-            print(f'Unable to export the song "{title}". Reason: invalid link.')
-        except RuntimeError as e:
-            print(f'Unable to export the song "{title}". Reason: {e}')
+        report = sync_playlist(db, yt, playlist_id, playlist, utils.get_info_from_title)
 
-    print(f'You can find the exported playlist here : https://www.youtube.com/playlist?list={playlist.id}')
+    for title in report['invalid']:
+        print(f'The song "{title}" has no valid Youtube link, it is not synced.')
+    for title, error in report['errors']:
+        print(f'Unable to sync the song "{title}". Reason: {error}')
+    print(f"{report['uploaded']} songs added to Youtube, {report['removed_remote']} removed from it.")
+    print(f"{report['downloaded']} songs added to the local playlist, {report['removed_local']} removed from it.")
+    print(f'You can find the synced playlist here : https://www.youtube.com/playlist?list={playlist.id}')
 
 
 def import_playlist(db: DBMuziek, name: str):
@@ -158,5 +158,55 @@ def test_add_group(monkeypatch):
         assert group_data_bis["group_name"] == group_data["group_name"]
 
 
+def test_playlist_export_import():
+    with DBMuziek("cli-test.db") as db:
+        group_id = db.get_group("TestGroup")["group_id"]
+        featuring_id = db.create_group("Featured", ["ft"])
+        playlist_id = db.create_playlist("Exported", "Joe")
+        db.add_song_playlist(playlist_id, db.create_song("First", "l1", "Rock", 60, group_id, [featuring_id]))
+        db.add_song_playlist(playlist_id, db.create_song("Second", "l2", "Pop", None, featuring_id, []))
+        db.commit()
+
+        code = u.export_playlist(db, db.get_playlist_songs(playlist_id), "Joe")
+
+    with DBMuziek("cli-test-import.db") as db:
+        with db.connection:
+            u.import_playlist(db, code, "Imported")
+
+        playlist = db.get_playlist("Imported")
+        songs = db.get_playlist_songs(playlist["playlist_id"])
+
+        assert playlist["author"] == "Joe"
+        assert [s["song_name"] for s in songs] == ["First", "Second"]
+        assert songs[0]["featuring"][0]["group_name"] == "Featured"
+        assert songs[1]["group_name"] == "Featured"
+        assert db.get_group("TestGroup")["members"] == "alt,bis"
+
+    os.remove("./cli-test-import.db")
+
+
+def test_playlist_import_accents():
+    with DBMuziek("cli-test.db") as db:
+        group_id = db.create_group("Émile", ["Émile"])
+        playlist_id = db.create_playlist("Accents", "Joe")
+        db.add_song_playlist(playlist_id, db.create_song("Été", "l3", "Pop", None, group_id, []))
+        db.commit()
+
+        code = u.export_playlist(db, db.get_playlist_songs(playlist_id), "Joe")
+
+    with DBMuziek("cli-test-import.db") as db:
+        with db.connection:
+            u.import_playlist(db, code, "Imported")
+        # Imported twice, the group and the song already exist.
+        with db.connection:
+            u.import_playlist(db, code, "Again")
+
+        songs = db.get_playlist_songs(db.get_playlist("Again")["playlist_id"])
+        assert [(s["song_name"], s["group_name"]) for s in songs] == [("Été", "Émile")]
+        assert len(db.get_groups()) == 1
+
+    os.remove("./cli-test-import.db")
+
+
 def test_cli_cleanup():
     os.remove("./cli-test.db")
@@ -5,7 +5,9 @@ import math
 import re
 import zlib
 from typing import List
-from ..database import format_duration
+from ..database import format_duration, name_key
+from ..downloader.throttle import MAX_BACKOFF, REQUESTS_PER_SECOND, parse_rate, throttle
+from ..downloader.transcode import DEFAULT_CODEC, DEFAULT_PRESET
 
 getuser = getpass.getuser
 
@@ -192,6 +194,34 @@ def decode(data: str):
     return json.loads(json_str)
 
 
+def download_config(db) -> dict:
+    """Returns the SongDownloader configuration chosen with the settings "download.codec" and "download.preset".
+
+    :param db: The database used.
+    :return: The configuration.
+    """
+    return {
+        "audio_codec": db.get_setting("download.codec", DEFAULT_CODEC),
+        "audio_preset": db.get_setting("download.preset", DEFAULT_PRESET)
+    }
+
+
+def configure_throttle(db):
+    """Applies the limits of the downloads chosen with the settings "download.bandwidth" and
+    "download.host_bandwidth" (bytes per second like 2M, 0 for no limit), "download.requests"
+    (requests per second to a host, 0 for no limit) and "download.max_backoff" (seconds).
+
+    :param db: The database used.
+    :raises ValueError if a setting is invalid.
+    """
+    throttle.configure(
+        bandwidth=parse_rate(db.get_setting("download.bandwidth")),
+        host_bandwidth=parse_rate(db.get_setting("download.host_bandwidth")),
+        requests=float(db.get_setting("download.requests", REQUESTS_PER_SECOND)) or None,
+        max_backoff=float(db.get_setting("download.max_backoff", MAX_BACKOFF))
+    )
+
+
 def get_info_from_title(title):
     elements = strip_brackets(title).split('-')
     if len(elements) < 2:
@@ -219,7 +249,7 @@ def export_playlist(db, songs, author):
                 "members": group["members"].split(",")
             })
 
-        featured_groups = db.get_song_featuring(song["song_id"])
+        featured_groups = song["featuring"]
 
         for featured_group in featured_groups:
             if featured_group["group_id"] not in groups:
@@ -250,27 +280,24 @@ def export_playlist(db, songs, author):
 def import_playlist(db, code, name):
     buffer = decode(code)
 
-    for group in buffer["groups"]:
-        if not db.get_group(group["name"]):
-            db.create_group(group["name"], group["members"])
-
-    songs = []
-
+    groups = [(group["name"], group["members"]) for group in buffer["groups"]]
+    # Groups missing from the export are created with themselves as only member.
     for song in buffer["songs"]:
-        group_query = db.get_group(song["group_name"])
-        song_query = db.get_song(song["song_name"], group_query["group_id"])
-        if not song_query:
-            featuring = [db.get_group(n) for n in song["featuring"]]
-            song_id = db.create_song(song["song_name"], song["link"], song["genre"],
-                                     song["duration"], group_query["group_id"], featuring)
-        else:
-            song_id = song_query["song_id"]
-        songs.append(song_id)
+        groups.extend((group, [group]) for group in [song["group_name"], *song["featuring"]])
+    group_ids = db.bulk_create_groups(groups)
+
+    song_ids = db.bulk_create_songs([{
+        "name": song["song_name"],
+        "link": song["link"],
+        "genre": song["genre"],
+        "duration": song["duration"],
+        "group_id": group_ids[name_key(song["group_name"])],
+        "featuring": [group_ids[name_key(n)] for n in song["featuring"]]
+    } for song in buffer["songs"]])
 
     playlist_id, *other = create_playlist(db, name, buffer["playlist"]["author"])
 
-    for song_id in songs:
-        db.add_song_playlist(playlist_id, song_id)
+    db.bulk_link_playlist(playlist_id, song_ids)
 
 
 def create_playlist(db, name: str, author: str = None) -> (int, str):
@@ -1,12 +1,23 @@
+import base64
+import json
 import sqlite3
+from contextlib import contextmanager
 from functools import wraps
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from ..logger import get_logger
 from . import db_queries
+from .cache import MISSING, EntityCache, name_key
+from .migrations import MIGRATIONS
+from .pool import ConnectionPool, PooledConnection
+from .profiles import DEFAULT_PROFILE, PROFILES
+from .statements import query_shape
 
 logger = get_logger("db")
 
+# Older SQLite builds only allow 999 bound parameters per statement.
+MAX_PARAMETERS = 512
+
 
 def format_duration(duration: int = None):
     if duration is None:
@@ -22,7 +33,7 @@ def query_append(prefix: str, suffix: str, *args):
     :param prefix: What the query will start with, so the columns and tables.
     :param suffix: What the query will end with, for example a LIMIT or OFFSET.
     :param args: A tuple containing the query block and the value that fits in that query,
-                 if the value is None it's ignored.
+                 if the value is None it's ignored. If the block needs several values, they can be given as a tuple.
     :PRE: _
     :POST: Returns a tuple with the custom query and a list of values, where the None values have been removed.
     """
@@ -31,16 +42,80 @@ def query_append(prefix: str, suffix: str, *args):
 
     for (query, val) in args:
         if val is not None:
-            parameters.append(val)
+            if isinstance(val, tuple):
+                parameters.extend(val)
+            else:
+                parameters.append(val)
             appends.append(query)
 
-    appendix = ' AND '.join(appends)
+    return query_shape(prefix, suffix, tuple(appends)), parameters
+
+
+def chunks(values: Iterable, size: int = MAX_PARAMETERS):
+    """This function splits an iterable in lists of a maximum size, so they can be bound in an IN (...) clause.
+
+    :param values: The values to split.
+    :param size: The maximum size of each chunk.
+    :PRE: size must be greater than 0.
+    :POST: Yields lists of at most size elements, in the same order as the input.
+    """
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bind_list(values: List) -> Tuple[str, List]:
+    """This function generates the placeholders needed to bind a list of values in an IN (...) clause.
+    Their amount is rounded up to a power of two and the values padded with NULL, which never matches,
+    so a few statements serve every list size and stay compiled in the statement cache.
+
+    :param values: The values to bind.
+    :PRE: values can't be empty.
+    :POST: Returns a string like "?, ?, ?, ?" and the padded values.
+    """
+    size = 1
+    while size < len(values):
+        size *= 2
+
+    return ', '.join('?' * size), [*values, *[None] * (size - len(values))]
+
+
+def encode_cursor(order: str, sort_key, song_id: int) -> str:
+    """This function creates an opaque token pointing right after a song in a sorted list of songs.
+
+    :param order: The order of the list.
+    :param sort_key: The value the song is sorted by.
+    :param song_id: The id of the song.
+    :PRE: _
+    :POST: Returns a string that can be given back to decode_cursor.
+    """
+    data = json.dumps([order, sort_key, song_id]).encode("utf-8")
+    return str(base64.urlsafe_b64encode(data), "utf-8")
+
+
+def decode_cursor(cursor: str, order: str) -> Tuple:
+    """This function reads a token created by encode_cursor.
 
-    if appendix:
-        prefix = f'{prefix} WHERE {appendix}'
-    query = f'{prefix} {suffix};'
+    :param cursor: The token.
+    :param order: The order the token is expected to be created for.
+    :PRE: _
+    :POST: Returns the sort key and the song id stored in the token.
+    :raises ValueError if the token is invalid or was created for another order.
+    """
+    try:
+        cursor_order, sort_key, song_id = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
 
-    return query, parameters
+    if cursor_order != order:
+        raise ValueError(f"The cursor was created for the order {cursor_order!r}, not {order!r}.")
+
+    return sort_key, song_id
 
 
 def fuzy(string: Optional[str]):
@@ -95,24 +170,40 @@ def db_query(f):
 
 
 class DBMuziek:
-    def __init__(self, path: str):
+    def __init__(self, path: str, profile: Optional[str] = None):
         """This class represents our database connection.
+        It can be shared by several threads, each one gets its own connection to the database file.
 
         :param path: The path to the database file.
+        :param profile: The connection profile to use and store, one of the keys of PROFILES.
+                        If None, the profile stored in the database is used.
+        :raises ValueError if the profile is unknown.
         """
-        self._connection: Optional[sqlite3.Connection] = None
+        if profile is not None and profile not in PROFILES:
+            raise ValueError(f"Unknown profile: {profile!r}, expected one of {', '.join(PROFILES)}.")
+
+        self._pool: Optional[ConnectionPool] = None
         self._path: str = path
+        self._profile: Optional[str] = profile
+        self._active_profile: Optional[str] = None
+        self._search: Optional[bool] = None
+        self._cache = EntityCache()
 
     def __enter__(self):
         """Starts the connection to the database file, and verifies the tables needed are there.
 
         :author: Mathieu
         :PRE: _
-        :POST: The database object will have a connection to the database file and the tables will be set up.
+        :POST: The database object will have a connection to the database file,
+               the tables will be set up and the schema upgraded to the latest version.
         """
         self.connect()
         if not self.validate_tables():
             self.commit()
+        self.migrate()
+        if self._profile and self._profile != self.get_setting("db.profile"):
+            self.set_setting("db.profile", self._profile)
+            self.commit()
         return self
 
     def __exit__(self, *args):
@@ -129,26 +220,84 @@ class DBMuziek:
 
         :author: Carlos
         :PRE: _
-        :POST: Creates a new connection to the database file.
+        :POST: Creates a new connection to the database file for the current thread,
+               the other threads will get theirs when they first use the database.
         """
-        if self._connection:
+        if self._pool:
             self.disconnect()
-        self._connection = sqlite3.connect(self._path)
-        self._connection.row_factory = sqlite3.Row
+        self._pool = ConnectionPool(self._path, self._setup_connection)
+        self._active_profile = None
+        self._search = None
+        self._cache.clear()
+        self._pool.connection()
+
+    def _setup_connection(self, connection: PooledConnection):
+        """Prepares a new connection of the pool, the first one decides the profile used by the others.
+
+        :param connection: The new connection, already registered for the current thread.
+        :PRE: _
+        :POST: The connection is tuned with the profile's pragmas and checks the foreign keys.
+        """
+        if self._active_profile is None:
+            self._active_profile = self._profile or self.stored_profile()
+            self._pool.timeout = PROFILES[self._active_profile].get("busy_timeout", 5000) / 1000
+        self.apply_profile(self._active_profile)
+        connection.execute(db_queries.foreign_keys_enable)
+
+    def stored_profile(self) -> str:
+        """Returns the name of the connection profile stored in the database.
+
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns the stored profile, or the default one if none is stored or the database is new.
+        """
+        if not self.table_exists("settings"):
+            return DEFAULT_PROFILE
+
+        profile = self.get_setting("db.profile", DEFAULT_PROFILE)
+        return profile if profile in PROFILES else DEFAULT_PROFILE
+
+    def apply_profile(self, profile: str):
+        """Applies the pragmas of a connection profile to the current connection.
+
+        :param profile: The profile to apply, one of the keys of PROFILES.
+        :PRE: The connection to the database needs to exist, no transaction can be pending.
+        :POST: The connection is tuned with the profile's pragmas.
+        """
+        for pragma, value in PROFILES[profile].items():
+            self.execute(db_queries.set_pragma.format(pragma, value))
+        logger.debug(f"The connection profile {profile} has been applied.")
+
+    def pragma(self, name: str):
+        """Returns the current value of a pragma.
+
+        :param name: The name of the pragma.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns the value of the pragma.
+        """
+        return self.execute(db_queries.get_pragma.format(name)).fetchone()[0]
 
     def disconnect(self):
         """Closes the connection to the database file.
 
         :author: Mathieu
         :PRE: The connection to the database needs to exist.
-        :POST: Closes the connection to the database file.
+        :POST: Closes the connections of every thread to the database file.
         """
-        self._connection.close()
-        self._connection = None
+        self._pool.close()
+        self._pool = None
+
+    def release(self):
+        """Closes the connection of the current thread, to be called by a worker thread when it's done.
+
+        :PRE: The connection to the database needs to exist.
+        :POST: The connection of the current thread is closed, the other threads keep theirs.
+        """
+        self._pool.release()
 
     @property
-    def connection(self):
-        return self._connection
+    def connection(self) -> Optional[PooledConnection]:
+        """The connection of the current thread, it can be used as a context manager for a transaction."""
+        return self._pool.connection() if self._pool else None
 
     def execute(self, query: str, parameters=()) -> sqlite3.Cursor:
         """Executes an sql query, replacing the parameters.
@@ -158,16 +307,68 @@ class DBMuziek:
         :PRE: The connection to the database needs to exist.
         :POST: Executes the sql query and returns a database cursor.
         """
-        return self._connection.execute(query, parameters)
+        connection = self.connection
+        connection.statements.record(query)
+        return connection.execute(query, parameters)
+
+    def executemany(self, query: str, parameters: Iterable) -> sqlite3.Cursor:
+        """Executes an sql query once for each set of parameters.
+
+        :param query: The query to execute.
+        :param parameters: An iterable of parameters to replace within the query.
+        :PRE: The connection to the database needs to exist.
+        :POST: Executes the sql query for every set of parameters and returns a database cursor.
+        """
+        connection = self.connection
+        connection.statements.record(query)
+        return connection.executemany(query, parameters)
+
+    @property
+    def statement_stats(self) -> dict:
+        """The hits and misses of the statement cache of the current thread's connection,
+        a miss being a statement that had to be compiled."""
+        return self.connection.statements.stats
+
+    @property
+    def cache_stats(self) -> dict:
+        """The hits and misses of the cache of groups, songs and albums, to size it."""
+        return self._cache.stats
+
+    def _cached(self, kind: str, key, load):
+        """Looks up an entity in the cache, loading it from the database if it isn't there.
+
+        :param kind: The kind of entity, "group", "song" or "album".
+        :param key: The key of the lookup, for example the id or the lowercased name.
+        :param load: Function reading the entity from the database.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns the entity or None, it's only cached if it exists and no write transaction is pending.
+        """
+        value = self._cache.get(kind, key)
+        if value is not MISSING:
+            return value
+
+        generation = self._cache.generation
+        value = load()
+        if value is not None and not self._pool.writing:
+            self._cache.put(kind, key, value[f"{kind}_id"], value, generation)
+        return value
 
     def commit(self):
         """Commits a database transaction.
 
         :author: Mathieu
         :PRE: The connection to the database needs to exist.
-        :POST: The changes made are commited.
+        :POST: The changes made by the current thread are commited.
         """
-        self._connection.commit()
+        self.connection.commit()
+
+    def rollback(self):
+        """Rolls back a database transaction.
+
+        :PRE: The connection to the database needs to exist.
+        :POST: The changes made by the current thread since the last commit are discarded.
+        """
+        self.connection.rollback()
 
     @db_query
     def validate_tables(self):
@@ -185,7 +386,8 @@ class DBMuziek:
             "playlistSongs",
             "albums",
             "albumSongs",
-            "settings"
+            "settings",
+            "schemaVersion"
         )
 
         output = True
@@ -200,6 +402,63 @@ class DBMuziek:
 
         return output
 
+    @db_query
+    def schema_version(self) -> int:
+        """Returns the version of the schema stored in the database.
+
+        :PRE: The connection to the database needs to exist, the tables need to be validated.
+        :POST: Returns the version of the last migration applied, 0 if none has been applied.
+        """
+        return self.execute(db_queries.get_schema_version).fetchone()[0]
+
+    @db_query
+    def migrate(self) -> int:
+        """Applies the migrations the database is missing, in order, each one in its own transaction.
+        A migration whose requirement isn't met by the local SQLite is skipped until the next time.
+
+        :PRE: The connection to the database needs to exist, the tables need to be validated.
+        :POST: The schema is upgraded to the latest version supported. Returns the amount of migrations applied.
+        """
+        applied = {row[0] for row in self.execute(db_queries.get_schema_versions)}
+        count = 0
+
+        for version, (description, queries, requirement) in enumerate(MIGRATIONS, 1):
+            if version in applied:
+                continue
+            if requirement and not requirement(self.connection):
+                logger.info(f"The migration {version} isn't supported by your local database: {description}.")
+                continue
+
+            with self.connection:
+                # The schema changes don't open a transaction on their own, they'd be committed one by one.
+                self.connection.execute("BEGIN")
+                for query in queries:
+                    self.execute(query)
+                self.execute(db_queries.set_schema_version, (version,))
+            logger.info(f"The database has been upgraded to the version {version}: {description}.")
+            count += 1
+
+        self._search = None
+        return count
+
+    @property
+    def search_available(self) -> bool:
+        """Whether the full-text search index exists in the database."""
+        if self._search is None:
+            self._search = bool(self.table_exists("songSearch"))
+        return self._search
+
+    @db_query
+    def index_exists(self, name: str) -> int:
+        """Checks if an index exist in the database.
+
+        :param name: name of the index to check.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns 1 if it exists, 0 if it doesn't.
+        """
+        result = self.execute(db_queries.index_exists, (name,))
+        return result.fetchone()[0]
+
     @db_query
     def table_exists(self, name: str) -> int:
         """Checks if a table exist in the database.
@@ -229,20 +488,79 @@ class DBMuziek:
         :PRE: The connection to the database needs to exist.
         :POST: The amount of songs.
         """
-        default = {
-            "genre": None,
-            "name": None,
-            "group": None
-        }
+        query, params = query_append(db_queries.count_songs, "", *self._songs_filters(filters))
 
-        if filters:
-            default = {**default, **filters}
+        return self.execute(query, params).fetchone()[0]
 
-        genre = (db_queries.append_genre, default["genre"])
-        name = (db_queries.append_name, fuzy(default["name"]))
-        group = (db_queries.append_group, fuzy(default["group"]))
-        query, params = query_append(db_queries.count_songs, "", genre, name, group)
+    def _name_filters(self, filters: dict):
+        """Returns the query blocks filtering the songs on their name and their group's name,
+        served by the full-text search index when it's available.
+
+        :param filters: The filters the songs need to fit.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns the name and group blocks to give to query_append.
+        """
+        if self.search_available:
+            return ((db_queries.append_search_name, fuzy(filters["name"])),
+                    (db_queries.append_search_group, fuzy(filters["group"])))
+
+        return ((db_queries.append_name, fuzy(filters["name"])),
+                (db_queries.append_group, fuzy(filters["group"])))
 
+    def _search_blocks(self, text: str):
+        """Transforms a search text into query blocks, each word of the text needs to be found in the song.
+
+        :param text: The words to look for.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns a list of blocks to give to query_append and whether the result can be ranked.
+        """
+        words = text.lower().split()
+
+        if not self.search_available:
+            return [(db_queries.append_search_term_fallback, w) for w in words], False
+
+        # The trigram index can only match words of 3 characters or more, the shorter ones are filtered after.
+        match = ' '.join('"{}"'.format(w.replace('"', '""')) for w in words if len(w) >= 3)
+        blocks = [(db_queries.append_search_match, match or None)]
+        blocks.extend((db_queries.append_search_term, w) for w in words if len(w) < 3)
+
+        return blocks, bool(match)
+
+    @db_query
+    def search(self, text: str, offset: int = 0, limit: int = 50):
+        """Searches the songs whose name, group, members, genre or albums contain every word of the text.
+
+        :param text: The words to look for, each one can be a part of a word.
+        :param offset: The offset in the database query.
+        :param limit: The limit in the database query.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns a list of songs like get_songs, the best matches first when the full-text index is available.
+        """
+        blocks, ranked = self._search_blocks(text)
+
+        if self.search_available:
+            prefix = db_queries.search_songs
+            suffix = db_queries.search_rank if ranked else db_queries.search_order
+        else:
+            prefix, suffix = db_queries.get_songs, db_queries.search_order
+
+        query, params = query_append(prefix, suffix, *blocks)
+        songs = list(map(dict, self.execute(query, (*params, limit, offset)).fetchall()))
+
+        return self.add_songs_featuring(songs)
+
+    @db_query
+    def count_search(self, text: str) -> int:
+        """Returns the amount of songs matching a search.
+
+        :param text: The words to look for.
+        :PRE: The connection to the database needs to exist.
+        :POST: The amount of songs search would return without limit.
+        """
+        blocks, _ = self._search_blocks(text)
+        prefix = db_queries.count_search_songs if self.search_available else db_queries.count_songs
+
+        query, params = query_append(prefix, "", *blocks)
         return self.execute(query, params).fetchone()[0]
 
     @db_query
@@ -281,20 +599,24 @@ class DBMuziek:
         """
         if not group_id and song_id < 0:
             songs = list(map(dict, self.execute(db_queries.get_song, (song_name,)).fetchall()))
-
-            for song in songs:
-                song["featuring"] = self.get_song_featuring(song["song_id"])
-            return songs
+            return self.add_songs_featuring(songs)
         else:
             if song_id < 0:
-                song = self.execute(db_queries.get_song_with_group, (song_name, group_id)).fetchone()
+                song = self._cached("song", (name_key(song_name), group_id),
+                                    lambda: self._load_song(db_queries.get_song_with_group, (song_name, group_id)))
             else:
-                song = self.execute(db_queries.get_song_with_id, (song_id,)).fetchone()
+                song = self._cached("song", song_id, lambda: self._load_song(db_queries.get_song_with_id, (song_id,)))
             if song:
-                song = dict(song)
-                song["featuring"] = self.get_song_featuring(song["song_id"])
+                song = dict(song, featuring=list(song["featuring"]))
             return song
 
+    def _load_song(self, query: str, parameters: tuple) -> Optional[dict]:
+        song = self.execute(query, parameters).fetchone()
+        if song:
+            song = dict(song)
+            song["featuring"] = self.get_song_featuring(song["song_id"])
+        return song
+
     @db_query
     def get_song_featuring(self, song_id: int):
         """Obtains the groups featured in a song.
@@ -305,6 +627,38 @@ class DBMuziek:
         """
         return self.execute(db_queries.get_song_featuring, (song_id,)).fetchall()
 
+    @db_query
+    def get_songs_featuring(self, song_ids: Iterable[int]):
+        """Obtains the groups featured in several songs at once.
+
+        :param song_ids: The ids of the songs.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns a dict linking each song id to a list of Rows with the groups featured in the song,
+               songs without any featured group are included with an empty list.
+        """
+        featuring = {song_id: [] for song_id in song_ids}
+
+        for chunk in chunks(featuring):
+            marks, params = bind_list(chunk)
+            for row in self.execute(db_queries.get_songs_featuring.format(marks), params):
+                featuring[row["song_id"]].append(row)
+
+        return featuring
+
+    def add_songs_featuring(self, songs: List[dict]) -> List[dict]:
+        """Fills the "featuring" field of a list of songs, using one query per chunk of songs.
+
+        :param songs: The songs to complete, they need to contain a "song_id" field.
+        :PRE: The connection to the database needs to exist.
+        :POST: Each song has a "featuring" field with Rows of the featured groups. Returns the same list.
+        """
+        featuring = self.get_songs_featuring(song["song_id"] for song in songs) or {}
+
+        for song in songs:
+            song["featuring"] = featuring.get(song["song_id"], [])
+
+        return songs
+
     @db_query
     def get_songs(self, filters: dict = None, offset: int = 0, limit: int = 50):
         """Obtains a defined amount of songs, after being filtered.
@@ -315,6 +669,19 @@ class DBMuziek:
         :PRE: The connection to the database needs to exist.
         :POST: Returns an array of Rows of the songs.
         """
+        query, params = query_append(db_queries.get_songs, db_queries.paging, *self._songs_filters(filters))
+
+        songs = list(map(dict, self.execute(query, (*params, limit, offset)).fetchall()))
+
+        return self.add_songs_featuring(songs)
+
+    def _songs_filters(self, filters: Optional[dict]):
+        """Returns the query blocks filtering the songs.
+
+        :param filters: The filters the songs need to fit, the missing ones are ignored.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns the genre, name, group and group_id blocks to give to query_append.
+        """
         default = {
             "genre": None,
             "name": None,
@@ -326,17 +693,70 @@ class DBMuziek:
             default = {**default, **filters}
 
         genre = (db_queries.append_genre, default["genre"])
-        name = (db_queries.append_name, fuzy(default["name"]))
-        group = (db_queries.append_group, fuzy(default["group"]))
+        name, group = self._name_filters(default)
         group_id = (db_queries.append_group_id, default["group_id"])
-        query, params = query_append(db_queries.get_songs, db_queries.paging, genre, name, group, group_id)
 
-        songs = list(map(dict, self.execute(query, (*params, limit, offset)).fetchall()))
+        return genre, name, group, group_id
+
+    @db_query
+    def get_songs_after(self, filters: dict = None, cursor: Optional[str] = None, limit: int = 50,
+                        order: str = "song_id"):
+        """Obtains the songs following a cursor, after being filtered and sorted.
+        Unlike an offset, the cost of fetching a page doesn't grow with its position.
+
+        :param filters: The filters the songs need to fit.
+        :param cursor: The token returned with the previous page, None for the first page.
+        :param limit: The maximum amount of songs to return.
+        :param order: What the songs are sorted by, one of the keys of db_queries.song_orders.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns an array of songs like get_songs and the cursor of the next page,
+               the cursor is None if there are no songs after this page.
+        :raises ValueError if the order is unknown or the cursor is invalid.
+        """
+        if order not in db_queries.song_orders:
+            raise ValueError(f"Unknown order: {order!r}")
+
+        key = db_queries.song_orders[order]
+        after = decode_cursor(cursor, order) if cursor else None
+        prefix = db_queries.get_songs_sorted.format(key)
+        suffix = db_queries.sorted_paging.format(key)
+        query, params = query_append(prefix, suffix, *self._songs_filters(filters),
+                                     (db_queries.append_cursor.format(key), after))
+
+        songs = list(map(dict, self.execute(query, (*params, limit + 1)).fetchall()))
+
+        next_cursor = None
+        if len(songs) > limit:
+            songs = songs[:limit]
+            next_cursor = encode_cursor(order, songs[-1]["sort_key"], songs[-1]["song_id"])
 
         for song in songs:
-            song["featuring"] = self.get_song_featuring(song["song_id"])
+            del song["sort_key"]
 
-        return songs
+        return self.add_songs_featuring(songs), next_cursor
+
+    @db_query
+    def get_songs_anchors(self, filters: dict = None, per_page: int = 50, order: str = "song_id") -> List[str]:
+        """Obtains the cursor of the beginning of every page in one pass over the index,
+        so a page can be reached without loading the ones before it.
+
+        :param filters: The filters the songs need to fit.
+        :param per_page: The amount of songs per page.
+        :param order: What the songs are sorted by, one of the keys of db_queries.song_orders.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns a list of cursors to give to get_songs_after, the first one being the cursor of the 2nd page.
+        :raises ValueError if the order is unknown.
+        """
+        if order not in db_queries.song_orders:
+            raise ValueError(f"Unknown order: {order!r}")
+
+        key = db_queries.song_orders[order]
+        query, params = query_append(db_queries.get_songs_positions.format(key), "",
+                                     *self._songs_filters(filters))
+        query = db_queries.get_songs_anchors.format(query.rstrip(' ;'))
+
+        rows = self.execute(query, (*params, per_page)).fetchall()
+        return [encode_cursor(order, row["sort_key"], row["song_id"]) for row in rows]
 
     @db_query
     def get_group(self, name: str = '', verbose: bool = False, group_id: int = -1):
@@ -351,9 +771,11 @@ class DBMuziek:
                If verbose the counts of songs and albums will also be provided.
         """
         if group_id >= 0:
-            group_query = self.execute(db_queries.get_group_with_id, (group_id,)).fetchone()
+            group_query = self._cached("group", group_id,
+                                       lambda: self.execute(db_queries.get_group_with_id, (group_id,)).fetchone())
         else:
-            group_query = self.execute(db_queries.get_group, (name,)).fetchone()
+            group_query = self._cached("group", name_key(name),
+                                       lambda: self.execute(db_queries.get_group, (name,)).fetchone())
         if not verbose:
             return group_query
         elif group_query:
@@ -373,9 +795,11 @@ class DBMuziek:
                If no group is provided a list of Rows.
         """
         if album_id >= 0:
-            return self.execute(db_queries.get_album_with_id, (album_id,)).fetchone()
+            return self._cached("album", album_id,
+                                lambda: self.execute(db_queries.get_album_with_id, (album_id,)).fetchone())
         if group_id:
-            return self.execute(db_queries.get_album_with_group, (name, group_id)).fetchone()
+            return self._cached("album", (name_key(name), group_id),
+                                lambda: self.execute(db_queries.get_album_with_group, (name, group_id)).fetchone())
         else:
             return self.execute(db_queries.get_album, (name,)).fetchall()
 
@@ -389,10 +813,7 @@ class DBMuziek:
         """
         songs = list(map(dict, self.execute(db_queries.get_songs_album, (album_id,)).fetchall()))
 
-        for song in songs:
-            song["featuring"] = self.get_song_featuring(song["song_id"])
-
-        return songs
+        return self.add_songs_featuring(songs)
 
     @db_query
     def add_song_playlist(self, playlist_id: int, song_id: int):
@@ -416,10 +837,7 @@ class DBMuziek:
         """
         songs = list(map(dict, self.execute(db_queries.get_playlist_songs, (playlist_id,)).fetchall()))
 
-        for song in songs:
-            song["featuring"] = self.get_song_featuring(song["song_id"])
-
-        return songs
+        return self.add_songs_featuring(songs)
 
     @db_query
     def create_playlist(self, name: str, author: str) -> int:
@@ -441,7 +859,9 @@ class DBMuziek:
         :PRE: The connection to the database needs to exist.
         :POST: Returns the id of the created group.
         """
-        return self.execute(db_queries.create_group, (name, ','.join(members))).lastrowid
+        group_id = self.execute(db_queries.create_group, (name, ','.join(members))).lastrowid
+        self._cache.invalidate("group", key=name_key(name))
+        return group_id
 
     @db_query
     def update_group(self, group_id: int, members: List[str]):
@@ -453,6 +873,10 @@ class DBMuziek:
         :POST: The group is updated with the provided info.
         """
         self.execute(db_queries.update_group, (','.join(members), group_id))
+        self._cache.invalidate("group", group_id)
+        # The songs featuring the group are cached with its members.
+        for song in self.execute(db_queries.get_group_featured_songs, (group_id,)).fetchall():
+            self._cache.invalidate("song", song["song_id"])
 
     @db_query
     def create_song(self, name: str, link: str, genre: str,
@@ -470,9 +894,8 @@ class DBMuziek:
         :POST: Returns the id of the created song.
         """
         song_id = self.execute(db_queries.create_song, (name, link, genre, group_id, duration)).lastrowid
-
-        for featuring_id in featuring:
-            self.execute(db_queries.add_song_featuring, (song_id, featuring_id))
+        self.executemany(db_queries.add_song_featuring, ((song_id, featuring_id) for featuring_id in featuring))
+        self._cache.invalidate("song", key=(name_key(name), group_id))
 
         return song_id
 
@@ -494,8 +917,8 @@ class DBMuziek:
 
         if featuring is not None:
             self.execute(db_queries.delete_song_featuring, (song_id,))
-            for featuring_id in featuring:
-                self.execute(db_queries.add_song_featuring, (song_id, featuring_id))
+            self.executemany(db_queries.add_song_featuring, ((song_id, featuring_id) for featuring_id in featuring))
+        self._cache.invalidate("song", song_id)
 
     @db_query
     def create_album(self, name: str, songs: List[int], group_id: int) -> int:
@@ -508,8 +931,8 @@ class DBMuziek:
         :POST: Returns the id of the album created.
         """
         album_id = self.execute(db_queries.create_album, (name, group_id)).lastrowid
-        for song_id in songs:
-            self.execute(db_queries.add_song_album, (album_id, song_id))
+        self.executemany(db_queries.add_song_album, ((album_id, song_id) for song_id in songs))
+        self._cache.invalidate("album", key=(name_key(name), group_id))
         return album_id
 
     @db_query
@@ -522,8 +945,150 @@ class DBMuziek:
         :POST: The album is updated with the data provided.
         """
         self.execute(db_queries.delete_album_songs, (album_id,))
-        for song_id in songs:
-            self.execute(db_queries.add_song_album, (album_id, song_id))
+        self.executemany(db_queries.add_song_album, ((album_id, song_id) for song_id in songs))
+        self._cache.invalidate("album", album_id)
+
+    @db_query
+    def get_groups_ids(self, names: Iterable[str]) -> Dict[str, int]:
+        """Obtains the ids of several groups at once, based on their names.
+
+        :param names: The names of the groups.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns a dict linking the key of the name of each existing group, see name_key, to its id.
+        """
+        ids = {}
+        for chunk in chunks({name_key(name) for name in names}):
+            marks, params = bind_list(chunk)
+            ids.update((row["key"], row["group_id"])
+                       for row in self.execute(db_queries.get_groups_ids.format(marks), params))
+        return ids
+
+    @db_query
+    def get_songs_ids(self, songs: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], int]:
+        """Obtains the ids of several songs at once, based on their names and the id of their group.
+
+        :param songs: Tuples made of the name of a song and the id of its group.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns a dict linking the key of the name, see name_key, and group id of each existing song to its id.
+        """
+        wanted = {(name_key(name), group_id) for name, group_id in songs}
+
+        ids = {}
+        for chunk in chunks({name for name, _ in wanted}):
+            marks, params = bind_list(chunk)
+            ids.update(((row["key"], row["group_id"]), row["song_id"])
+                       for row in self.execute(db_queries.get_songs_ids.format(marks), params)
+                       if (row["key"], row["group_id"]) in wanted)
+        return ids
+
+    @db_query
+    def bulk_create_groups(self, groups: Iterable[Tuple[str, List[str]]]) -> Dict[str, int]:
+        """Creates the groups that don't exist yet, in one pass. Doesn't commit the transaction.
+
+        :param groups: Tuples made of the name of a group and its list of members.
+        :PRE: The connection to the database needs to exist.
+        :POST: The missing groups are created, the existing ones are left untouched.
+               Returns a dict linking the key of the name of every group given, see name_key, to its id.
+        """
+        wanted = {}
+        for name, members in groups:
+            wanted.setdefault(name_key(name), (name, members))
+
+        ids = self.get_groups_ids(wanted)
+        missing = [(name, ','.join(members)) for key, (name, members) in wanted.items() if key not in ids]
+
+        if missing:
+            self.executemany(db_queries.create_group, missing)
+            ids.update(self.get_groups_ids(name for name, _ in missing))
+
+        return ids
+
+    @db_query
+    def bulk_create_songs(self, songs: List[dict]) -> List[int]:
+        """Creates the songs that don't exist yet with their featuring, in one pass. Doesn't commit the transaction.
+
+        :param songs: Dicts with the arguments of create_song: name, link, genre, duration, group_id and featuring.
+        :PRE: The connection to the database needs to exist, the main and featuring groups needs to exist.
+        :POST: The missing songs are created, a song with the same name and group is considered as existing
+               and left untouched. Returns the ids of the songs, in the same order.
+        """
+        keys = [(name_key(song["name"]), song["group_id"]) for song in songs]
+        ids = self.get_songs_ids(keys)
+
+        missing = {}
+        for key, song in zip(keys, songs):
+            if key not in ids:
+                missing.setdefault(key, song)
+
+        if missing:
+            self.executemany(db_queries.create_song, ((s["name"], s["link"], s["genre"], s["group_id"], s["duration"])
+                                                      for s in missing.values()))
+            ids.update(self.get_songs_ids(missing))
+            self.executemany(db_queries.add_song_featuring, ((ids[key], featuring_id)
+                                                             for key, song in missing.items()
+                                                             for featuring_id in song.get("featuring", [])))
+
+        return [ids[key] for key in keys]
+
+    @db_query
+    def bulk_link_playlist(self, playlist_id: int, song_ids: Iterable[int]):
+        """Adds several existing songs to an existing playlist. Doesn't commit the transaction.
+
+        :param playlist_id: The id of the playlist.
+        :param song_ids: The ids of the songs.
+        :PRE: The connection to the database needs to exist, the songs and playlist need to exist in the database.
+        :POST: The songs will be linked to playlist, the ones already in it are ignored.
+        """
+        self.executemany(db_queries.add_song_playlist, ((playlist_id, song_id) for song_id in song_ids))
+
+    @db_query
+    def bulk_unlink_playlist(self, playlist_id: int, song_ids: Iterable[int]):
+        """Removes several songs from a playlist. Doesn't commit the transaction.
+
+        :param playlist_id: The id of the playlist.
+        :param song_ids: The ids of the songs.
+        :PRE: The connection to the database needs to exist.
+        :POST: The songs aren't in the playlist anymore, the songs themselves are kept.
+        """
+        self.executemany(db_queries.remove_song_playlist, ((playlist_id, song_id) for song_id in song_ids))
+
+    @db_query
+    def get_songs_links(self) -> List[Tuple[int, str]]:
+        """Returns the id and the link of every song."""
+        return [(row["song_id"], row["link"]) for row in self.execute(db_queries.get_songs_links)]
+
+    @db_query
+    def get_sync_state(self, playlist_id: int) -> Tuple[Optional[str], Dict[str, str]]:
+        """Returns what was in a playlist the last time it was synced with YouTube.
+
+        :param playlist_id: The id of the local playlist.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns the id of the YouTube playlist, None if it was never synced,
+               and the id of the playlistItem of each video synced.
+        """
+        row = self.execute(db_queries.get_sync_playlist, (playlist_id,)).fetchone()
+        items = self.execute(db_queries.get_sync_items, (playlist_id,))
+        return (None if row is None else row["yt_playlist_id"]), {row["video_id"]: row["item_id"] for row in items}
+
+    @db_query
+    def update_sync_state(self, playlist_id: int, yt_playlist_id: str, synced: Dict[str, str],
+                          removed: Iterable[str], reset: bool = False):
+        """Records the changes of a sync with YouTube. Doesn't commit the transaction.
+
+        :param playlist_id: The id of the local playlist.
+        :param yt_playlist_id: The id of the YouTube playlist.
+        :param synced: The id of the playlistItem of each video synced since the last time.
+        :param removed: The videos not in the playlists anymore.
+        :param reset: True to forget the videos synced before, when the YouTube playlist changed.
+        :PRE: The connection to the database needs to exist, the playlist needs to exist.
+        :POST: Only the videos given are written.
+        """
+        if reset:
+            self.execute(db_queries.delete_sync_items, (playlist_id,))
+        self.execute(db_queries.set_sync_playlist, (playlist_id, yt_playlist_id))
+        self.executemany(db_queries.delete_sync_item, ((playlist_id, video_id) for video_id in removed))
+        self.executemany(db_queries.set_sync_item, ((playlist_id, video_id, item_id)
+                                                    for video_id, item_id in synced.items()))
 
     @db_query
     def get_setting(self, key: str, default: str = None) -> str:
@@ -551,6 +1116,73 @@ class DBMuziek:
         """
         self.execute(db_queries.set_setting, (key, str(value)))
 
+    @db_query
+    def get_api_answer(self, key: str) -> Optional[Tuple[str, str]]:
+        """Returns an answer of the YouTube API stored in the cache.
+
+        :param key: The key of the request.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns the ETag and the body of the answer, None if it isn't stored.
+        """
+        row = self.execute(db_queries.get_api_answer, (key,)).fetchone()
+        return None if row is None else (row["etag"], row["body"])
+
+    @contextmanager
+    def _api_cache_writes(self):
+        """Runs the writes of the cache of the YouTube API in a savepoint, see db_queries.savepoint_api_cache."""
+        self.execute(db_queries.savepoint_api_cache)
+        try:
+            yield
+        except BaseException:
+            self.execute(db_queries.rollback_api_cache)
+            self.execute(db_queries.release_api_cache)
+            raise
+        self.execute(db_queries.release_api_cache)
+
+    @db_query
+    def set_api_answer(self, key: str, etag: str, body: str):
+        """Stores an answer of the YouTube API in the cache.
+
+        :param key: The key of the request.
+        :param etag: The ETag of the answer.
+        :param body: The body of the answer.
+        :PRE: The connection to the database needs to exist.
+        :POST: The answer is stored or replaced, as used now. Committed with the pending transaction, if any.
+        """
+        with self._api_cache_writes():
+            self.execute(db_queries.set_api_answer, (key, etag, body, len(body.encode())))
+
+    @db_query
+    def touch_api_answer(self, key: str):
+        """Marks an answer of the cache as used now, the answers used the longest time ago are evicted first."""
+        with self._api_cache_writes():
+            self.execute(db_queries.touch_api_answer, (key,))
+
+    @db_query
+    def evict_api_answers(self, max_size: int, max_age: int) -> int:
+        """Removes the answers of the cache unused for too long, then the least recently used beyond the size.
+
+        :param max_size: The maximum size of the bodies stored, in bytes.
+        :param max_age: The time an answer stays in the cache after its last use, in seconds.
+        :PRE: The connection to the database needs to exist.
+        :POST: Returns the amount of answers removed.
+        """
+        with self._api_cache_writes():
+            count = self.execute(db_queries.delete_old_api_answers, (max_age,)).rowcount
+            total = 0
+            evicted = []
+            for row in self.execute(db_queries.get_api_answers_sizes).fetchall():
+                total += row["size"]
+                if total > max_size:
+                    evicted.append((row["key"],))
+            self.executemany(db_queries.delete_api_answer, evicted)
+        return count + len(evicted)
+
+    @db_query
+    def api_cache_size(self) -> Tuple[int, int]:
+        """Returns the amount of answers stored in the cache and the size of their bodies, in bytes."""
+        return tuple(self.execute(db_queries.get_api_cache_size).fetchone())
+
     @db_query
     def get_albums(self):
         """Obtains a list with all the albums created.
@@ -574,7 +1206,7 @@ class DBMuziek:
         """Obtains a list with all the albums created.
 
         :PRE: The connection to the database needs to exist.
-        :POST: Returns a list of genres stored in the database, formatted to have the first letter in caps.
+        :POST: Returns a list of genres stored in the database, sorted and formatted to have the first letter in caps.
         """
         genres = self.execute(db_queries.get_genres).fetchall()
 
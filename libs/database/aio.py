@@ -0,0 +1,125 @@
+"""Coroutine facade of DBMuziek, for the code running in an asyncio event loop.
+
+Every query runs on a single worker thread, so the event loop never blocks on the database
+and the queries keep their order. That thread has its own connection in the pool of DBMuziek.
+"""
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial, wraps
+from typing import Optional
+
+from . import DBMuziek
+
+# The methods that can't be used from another thread than the one that calls them.
+NOT_MIRRORED = {"connection", "release"}
+
+
+class AsyncDBMuziek:
+    def __init__(self, path: str, profile: Optional[str] = None, queue_size: int = 64):
+        """This class represents our database connection, each method of DBMuziek is a coroutine here.
+        A cursor returned by a query is fetched on the worker thread, so the rows are returned instead.
+
+        :param path: The path to the database file.
+        :param profile: The connection profile to use and store, see DBMuziek.
+        :param queue_size: How many queries can be waiting for the worker thread, the next ones wait their turn.
+        """
+        self._db = DBMuziek(path, profile)
+        self._queue_size = queue_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Semaphore] = None
+        self._transaction: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self):
+        """Starts the worker thread and opens the database on it, see DBMuziek.__enter__.
+
+        :PRE: _
+        :POST: The database is ready to be used.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        self._queue = asyncio.Semaphore(self._queue_size)
+        self._transaction = asyncio.Lock()
+        await self.run(self._db.__enter__)
+        return self
+
+    async def __aexit__(self, *args):
+        """Closes the database and stops the worker thread.
+
+        :PRE: The database needs to be opened.
+        :POST: The connections are closed.
+        """
+        try:
+            await self.run(self._db.__exit__, *args)
+        finally:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    @property
+    def db(self) -> DBMuziek:
+        """The synchronous object, only to be used through run."""
+        return self._db
+
+    async def run(self, function, *args, **kwargs):
+        """Calls a function on the worker thread, waiting for a place in the queue first.
+
+        :param function: The function to call, usually a method of DBMuziek.
+        :PRE: The database needs to be opened.
+        :POST: Returns what the function returned, the rows if it was a cursor.
+        """
+        async with self._queue:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(_fetch, function, *args, **kwargs))
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Commits the queries made inside the block, or rolls them back if an exception is raised.
+        The worker thread has only one connection, so the transactions of different coroutines wait for each other,
+        but the queries made outside of a transaction still end up in the current one.
+
+        :PRE: The database needs to be opened.
+        :POST: The changes are commited or discarded.
+        """
+        async with self._transaction:
+            try:
+                yield self
+            except BaseException:
+                await self.run(self._db.rollback)
+                raise
+            else:
+                await self.run(self._db.commit)
+
+
+def _fetch(function, *args, **kwargs):
+    result = function(*args, **kwargs)
+    if isinstance(result, sqlite3.Cursor):
+        return result.fetchall()
+    return result
+
+
+def _mirror_method(name: str):
+    method = getattr(DBMuziek, name)
+
+    @wraps(method)
+    async def mirrored(self, *args, **kwargs):
+        return await self.run(getattr(self._db, name), *args, **kwargs)
+    return mirrored
+
+
+def _mirror_property(name: str):
+    prop = getattr(DBMuziek, name)
+
+    async def mirrored(self):
+        return await self.run(prop.fget, self._db)
+    mirrored.__name__ = name
+    mirrored.__doc__ = prop.__doc__
+    return mirrored
+
+
+for _name, _member in vars(DBMuziek).items():
+    if _name.startswith("_") or _name in NOT_MIRRORED:
+        continue
+    if isinstance(_member, property):
+        setattr(AsyncDBMuziek, _name, _mirror_property(_name))
+    elif callable(_member):
+        setattr(AsyncDBMuziek, _name, _mirror_method(_name))
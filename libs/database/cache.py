@@ -0,0 +1,123 @@
+"""Cache of the groups, songs and albums looked up by id or by name.
+
+An entity is only cached once it's committed: the lookups made while a write transaction is pending
+aren't stored, and a lookup started before a write is discarded, so the cache never holds a stale row.
+"""
+import string
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Set, Tuple
+
+ENTITY_CACHE_SIZE = 1024
+
+# SQLite's lower() only folds the ASCII letters, the names are looked up the same way.
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# Returned by EntityCache.get when nothing is cached, None being a valid value.
+MISSING = object()
+
+
+def name_key(name: str) -> str:
+    """The key of a name, two names with the same key match the same rows with lower(name) = lower(?)."""
+    return name.translate(ASCII_LOWER)
+
+
+class EntityCache:
+    def __init__(self, capacity: int = ENTITY_CACHE_SIZE):
+        """A thread-safe LRU cache of entities, each one can be stored under several keys (its id, its name...).
+
+        :param capacity: The maximum amount of keys stored.
+        """
+        self._capacity = capacity
+        self._entries: OrderedDict = OrderedDict()
+        self._keys: Dict[Tuple[str, int], Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, key: Hashable):
+        """Looks up a cached entity.
+
+        :param kind: The kind of entity, for example "group".
+        :param key: The key it was stored with.
+        :PRE: _
+        :POST: Returns the entity, or MISSING if it isn't cached.
+        """
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end((kind, key))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, kind: str, key: Hashable, entity_id: int, value, generation: int):
+        """Stores an entity, unless something was invalidated since it was read.
+
+        :param kind: The kind of entity.
+        :param key: The key to store it with.
+        :param entity_id: The id of the entity, used to invalidate it.
+        :param value: The entity.
+        :param generation: The generation of the cache before the entity was read from the database.
+        :PRE: _
+        :POST: The entity is cached if the generation hasn't changed, the least recently used keys are evicted.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[(kind, key)] = (entity_id, value)
+            self._entries.move_to_end((kind, key))
+            self._keys.setdefault((kind, entity_id), set()).add(key)
+            while len(self._entries) > self._capacity:
+                (old_kind, old_key), (old_id, _) = self._entries.popitem(last=False)
+                self._forget(old_kind, old_key, old_id)
+
+    def _forget(self, kind: str, key: Hashable, entity_id: int):
+        keys = self._keys.get((kind, entity_id))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[(kind, entity_id)]
+
+    def invalidate(self, kind: str, entity_id: int = None, key: Hashable = None):
+        """Removes an entity from the cache, under all its keys, or only one key.
+
+        :param kind: The kind of entity.
+        :param entity_id: The id of the entity to remove.
+        :param key: The key to remove, if the id isn't known.
+        :PRE: _
+        :POST: The entity isn't cached anymore, the lookups in progress won't be stored.
+        """
+        with self._lock:
+            self.generation += 1
+            keys = set(self._keys.pop((kind, entity_id), ())) if entity_id is not None else set()
+            if key is not None:
+                keys.add(key)
+            for old_key in keys:
+                entry = self._entries.pop((kind, old_key), None)
+                if entry is not None and entry[0] != entity_id:
+                    self._forget(kind, old_key, entry[0])
+
+    def clear(self):
+        """Removes every entity, the counters are kept.
+
+        :PRE: _
+        :POST: The cache is empty.
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._keys.clear()
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "capacity": self._capacity
+        }
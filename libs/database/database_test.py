@@ -1,8 +1,14 @@
+import asyncio
 import os
+import sys
+import threading
 
-from . import DBMuziek, format_duration
+import pytest
 
-# import pytest
+from . import DBMuziek, bind_list, format_duration, query_append
+from .aio import AsyncDBMuziek
+from .migrations import MIGRATIONS, fts5_trigram
+from .pager import SongPager
 
 
 def test_database():
@@ -17,6 +23,16 @@ def test_database():
 
     assert db.validate_tables() is True
 
+    # MIGRATIONS
+    assert db.schema_version() == 0
+    assert db.index_exists("idx_songs_name") == 0
+    # Without the trigram tokenizer (SQLite < 3.34), the full-text search is skipped and LIKE is used instead.
+    trigram = fts5_trigram(db.connection)
+    assert db.migrate() == len(MIGRATIONS) - (not trigram)
+    assert db.schema_version() == len(MIGRATIONS)
+    assert db.index_exists("idx_songs_name") == 1
+    assert db.migrate() == 0
+
     # COUNT SONGS EMPTY
     assert db.count_songs() == 0
 
@@ -95,6 +111,16 @@ def test_database():
     assert featuring[0]["members"] == "Member3"
     assert featuring[0]["group_id"] == featuring_id
 
+    # GET SONGS FEATURING
+    featuring = db.get_songs_featuring([song_data["id"], song_data["id"] + 1])
+
+    assert len(featuring) == 2
+    assert len(featuring[song_data["id"]]) == 1
+    assert featuring[song_data["id"]][0]["group_id"] == featuring_id
+    assert featuring[song_data["id"] + 1] == []
+
+    assert db.get_song(song_data["name"])[0]["featuring"][0]["group_name"] == "FeatGroup"
+
     # UPDATE SONG
     db.update_song(song_data["id"], song_data["link"], "OtherGenre", 420, song_data["featuring"])
     db.commit()
@@ -126,6 +152,15 @@ def test_database():
     assert len(db.get_songs({"genre": "OthErGenRE", "group": "tGro"})) == 1
     assert len(db.get_songs({"genre": "OtherGEnRE", "name": "songg"})) == 0
 
+    # SEARCH
+    assert db.search_available is trigram
+    assert db.search("testsong")[0]["song_id"] == song_data["id"]
+    assert db.search("tSon gro member1")[0]["featuring"][0]["group_id"] == featuring_id
+    assert db.search("son ot")[0]["song_id"] == song_data["id"]
+    assert db.search("song nothing") == []
+    assert db.count_search("Song OtherGenre") == 1
+    assert db.count_search("xx") == 0
+
     # CREATE ALBUM AND GET ALBUM(S)
     album_data = {
         "name": "TestAlbum",
@@ -181,6 +216,9 @@ def test_database():
     assert other_album_songs[0]["duration"] == 420
     assert other_album_songs[1]["duration"] == 69
 
+    assert db.count_search("testalbum") == 2
+    assert db.search("test", limit=1, offset=1)[0]["song_id"] in (song_data["id"], other_song_id)
+
     # CREATE PLAYLIST AND GET PLAYLIST(S)
     playlist_data = {
         "name": "TestPlaylist",
@@ -214,7 +252,7 @@ def test_database():
     assert playlist_songs[1]["song_id"] == other_song_id
 
     # GET GENRES
-    assert db.get_genres() == ['Othergenre', 'Genre']
+    assert db.get_genres() == ['Genre', 'Othergenre']
 
     # DATABASE END
     db.disconnect()
@@ -233,6 +271,278 @@ def test_database_cleanup():
     os.remove("./temp.db")
 
 
+def test_migrations_rollback(monkeypatch):
+    broken = ("Broken migration", ["CREATE TABLE broken (id INTEGER);", "INSERT INTO missing VALUES (1);"], None)
+    monkeypatch.setattr(sys.modules[DBMuziek.__module__], "MIGRATIONS", [*MIGRATIONS, broken])
+    db = DBMuziek("./temp-migrations.db")
+    db.connect()
+    db.validate_tables()
+
+    # The failing migration is rolled back, the previous ones are kept.
+    assert db.migrate() is None
+    assert db.schema_version() == len(MIGRATIONS)
+    assert db.table_exists("broken") == 0
+
+    db.disconnect()
+    os.remove("./temp-migrations.db")
+
+
+def test_pagination():
+    with DBMuziek("./temp-pages.db") as db:
+        groups = [db.create_group(name, [name]) for name in ("Beta", "alpha", "Gamma")]
+        for i in range(47):
+            db.create_song(f"Song {i % 10}", "link", "Genre", i, groups[i % 3], [])
+        db.commit()
+
+        # CURSORS
+        for order in ("song_id", "name", "group"):
+            songs, cursor = db.get_songs_after(limit=20, order=order)
+            seen = [s["song_id"] for s in songs]
+            while cursor:
+                songs, cursor = db.get_songs_after(cursor=cursor, limit=20, order=order)
+                seen.extend(s["song_id"] for s in songs)
+
+            assert len(seen) == 47
+            assert len(set(seen)) == 47
+
+        songs, cursor = db.get_songs_after(limit=5, order="group")
+        assert [s["group_name"] for s in songs] == ["alpha"] * 5
+        assert "sort_key" not in songs[0]
+        assert songs[0]["featuring"] == []
+
+        songs, cursor = db.get_songs_after({"group": "gamm"}, limit=50)
+        assert len(songs) == 15
+        assert cursor is None
+
+        with pytest.raises(ValueError):
+            db.get_songs_after(cursor=cursor, order="title")
+        with pytest.raises(ValueError):
+            db.get_songs_after(cursor=db.get_songs_anchors(per_page=10)[0], order="name")
+
+        # PAGER
+        pager = SongPager(db, per_page=10, order="name")
+        assert pager.total == 47
+        assert pager.pages == 5
+
+        last = pager.page(4)
+        assert len(last) == 7
+        assert pager.page(0) + pager.page(1) == db.get_songs_after(limit=20, order="name")[0]
+        assert pager.page(4) == last
+        assert pager.page(5) == []
+
+        pager = SongPager(db, {"name": "song 1"}, per_page=2)
+        assert [len(pager.page(i)) for i in range(pager.pages)] == [2, 2, 1]
+
+    os.remove("./temp-pages.db")
+
+
+def test_bulk():
+    with DBMuziek("./temp-bulk.db") as db:
+        existing = db.create_group("Existing", ["A"])
+        db.commit()
+
+        group_ids = db.bulk_create_groups([("existing", ["B"]), ("New", ["C", "D"]), ("NEW", ["E"])])
+        assert group_ids == {"existing": existing, "new": group_ids["new"]}
+        assert db.get_group("New")["members"] == "C,D"
+        assert db.get_group("Existing")["members"] == "A"
+
+        song_id = db.create_song("Old", "link", "Genre", 1, existing, [])
+        songs = [
+            {"name": "old", "link": "l", "genre": "G", "duration": 2, "group_id": existing, "featuring": []},
+            {"name": "Fresh", "link": "l", "genre": "G", "duration": 3, "group_id": existing,
+             "featuring": [group_ids["new"]]},
+            {"name": "Fresh", "link": "l", "genre": "G", "duration": 4, "group_id": group_ids["new"]},
+            {"name": "fresh", "link": "l", "genre": "G", "duration": 5, "group_id": existing, "featuring": []},
+        ]
+        song_ids = db.bulk_create_songs(songs)
+
+        assert song_ids[0] == song_id
+        assert song_ids[1] == song_ids[3]
+        assert len(set(song_ids)) == 3
+        assert db.get_song(song_id=song_ids[1])["featuring"][0]["group_id"] == group_ids["new"]
+        assert db.get_song(song_id=song_ids[2])["duration"] == 4
+
+        playlist_id = db.create_playlist("Bulk", "Joe")
+        db.bulk_link_playlist(playlist_id, song_ids)
+        db.commit()
+
+        assert [s["song_id"] for s in db.get_playlist_songs(playlist_id)] == sorted(set(song_ids))
+
+        # SQLite's lower() only folds ASCII, the names with other capitals are matched as they are.
+        accented = db.bulk_create_groups([("Émile", ["A"]), ("Émile", ["B"])])
+        assert accented == {"Émile": accented["Émile"]}
+        assert db.bulk_create_groups([("Émile", [])]) == accented
+        songs = [{"name": "Été", "link": "l", "genre": "G", "duration": 1, "group_id": accented["Émile"]}]
+        assert db.bulk_create_songs(songs) == db.bulk_create_songs(songs)
+
+    os.remove("./temp-bulk.db")
+
+
+def test_profiles():
+    with pytest.raises(ValueError):
+        DBMuziek("./temp-profile.db", "fastest")
+
+    with DBMuziek("./temp-profile.db") as db:
+        assert db.pragma("journal_mode") == "delete"
+        assert db.stored_profile() == "default"
+
+    with DBMuziek("./temp-profile.db", "performance") as db:
+        assert db.pragma("journal_mode") == "wal"
+        assert db.pragma("synchronous") == 1
+        assert db.pragma("temp_store") == 2
+        assert db.stored_profile() == "performance"
+
+    with DBMuziek("./temp-profile.db") as db:
+        assert db.pragma("journal_mode") == "wal"
+        assert db.pragma("busy_timeout") == 10000
+
+    with DBMuziek("./temp-profile.db", "default") as db:
+        assert db.pragma("journal_mode") == "delete"
+
+    os.remove("./temp-profile.db")
+
+
+def test_statements():
+    first, params = query_append("SELECT 1", "LIMIT ?", ("a = ?", 1), ("b = ?", None), ("(c, d) > (?, ?)", (2, 3)))
+    second, _ = query_append("SELECT 1", "LIMIT ?", ("a = ?", 4), ("b = ?", None), ("(c, d) > (?, ?)", (5, 6)))
+
+    assert first == "SELECT 1 WHERE a = ? AND (c, d) > (?, ?) LIMIT ?;"
+    assert params == [1, 2, 3]
+    assert first is second
+
+    assert bind_list([1]) == ("?", [1])
+    assert bind_list([1, 2, 3]) == ("?, ?, ?, ?", [1, 2, 3, None])
+
+    with DBMuziek("./temp-statements.db") as db:
+        db.get_songs({"name": "a"})
+        db.get_songs_featuring([1, 2, 3])
+        before = db.statement_stats
+        db.get_songs({"name": "b"})
+        db.get_songs_featuring([4, 5, 6, 7])
+        after = db.statement_stats
+
+        assert after["hits"] == before["hits"] + 2
+        assert after["misses"] == before["misses"]
+        assert after["capacity"] >= after["size"]
+
+    os.remove("./temp-statements.db")
+
+
+def test_threads():
+    with DBMuziek("./temp-threads.db") as db:
+        group_id = db.create_group("Main", ["Member"])
+        db.commit()
+
+        found = []
+        started = threading.Event()
+
+        def worker(index: int):
+            found.append(db.get_group(name="Main")["group_id"])
+            started.set()
+            with db.connection:
+                db.create_group(f"Worker {index}", ["Member"])
+            db.release()
+
+        # The main thread's write transaction makes the worker wait until the commit.
+        db.create_group("Pending", ["Member"])
+        thread = threading.Thread(target=worker, args=(0,))
+        thread.start()
+        assert started.wait(5)
+        assert len(db.get_groups()) == 2
+        db.commit()
+        thread.join()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(1, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert found == [group_id] * 5
+        assert len(db.get_groups()) == 7
+        assert len(db._pool) == 1
+
+    assert db.connection is None
+    os.remove("./temp-threads.db")
+
+
+def test_cache():
+    with DBMuziek("./temp-cache.db") as db:
+        group_id = db.create_group("Cached", ["A"])
+        song_id = db.create_song("Song", "link", "Genre", 60, group_id, [])
+        album_id = db.create_album("Album", [song_id], group_id)
+        # Nothing is cached while the transaction is pending.
+        assert db.get_group("cached")["group_id"] == group_id
+        assert db.cache_stats["size"] == 0
+        db.commit()
+
+        db.get_group("cached")
+        db.get_group(group_id=group_id)
+        db.get_song("song", group_id)
+        db.get_album("ALBUM", group_id)
+        before = db.cache_stats
+        assert before["size"] == 4
+        assert db.get_group("CACHED")["members"] == "A"
+        assert db.get_group(group_id=group_id)["members"] == "A"
+        assert db.get_album(album_id=album_id) is not None
+        assert db.cache_stats["hits"] == before["hits"] + 2
+
+        song = db.get_song("Song", group_id)
+        song["featuring"].append("modified")
+        assert db.get_song("Song", group_id)["featuring"] == []
+
+        db.update_group(group_id, ["A", "B"])
+        db.update_song(song_id, "other", "Genre", 60)
+        db.commit()
+        assert db.get_group("Cached")["members"] == "A,B"
+        assert db.get_group(group_id=group_id)["members"] == "A,B"
+        assert db.get_song(song_id=song_id)["link"] == "other"
+        assert db.get_song("song", group_id)["link"] == "other"
+
+        # The songs featuring a group show its new members.
+        featured_id = db.create_group("Featured", ["X"])
+        featuring_id = db.create_song("Featuring", "link", "Genre", 60, group_id, [featured_id])
+        db.commit()
+        assert db.get_song(song_id=featuring_id)["featuring"][0]["members"] == "X"
+        db.update_group(featured_id, ["Y", "Z"])
+        db.commit()
+        assert db.get_song(song_id=featuring_id)["featuring"][0]["members"] == "Y,Z"
+        assert db.get_song("featuring", group_id)["featuring"][0]["members"] == "Y,Z"
+
+        assert db.get_group("Unknown") is None
+        db.create_group("Unknown", [])
+        db.commit()
+        assert db.get_group("Unknown") is not None
+        assert 0 < db.cache_stats["hit_rate"] < 1
+
+    os.remove("./temp-cache.db")
+
+
+def test_async():
+    async def scenario():
+        async with AsyncDBMuziek("./temp-async.db") as db:
+            async with db.transaction():
+                group_id = await db.create_group("Async", ["Member"])
+                await db.create_song("Song", "link", "Genre", 60, group_id, [])
+
+            with pytest.raises(RuntimeError):
+                async with db.transaction():
+                    await db.create_group("Discarded", ["Member"])
+                    raise RuntimeError
+
+            songs, groups = await asyncio.gather(db.get_songs(), db.get_groups())
+            assert [song["song_name"] for song in songs] == ["Song"]
+            assert [group["group_name"] for group in groups] == ["Async"]
+            assert (await db.get_group(group_id=group_id))["group_name"] == "Async"
+            assert (await db.execute("SELECT count(*) FROM songs;"))[0][0] == 1
+            assert (await db.statement_stats())["misses"] > 0
+
+        assert db.db.connection is None
+
+    asyncio.run(scenario())
+    os.remove("./temp-async.db")
+
+
 def test_format_duration():
     assert format_duration(59) == "0:59"
     assert format_duration(326) == "5:26"
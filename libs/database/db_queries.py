@@ -1,9 +1,17 @@
 table_exists = "SELECT count(name) FROM sqlite_master WHERE type='table' AND name=?;"
 
+index_exists = "SELECT count(name) FROM sqlite_master WHERE type='index' AND name=?;"
+
 foreign_keys = "PRAGMA foreign_keys;"
 
 foreign_keys_enable = "PRAGMA foreign_keys = ON;"
 
+set_pragma = "PRAGMA {} = {};"
+
+get_pragma = "PRAGMA {};"
+
+fts5_enabled = "SELECT sqlite_compileoption_used('ENABLE_FTS5');"
+
 create_groups = '''
 CREATE TABLE groups (
     group_id INTEGER PRIMARY KEY,
@@ -81,6 +89,97 @@ CREATE TABLE settings (
 );
 '''
 
+create_schemaVersion = '''
+CREATE TABLE schemaVersion (
+    version INTEGER NOT NULL,
+    applied_at INTEGER NOT NULL,
+    PRIMARY KEY (version)
+);
+'''
+
+get_schema_version = "SELECT coalesce(max(version), 0) FROM schemaVersion;"
+
+get_schema_versions = "SELECT version FROM schemaVersion;"
+
+set_schema_version = "INSERT INTO schemaVersion(version, applied_at) VALUES (?, strftime('%s', 'now'));"
+
+create_index_songs_name = "CREATE INDEX IF NOT EXISTS idx_songs_name ON songs (lower(name));"
+
+create_index_songs_genre = "CREATE INDEX IF NOT EXISTS idx_songs_genre ON songs (lower(genre));"
+
+create_index_songs_group = "CREATE INDEX IF NOT EXISTS idx_songs_group ON songs (group_id);"
+
+create_index_groups_name = "CREATE INDEX IF NOT EXISTS idx_groups_name ON groups (lower(name));"
+
+create_index_albums_name = "CREATE INDEX IF NOT EXISTS idx_albums_name ON albums (lower(name));"
+
+create_index_albums_group = "CREATE INDEX IF NOT EXISTS idx_albums_group ON albums (group_id);"
+
+create_index_playlists_name = "CREATE INDEX IF NOT EXISTS idx_playlists_name ON playlists (lower(name));"
+
+create_index_songFeaturing_group = "CREATE INDEX IF NOT EXISTS idx_songFeaturing_group ON songFeaturing (group_id);"
+
+create_index_albumSongs_song = "CREATE INDEX IF NOT EXISTS idx_albumSongs_song ON albumSongs (song_id);"
+
+create_index_playlistSongs_song = "CREATE INDEX IF NOT EXISTS idx_playlistSongs_song ON playlistSongs (song_id);"
+
+create_songSearch = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS songSearch USING fts5(
+    song_name, group_name, members, genre, album_names,
+    tokenize = 'trigram'
+);
+'''
+
+# The names of the albums of the song s, separated by spaces.
+_album_names = '''coalesce((
+            SELECT group_concat(a.name, ' ')
+                FROM albumSongs as x
+                    JOIN albums as a ON a.album_id = x.album_id
+                WHERE x.song_id = s.song_id
+        ), '')'''
+
+search_content = f'''
+INSERT INTO songSearch(rowid, song_name, group_name, members, genre, album_names)
+    SELECT s.song_id, s.name, coalesce(g.name, ''), coalesce(g.members, ''), s.genre, {_album_names}
+        FROM songs as s
+            LEFT JOIN groups as g ON s.group_id = g.group_id
+'''
+
+fill_songSearch = f"{search_content};"
+
+
+def _search_trigger(name: str, event: str, ids: str) -> str:
+    """Generates a trigger reindexing the songs selected by `ids` after `event`."""
+    return f'''
+CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} BEGIN
+    DELETE FROM songSearch WHERE rowid IN ({ids});
+{search_content}        WHERE s.song_id IN ({ids});
+END;
+'''
+
+
+create_trigger_songs_insert = _search_trigger("songSearch_songs_insert", "INSERT ON songs", "NEW.song_id")
+
+create_trigger_songs_update = _search_trigger("songSearch_songs_update", "UPDATE ON songs", "NEW.song_id")
+
+create_trigger_songs_delete = '''
+CREATE TRIGGER IF NOT EXISTS songSearch_songs_delete AFTER DELETE ON songs BEGIN
+    DELETE FROM songSearch WHERE rowid = OLD.song_id;
+END;
+'''
+
+create_trigger_groups_update = _search_trigger("songSearch_groups_update", "UPDATE ON groups",
+                                               "SELECT song_id FROM songs WHERE group_id = NEW.group_id")
+
+create_trigger_albums_update = _search_trigger("songSearch_albums_update", "UPDATE OF name ON albums",
+                                               "SELECT song_id FROM albumSongs WHERE album_id = NEW.album_id")
+
+create_trigger_albumSongs_insert = _search_trigger("songSearch_albumSongs_insert", "INSERT ON albumSongs",
+                                                   "NEW.song_id")
+
+create_trigger_albumSongs_delete = _search_trigger("songSearch_albumSongs_delete", "DELETE ON albumSongs",
+                                                   "OLD.song_id")
+
 count_songs = '''
 SELECT count(song_id)
     FROM songs as s
@@ -120,6 +219,56 @@ SELECT song_id, s.name as song_name, duration, g.name as group_name, link, genre
         LEFT JOIN groups as g ON s.group_id = g.group_id
 '''
 
+search_songs = '''
+SELECT s.song_id as song_id, s.name as song_name, s.duration as duration, g.name as group_name, s.link as link,
+       s.genre as genre, g.group_id as group_id
+    FROM songSearch as f
+        JOIN songs as s ON s.song_id = f.rowid
+        LEFT JOIN groups as g ON s.group_id = g.group_id
+'''
+
+count_search_songs = '''
+SELECT count(f.rowid)
+    FROM songSearch as f
+'''
+
+append_search_match = "songSearch MATCH ?"
+
+append_search_term = ("instr(lower(f.song_name || ' ' || f.group_name || ' ' || f.members || ' ' || f.genre || ' ' || "
+                      "f.album_names), ?) > 0")
+
+append_search_term_fallback = ("instr(lower(s.name || ' ' || coalesce(g.name, '') || ' ' || coalesce(g.members, '') || "
+                               f"' ' || s.genre || ' ' || {_album_names}), ?) > 0")
+
+search_rank = "ORDER BY f.rank LIMIT ? OFFSET ?"
+
+search_order = "ORDER BY song_id LIMIT ? OFFSET ?"
+
+song_orders = {
+    "song_id": "s.song_id",
+    "name": "lower(s.name)",
+    "group": "coalesce(lower(g.name), '')"
+}
+
+get_songs_sorted = '''
+SELECT song_id, s.name as song_name, duration, g.name as group_name, link, genre, g.group_id as group_id,
+       {} as sort_key
+    FROM songs as s
+        LEFT JOIN groups as g ON s.group_id = g.group_id
+'''
+
+get_songs_positions = '''
+SELECT {0} as sort_key, s.song_id as song_id, row_number() OVER (ORDER BY {0}, s.song_id) as position
+    FROM songs as s
+        LEFT JOIN groups as g ON s.group_id = g.group_id
+'''
+
+get_songs_anchors = "SELECT sort_key, song_id FROM ({}) WHERE position % ? = 0 ORDER BY position;"
+
+append_cursor = "({}, s.song_id) > (?, ?)"
+
+sorted_paging = "ORDER BY {}, s.song_id LIMIT ?"
+
 append_genre = "lower(genre) = lower(?)"
 
 append_name = "lower(s.name) LIKE lower(?)"
@@ -128,6 +277,10 @@ append_group = "lower(g.name) LIKE lower(?)"
 
 append_group_id = "g.group_id = ?"
 
+append_search_name = "s.song_id IN (SELECT rowid FROM songSearch WHERE song_name LIKE ?)"
+
+append_search_group = "s.song_id IN (SELECT rowid FROM songSearch WHERE group_name LIKE ?)"
+
 paging = "LIMIT ? OFFSET ?"
 
 get_group = '''
@@ -142,6 +295,20 @@ SELECT group_id, members, name as group_name
     WHERE group_id = ?;
 '''
 
+get_groups_ids = """
+SELECT min(group_id) as group_id, lower(name) as key
+    FROM groups
+    WHERE lower(name) IN ({})
+    GROUP BY lower(name);
+"""
+
+get_songs_ids = """
+SELECT min(song_id) as song_id, lower(name) as key, group_id
+    FROM songs
+    WHERE lower(name) IN ({})
+    GROUP BY lower(name), group_id;
+"""
+
 add_song_playlist = "INSERT OR IGNORE INTO playlistSongs VALUES (?, ?);"
 
 get_playlist_songs = '''
@@ -207,8 +374,86 @@ get_setting = "SELECT value FROM settings WHERE key = ?;"
 
 set_setting = "INSERT OR REPLACE INTO settings(key, value) VALUES (?, ?);"
 
+create_apiCache = '''
+CREATE TABLE IF NOT EXISTS apiCache (
+    key TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    body TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (key)
+);
+'''
+
+create_index_apiCache_used = "CREATE INDEX IF NOT EXISTS idx_apiCache_used ON apiCache (used_at);"
+
+# The time in seconds with milliseconds, the answers used in the same second are still ordered.
+_now = "(julianday('now') - 2440587.5) * 86400.0"
+
+# The writes of the cache are made in a savepoint: they're committed right away when no transaction is pending,
+# and never commit the transaction of the caller otherwise.
+savepoint_api_cache = "SAVEPOINT apiCache;"
+
+release_api_cache = "RELEASE apiCache;"
+
+rollback_api_cache = "ROLLBACK TO apiCache;"
+
+get_api_answer = "SELECT etag, body FROM apiCache WHERE key = ?;"
+
+set_api_answer = f'''
+INSERT OR REPLACE INTO apiCache(key, etag, body, size, used_at) VALUES (?, ?, ?, ?, {_now});
+'''
+
+touch_api_answer = f"UPDATE apiCache SET used_at = {_now} WHERE key = ?;"
+
+delete_old_api_answers = f"DELETE FROM apiCache WHERE used_at < {_now} - ?;"
+
+get_api_answers_sizes = "SELECT key, size FROM apiCache ORDER BY used_at DESC;"
+
+delete_api_answer = "DELETE FROM apiCache WHERE key = ?;"
+
+get_api_cache_size = "SELECT count(key), coalesce(sum(size), 0) FROM apiCache;"
+
+create_ytSyncPlaylists = '''
+CREATE TABLE IF NOT EXISTS ytSyncPlaylists (
+    playlist_id INTEGER,
+    yt_playlist_id TEXT NOT NULL,
+    synced_at INTEGER NOT NULL,
+    PRIMARY KEY (playlist_id),
+    FOREIGN KEY (playlist_id) REFERENCES PLAYLISTS (playlist_id)
+);
+'''
+
+create_ytSync = '''
+CREATE TABLE IF NOT EXISTS ytSync (
+    playlist_id INTEGER,
+    video_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    PRIMARY KEY (playlist_id, video_id),
+    FOREIGN KEY (playlist_id) REFERENCES PLAYLISTS (playlist_id)
+);
+'''
+
+get_sync_playlist = "SELECT yt_playlist_id FROM ytSyncPlaylists WHERE playlist_id = ?;"
+
+set_sync_playlist = "INSERT OR REPLACE INTO ytSyncPlaylists VALUES (?, ?, strftime('%s', 'now'));"
+
+get_sync_items = "SELECT video_id, item_id FROM ytSync WHERE playlist_id = ?;"
+
+set_sync_item = "INSERT OR REPLACE INTO ytSync(playlist_id, video_id, item_id) VALUES (?, ?, ?);"
+
+delete_sync_item = "DELETE FROM ytSync WHERE playlist_id = ? AND video_id = ?;"
+
+delete_sync_items = "DELETE FROM ytSync WHERE playlist_id = ?;"
+
+remove_song_playlist = "DELETE FROM playlistSongs WHERE playlist_id = ? AND song_id = ?;"
+
+get_songs_links = "SELECT song_id, link FROM songs;"
+
 delete_song_featuring = "DELETE FROM songFeaturing WHERE song_id = ?;"
 
+get_group_featured_songs = "SELECT song_id FROM songFeaturing WHERE group_id = ?;"
+
 get_song_featuring = """
 SELECT f.group_id as group_id, g.name as group_name, members
     FROM songFeaturing as f
@@ -216,6 +461,13 @@ SELECT f.group_id as group_id, g.name as group_name, members
     WHERE f.song_id = ?;
 """
 
+get_songs_featuring = """
+SELECT f.song_id as song_id, f.group_id as group_id, g.name as group_name, members
+    FROM songFeaturing as f
+        LEFT JOIN groups as g on f.group_id = g.group_id
+    WHERE f.song_id IN ({});
+"""
+
 get_albums = """
 SELECT a.name as album_name, g.name as group_name, album_id
     FROM albums as a
@@ -224,4 +476,4 @@ SELECT a.name as album_name, g.name as group_name, album_id
 
 get_groups = "SELECT name as group_name, members, group_id FROM groups;"
 
-get_genres = "SELECT DISTINCT lower(genre) as genre FROM songs;"
+get_genres = "SELECT DISTINCT lower(genre) as genre FROM songs ORDER BY lower(genre);"
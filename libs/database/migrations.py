@@ -0,0 +1,54 @@
+"""Ordered list of the changes applied to the schema since the tables were first created.
+
+Each migration is a tuple made of a description, the queries to run and an optional requirement, its version is
+its position in the list (starting at 1). A migration is never modified once released, new changes are appended at
+the end.
+
+A requirement is a function receiving the sqlite3 connection, if it returns False the migration is skipped and
+retried the next time the database is opened.
+"""
+import sqlite3
+
+from . import db_queries
+
+
+def fts5_trigram(connection: sqlite3.Connection) -> bool:
+    """Checks if SQLite has been compiled with FTS5 and is recent enough to have the trigram tokenizer (3.34)."""
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        return False
+    return bool(connection.execute(db_queries.fts5_enabled).fetchone()[0])
+
+
+MIGRATIONS = [
+    ("Index the lookup and foreign key columns", [
+        db_queries.create_index_songs_name,
+        db_queries.create_index_songs_genre,
+        db_queries.create_index_songs_group,
+        db_queries.create_index_groups_name,
+        db_queries.create_index_albums_name,
+        db_queries.create_index_albums_group,
+        db_queries.create_index_playlists_name,
+        db_queries.create_index_songFeaturing_group,
+        db_queries.create_index_albumSongs_song,
+        db_queries.create_index_playlistSongs_song,
+    ], None),
+    ("Index the songs for full-text search", [
+        db_queries.create_songSearch,
+        db_queries.fill_songSearch,
+        db_queries.create_trigger_songs_insert,
+        db_queries.create_trigger_songs_update,
+        db_queries.create_trigger_songs_delete,
+        db_queries.create_trigger_groups_update,
+        db_queries.create_trigger_albums_update,
+        db_queries.create_trigger_albumSongs_insert,
+        db_queries.create_trigger_albumSongs_delete,
+    ], fts5_trigram),
+    ("Cache the answers of the YouTube API", [
+        db_queries.create_apiCache,
+        db_queries.create_index_apiCache_used,
+    ], None),
+    ("Remember the songs synced with the YouTube playlists", [
+        db_queries.create_ytSyncPlaylists,
+        db_queries.create_ytSync,
+    ], None),
+]
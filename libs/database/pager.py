@@ -0,0 +1,58 @@
+import math
+from typing import List, Optional
+
+from . import DBMuziek
+
+
+class SongPager:
+    def __init__(self, db: DBMuziek, filters: Optional[dict] = None, per_page: int = 20, order: str = "song_id"):
+        """This class splits the songs in pages, fetched with cursors instead of offsets.
+        The cursor of every page already reached is kept, so going back and forth costs a single query.
+
+        :param db: The database used.
+        :param filters: The filters the songs need to fit.
+        :param per_page: The amount of songs per page.
+        :param order: What the songs are sorted by, one of the keys of db_queries.song_orders.
+        """
+        self._db = db
+        self._filters = filters
+        self._order = order
+        self.per_page = per_page
+        self.total = db.count_songs(filters) or 0
+
+        # _cursors[i] is the cursor of the page i, the first page doesn't need any.
+        self._cursors: List[Optional[str]] = [None]
+        self._complete = False
+
+    @property
+    def pages(self) -> int:
+        return math.ceil(self.total / self.per_page)
+
+    def page(self, index: int) -> List[dict]:
+        """Returns the songs of a page.
+
+        :param index: The index of the page, starting at 0.
+        :PRE: The database object needs to be connected.
+        :POST: Returns a list of songs like DBMuziek.get_songs, empty if the page doesn't exist.
+        """
+        if index < 0:
+            return []
+
+        if index >= len(self._cursors) and not self._complete:
+            # Jumping forward: every cursor is computed in one pass instead of loading the pages in between.
+            self._cursors = [None, *(self._db.get_songs_anchors(self._filters, self.per_page, self._order) or [])]
+            self._complete = True
+
+        if index >= len(self._cursors):
+            return []
+
+        result = self._db.get_songs_after(self._filters, self._cursors[index], self.per_page, self._order)
+        if result is None:
+            return []
+
+        songs, next_cursor = result
+
+        if next_cursor and index + 1 == len(self._cursors):
+            self._cursors.append(next_cursor)
+
+        return songs
@@ -0,0 +1,162 @@
+"""Connections shared by the threads of the application.
+
+Every thread gets its own sqlite3 connection, so reads never wait for each other,
+but only one of them can hold a write transaction at a time: the first write statement
+takes the writer lock, the commit or the rollback gives it back.
+"""
+import re
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable
+
+from .statements import STATEMENT_CACHE_SIZE, StatementRegistry
+
+# The statements that start a write transaction, or change the schema.
+WRITE_STATEMENT = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE)
+
+
+class PooledConnection:
+    def __init__(self, connection: sqlite3.Connection, writer: threading.Lock, timeout: float):
+        """The connection of one thread, it behaves like a sqlite3 connection
+        but its write transactions are serialized with the other threads.
+
+        :param connection: The sqlite3 connection of the thread.
+        :param writer: The lock shared by the connections of the pool.
+        :param timeout: How long to wait for the writer lock, in seconds.
+        """
+        self._connection = connection
+        self._writer = writer
+        self._timeout = timeout
+        self._writing = False
+        self.statements = StatementRegistry()
+
+    def __getattr__(self, name: str):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        """Commits the transaction, or rolls it back if an exception was raised, like a sqlite3 connection."""
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def _acquire(self, query: str):
+        """Takes the writer lock before the first write statement of a transaction.
+
+        :raises sqlite3.OperationalError if another thread kept it longer than the timeout.
+        """
+        if not self._writing and WRITE_STATEMENT.match(query):
+            if not self._writer.acquire(timeout=self._timeout):
+                raise sqlite3.OperationalError("database is locked")
+            self._writing = True
+
+    def _release(self):
+        """Gives the writer lock back once no transaction is pending anymore."""
+        if self._writing and not self._connection.in_transaction:
+            self._writing = False
+            self._writer.release()
+
+    def execute(self, query: str, parameters=()) -> sqlite3.Cursor:
+        self._acquire(query)
+        try:
+            return self._connection.execute(query, parameters)
+        finally:
+            self._release()
+
+    def executemany(self, query: str, parameters: Iterable) -> sqlite3.Cursor:
+        self._acquire(query)
+        try:
+            return self._connection.executemany(query, parameters)
+        finally:
+            self._release()
+
+    def commit(self):
+        try:
+            self._connection.commit()
+        finally:
+            self._release()
+
+    def rollback(self):
+        try:
+            self._connection.rollback()
+        finally:
+            self._release()
+
+    def close(self):
+        """Closes the connection, what wasn't committed is lost."""
+        try:
+            self._connection.close()
+        finally:
+            if self._writing:
+                self._writing = False
+                self._writer.release()
+
+
+class ConnectionPool:
+    def __init__(self, path: str, setup: Callable[[PooledConnection], None], timeout: float = 5.0):
+        """Opens a connection to the database file for each thread that needs one.
+
+        :param path: The path to the database file.
+        :param setup: Called with every new connection, to apply the pragmas for example.
+        :param timeout: How long a thread waits for the writer lock, in seconds.
+        """
+        self._path = path
+        self._setup = setup
+        self._connections: Dict[int, PooledConnection] = {}
+        self._lock = threading.Lock()
+        self._writer = threading.Lock()
+        self.timeout = timeout
+
+    def connection(self) -> PooledConnection:
+        """Returns the connection of the current thread, it's opened the first time.
+
+        :PRE: _
+        :POST: Returns a connection only used by the current thread.
+        """
+        thread_id = threading.get_ident()
+        connection = self._connections.get(thread_id)
+
+        if connection is None:
+            raw = sqlite3.connect(self._path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+            raw.row_factory = sqlite3.Row
+            connection = PooledConnection(raw, self._writer, self.timeout)
+            with self._lock:
+                self._connections[thread_id] = connection
+            self._setup(connection)
+
+        return connection
+
+    @property
+    def writing(self) -> bool:
+        """Whether a thread holds a write transaction."""
+        return self._writer.locked()
+
+    def release(self):
+        """Closes the connection of the current thread, to be called by a worker thread when it's done.
+
+        :PRE: _
+        :POST: The connection of the current thread is closed, the next query will open a new one.
+        """
+        with self._lock:
+            connection = self._connections.pop(threading.get_ident(), None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        """Closes the connections of every thread.
+
+        :PRE: The threads shouldn't be using the database anymore.
+        :POST: Every connection is closed.
+        """
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+
+    def __len__(self):
+        return len(self._connections)
@@ -0,0 +1,30 @@
+"""Connection profiles, the pragmas applied to the database connection when it's opened.
+
+The profile used is stored in the settings table under "db.profile", so it only needs to be chosen once.
+"""
+
+PROFILES = {
+    # SQLite's own defaults: rollback journal, every commit is synced to the disk.
+    "default": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    # Write-ahead log, only synced at checkpoints: a crash can lose the last commits but never corrupts the file.
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # in KiB when negative
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+    # Write-ahead log for the concurrent readers, but every commit is still synced.
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 10000,
+    },
+}
+
+DEFAULT_PROFILE = "default"
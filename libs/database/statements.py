@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Tuple
+
+# sqlite3 compiles each statement once and keeps it in a per-connection LRU cache of this size.
+STATEMENT_CACHE_SIZE = 512
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def query_shape(prefix: str, suffix: str, blocks: Tuple[str, ...]) -> str:
+    """Builds the query made of a prefix, the blocks joined in a WHERE clause and a suffix.
+    Each distinct shape is only built once, so it's always the same string for the statement cache.
+
+    :param prefix: What the query will start with, so the columns and tables.
+    :param suffix: What the query will end with, for example a LIMIT or OFFSET.
+    :param blocks: The conditions of the WHERE clause.
+    :PRE: _
+    :POST: Returns the query.
+    """
+    appendix = ' AND '.join(blocks)
+
+    if appendix:
+        prefix = f'{prefix} WHERE {appendix}'
+    return f'{prefix} {suffix};'
+
+
+class StatementRegistry:
+    def __init__(self, capacity: int = STATEMENT_CACHE_SIZE):
+        """Keeps track of the statements executed on a connection, mirroring the LRU cache of sqlite3,
+        to know how many executions reused an already compiled statement.
+
+        :param capacity: The size of the statement cache of the connection.
+        """
+        self._capacity = capacity
+        self._statements = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, query: str):
+        """Records the execution of a statement.
+
+        :param query: The query executed.
+        :PRE: _
+        :POST: Counts a hit if the statement was still cached, a miss if it had to be compiled.
+        """
+        if query in self._statements:
+            self._statements.move_to_end(query)
+            self.hits += 1
+        else:
+            self._statements[query] = None
+            self.misses += 1
+            if len(self._statements) > self._capacity:
+                self._statements.popitem(last=False)
+
+    def clear(self):
+        """Forgets the statements cached, as when the connection is closed.
+
+        :PRE: _
+        :POST: The statements are forgotten, the counters are kept.
+        """
+        self._statements.clear()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._statements),
+            "capacity": self._capacity
+        }
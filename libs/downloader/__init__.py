@@ -1,26 +1,53 @@
 import os
+import shutil
+import time
 
-import music_tag
 import youtube_dl
+from youtube_dl.compat import compat_HTTPError
 
 from ..logger import get_logger
+from .index import PARTIAL, DownloadIndex, song_file
+from .metadata import FORMATS_TTL, METADATA_FILE, METADATA_SIZE, METADATA_TTL, MetadataCache
+from .tagging import TagQueue, song_tags
+from .throttle import THROTTLE_CODES, THROTTLE_RETRIES, throttle
+from .transcode import DEFAULT_CODEC, DEFAULT_PRESET, check_format, transcode
 
 default_config = {
     "quiet": True,
     "format": "bestaudio/best",
-    "postprocessors": [{
-        'key': 'FFmpegExtractAudio',
-        'preferredcodec': 'mp3',
-        'preferredquality': '192',
-    }],
+    # The audio is extracted by extract_audio, after the download, see transcode.
+    "audio_codec": DEFAULT_CODEC,
+    "audio_preset": DEFAULT_PRESET,
     "download_dir": "./songs",
     "ignoreerrors": True,
-    "no_color": True
+    "no_color": True,
+    # Interrupted downloads are kept as .part files and resumed with range requests.
+    "continuedl": True,
+    "http_chunk_size": 10 * 1024 * 1024,
+    "metadata_cache": True,
+    "metadata_ttl": METADATA_TTL,
+    "metadata_size": METADATA_SIZE
 }
 
+# Filled with the information of the song stored in the database, added to the video information.
+song_template = os.path.join("%(song_id)s", "%(song_name)s - %(group_name)s.%(ext)s")
+
 logger = get_logger("yt-DL")
 
 
+def info_key(video_info):
+    """Returns the key of a video from its information, the same as SongDownloader.video_key for its url.
+
+    :param video_info: The information returned by fetch_song.
+    :PRE: _
+    :POST: Returns the key, None if the video was found by the generic extractor.
+    """
+    extractor, video_id = video_info.get("extractor_key"), video_info.get("id")
+    if not extractor or not video_id or extractor == "Generic":
+        return None
+    return f"{extractor}:{video_id}"
+
+
 class SongDownloader(youtube_dl.YoutubeDL):
     def __init__(self, config=None):
         """Creates the SongDownloader object with the settings provided.
@@ -31,51 +58,215 @@ class SongDownloader(youtube_dl.YoutubeDL):
         if config is None:
             config = {}
         self._config = {**default_config, **config, "logger": logger}
+        self._config.setdefault("outtmpl", os.path.join(self._config["download_dir"], song_template))
+        check_format(self._config["audio_codec"], self._config["audio_preset"])
 
         self._video_info = None
         if not os.path.exists(self._config["download_dir"]):
             os.mkdir(self._config["download_dir"])
 
+        self._index = DownloadIndex.of(self._config["download_dir"])
+        self._tags = TagQueue.of(self._config["download_dir"])
+        self._metadata = None
+        if self._config["metadata_cache"]:
+            self._metadata = MetadataCache(os.path.join(self._config["download_dir"], METADATA_FILE),
+                                           self._config["metadata_ttl"], self._config["metadata_size"])
+
         super().__init__(self._config)
+        self.add_progress_hook(throttle.hook)
 
-    def fetch_song(self, url: str):
+    def fetch_song(self, url: str, refresh: bool = False):
         """Will extract the information from the provided link and return it.
+        The information is cached, a video fetched recently isn't fetched again.
 
         :author: Carlos
         :param url: The url of the video.
+        :param refresh: If the cache should be ignored, the information fetched is still stored.
         :PRE: _
         :POST: Returns a dict with the video information if the url is correct, None if the url isn't.
+               The time it was fetched is stored under "fetched_at".
         """
-        info = self.extract_info(url=url, download=False)
+        key = self.video_key(url) if self._metadata else None
+
+        info = self._metadata.get(key) if key and not refresh else None
+        if info is None:
+            info = self.extract_info(url=url, download=False)
+            if info:
+                info["fetched_at"] = time.time()
+                if key:
+                    self._metadata.put(key, info)
+
         self._video_info = info
         return info
 
-    def download_song(self, song_data):
+    def video_key(self, url: str):
+        """Returns the key of a video in the cache, made of the extractor and the id of the video,
+        so every link to the same video has the same key.
+
+        :param url: The url of the video.
+        :PRE: _
+        :POST: Returns the key, None if no extractor but the generic one supports the url.
+        """
+        for extractor in self._ies:
+            if extractor.suitable(url):
+                if extractor.ie_key() == "Generic":
+                    return None
+                try:
+                    return f"{extractor.ie_key()}:{extractor._match_id(url)}"
+                except (AssertionError, IndexError):
+                    return None
+        return None
+
+    def urlopen(self, req):
+        """Sends a request through the throttle shared by every downloader, see throttle.
+        A request refused because of the amount of requests is sent again once the host has been left alone.
+
+        :param req: The request, or its url.
+        :PRE: _
+        :POST: Returns the answer.
+        :raises urllib.error.HTTPError if the request failed, or has been refused too many times.
+        """
+        url = req if isinstance(req, str) else req.get_full_url()
+        for attempt in range(THROTTLE_RETRIES + 1):
+            throttle.before_request(url)
+            try:
+                response = super().urlopen(req)
+            except compat_HTTPError as e:
+                if e.code not in THROTTLE_CODES or attempt == THROTTLE_RETRIES:
+                    raise
+                delay = throttle.refused(url, e.headers.get("Retry-After"))
+                logger.warning(f"The request has been refused ({e.code}), retrying in {delay:.1f} s.")
+            else:
+                throttle.succeeded(url)
+                return response
+
+    def reset(self, progress_hooks=()):
+        """Forgets the last song fetched and replaces the progress hooks, so the downloader can be reused.
+
+        :param progress_hooks: The new progress hooks.
+        :PRE: _
+        :POST: The downloader is like a new one with these progress hooks, and the one of the throttle.
+        """
+        self._video_info = None
+        self._progress_hooks = [*progress_hooks, throttle.hook]
+
+    def download_song(self, song_data, video_info=None):
         """Will download the previously fetched song and use the information from the database to choose
         where and how to store it.
         The song will be stored at "${download_dir}/${song_id}/${song_name} - ${group_name}.mp3"
-        with the right metadata.
+        with the right metadata, the extension being the one of the audio codec configured.
 
         :author: Carlos
         :param song_data: The information about the song stored in the database.
-        :PRE: An url must have been fetched before.
+        :param video_info: The information returned by fetch_song, the last song fetched if None.
+        :PRE: An url must have been fetched before, or its information provided.
         :POST: The song is downloaded to the right spot.
         :raises ValueError if there hasn't been a fetch_song before.
         """
+        song_path = self.download_source(song_data, video_info)
+        if song_path:
+            self.extract_audio(song_path)
+        self.update_metadata(song_data)
+
+    def download_source(self, song_data, video_info=None, reuse=True):
+        """Will download a fetched song to its folder, without converting it.
+
+        :param song_data: The information about the song stored in the database.
+        :param video_info: The information returned by fetch_song, the last song fetched if None.
+        :param reuse: If the file of another song downloaded from the same video should be linked instead.
+        :PRE: An url must have been fetched before, or its information provided.
+        :POST: The song is downloaded to its folder, returns its path or None if the download failed.
+        :raises ValueError if there hasn't been a fetch_song before.
+        """
+        if video_info is not None:
+            self._video_info = video_info
         if not self._video_info:
             raise ValueError("A video needs to be fetched before it can be downloaded.")
 
-        download_folder = os.path.join(self._config["download_dir"], str(song_data["song_id"]))
-        if not os.path.exists(download_folder):
-            os.mkdir(download_folder)
+        key = info_key(self._video_info)
+        song_path = self.link_duplicate(song_data, key) if key and reuse else None
+        if song_path:
+            return song_path
 
-        file_name = f'{song_data["song_name"]} - {song_data["group_name"]}.%(ext)s'
-        self.params["outtmpl"] = os.path.join(download_folder, file_name)
+        if time.time() - self._video_info.get("fetched_at", time.time()) > FORMATS_TTL:
+            self.fetch_song(self._video_info["webpage_url"], refresh=True)
+            if not self._video_info:
+                return None
 
-        self.prepare_filename(self._video_info)
-        self.download([self._video_info["url"]])
+        self._index.mark_pending(song_data["song_id"])
+        info = {
+            **self._video_info,
+            "song_id": song_data["song_id"],
+            "song_name": song_data["song_name"],
+            "group_name": song_data["group_name"]
+        }
+        self.process_ie_result(info, download=True)
 
-        self.update_metadata(song_data)
+        song_path = self._find_file(song_data["song_id"])
+        if song_path:
+            # It's complete once it's tagged.
+            self._index.record(song_data["song_id"], song_path, with_checksum=False, state=PARTIAL, video_key=key)
+        return song_path
+
+    def link_duplicate(self, song_data, video_key=None, videos=None):
+        """Stores a song with the file of another song downloaded from the same video, without downloading it.
+        The file is hard linked, so it takes no space until one of the songs is tagged differently.
+
+        :param song_data: The information about the song stored in the database.
+        :param video_key: The key of the video, the one of the link of the song if None.
+        :param videos: The songs downloaded by the key of their video, see downloaded_videos.
+                       The whole index is searched if None.
+        :PRE: _
+        :POST: Returns the path of the song, None if no other song has been downloaded from the video.
+               The song still needs to be converted and tagged, like a download.
+        """
+        video_key = video_key or self.video_key(song_data["link"])
+        if not video_key:
+            return None
+        if videos is None:
+            source = self._index.find_video(video_key, exclude=song_data["song_id"])
+        else:
+            source_id = videos.get(video_key)
+            source = self._index.get(source_id) if source_id not in (None, song_data["song_id"]) else None
+        if not source or not os.path.isfile(source["path"]):
+            return None
+
+        song_path = self.prepare_filename({
+            "song_id": song_data["song_id"],
+            "song_name": song_data["song_name"],
+            "group_name": song_data["group_name"],
+            "ext": os.path.splitext(source["path"])[1][1:]
+        })
+        os.makedirs(os.path.dirname(song_path), exist_ok=True)
+        if os.path.exists(song_path):
+            os.remove(song_path)
+        try:
+            os.link(source["path"], song_path)
+        except OSError:
+            # The file system doesn't support hard links, it's still neither downloaded nor converted again.
+            shutil.copy2(source["path"], song_path)
+
+        self._index.record(song_data["song_id"], song_path, with_checksum=False, state=PARTIAL, video_key=video_key)
+        return song_path
+
+    def extract_audio(self, path: str) -> str:
+        """Converts a downloaded video to the audio codec configured with FFmpeg, see transcode.
+
+        :param path: The path of the downloaded file.
+        :PRE: FFmpeg needs to be installed.
+        :POST: The file is replaced by the audio file, returns the path of the audio file.
+               The conversion is made in a temporary folder, so an interrupted one leaves no partial file.
+        :raises TranscodeError if the conversion failed.
+        """
+        return transcode(path, self._config["audio_codec"], self._config["audio_preset"])
+
+    def downloaded_videos(self):
+        """Returns the songs downloaded completely by the key of their video, see DownloadIndex.videos.
+
+        :PRE: _
+        :POST: Returns a song id for each video key, to link many songs without searching the index each time.
+        """
+        return self._index.videos()
 
     def is_downloaded(self, song_id: int):
         """Checks if a song has already been downloaded.
@@ -83,10 +274,40 @@ class SongDownloader(youtube_dl.YoutubeDL):
         :author: Carlos
         :param song_id: The song to check.
         :PRE: _
-        :POST: Returns True if the song has already been downloaded, False otherwise.
+        :POST: Returns True if the song has been downloaded completely, False otherwise.
         """
-        download_folder = os.path.join(self._config["download_dir"], str(song_id))
-        return os.path.isdir(download_folder) and bool(os.listdir(download_folder))
+        return song_id in self._index
+
+    def partial_path(self, song_id: int):
+        """Returns the file of a song whose video has been downloaded, but not converted and tagged yet.
+
+        :param song_id: The song to check.
+        :PRE: _
+        :POST: Returns the path of the video, None if the song isn't in that state.
+        """
+        if self._index.state(song_id) != PARTIAL:
+            return None
+        return self._find_file(song_id)
+
+    def _find_file(self, song_id: int):
+        """Looks for the file of a song on the disk, instead of the index."""
+        return song_file(os.path.join(self._config["download_dir"], str(song_id)))
+
+    def verify_downloads(self):
+        """Compares the download index with the files stored and fixes it, see DownloadIndex.verify.
+
+        :PRE: _
+        :POST: Returns the song ids checked by outcome.
+        """
+        return self._index.verify()
+
+    def downloads_space(self):
+        """Measures the space taken by the songs stored, see DownloadIndex.space.
+
+        :PRE: _
+        :POST: Returns the amount of songs and the bytes they take, on disk and reclaimed by the links.
+        """
+        return self._index.space()
 
     def delete_song(self, song_id: int):
         """Deletes a song (if it has been downloaded) from the local storage.
@@ -94,28 +315,41 @@ class SongDownloader(youtube_dl.YoutubeDL):
         :author: Carlos
         :param song_id: The id of the song to delete.
         :PRE: _
-        :POST: The song will be deleted if it has been downloaded.
+        :POST: The song will be deleted if it has been downloaded, a partial download is deleted as well.
         """
-        song_path = self.get_song_path(song_id)
-        if song_path:
-            os.remove(song_path)
+        download_folder = os.path.join(self._config["download_dir"], str(song_id))
+        if os.path.isdir(download_folder):
+            for entry in os.scandir(download_folder):
+                if entry.is_dir():
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+        self._index.remove(song_id)
 
-    def update_metadata(self, song_data):
-        """Updates the metadata of the stored MP3 (if it exists) to fit the information stored in the database.
+    def update_metadata(self, song_data, defer: bool = False):
+        """Updates the metadata of the stored song (if it exists) to fit the information stored in the database.
+        MP3, FLAC, Opus, Ogg and M4A files are tagged, whatever the codec the song was downloaded with.
 
         :author: Carlos
         :param song_data: The information about the song stored in the database.
+        :param defer: If the tags should be queued instead of written now, see TagQueue. The edits of the same
+                      song are merged and written in batches, at the latest when the process exits.
         :PRE: _
-        :POST: The song metadata will be updated if it exists.
+        :POST: The song metadata will be updated if it exists, its file isn't rewritten if its tags already match.
         """
-        song_path = self.get_song_path(song_data["song_id"])
+        if defer:
+            self._tags.put(song_data["song_id"], song_tags(song_data))
+        else:
+            self._tags.tag(song_data["song_id"], song_tags(song_data))
 
-        if song_path:
-            f = music_tag.load_file(song_path)
-            f['artist'] = song_data["group_name"]
-            f['genre'] = song_data["genre"]
-            f['tracktitle'] = song_data["song_name"]
-            f.save()
+    def retag(self, songs):
+        """Updates the metadata of many stored songs in parallel, see TagQueue.sync.
+
+        :param songs: The information about the songs stored in the database.
+        :PRE: _
+        :POST: Returns the song ids by outcome: "updated", "unchanged", "missing" and "failed".
+        """
+        return self._tags.sync(songs)
 
     def get_song_path(self, song_id):
         """Returns the path where the song has been downloaded.
@@ -123,15 +357,10 @@ class SongDownloader(youtube_dl.YoutubeDL):
         :author: Carlos
         :param song_id: The if of the song to look up.
         :PRE: _
-        :POST: Returns the path if the song has been downlaoded, None otherwise.
+        :POST: Returns the path if the song has been downlaoded, None otherwise. Its extension depends on the codec.
         """
-        if not self.is_downloaded(song_id):
-            return None
-        else:
-            download_folder = os.path.join(self._config["download_dir"], str(song_id))
-            song_name = os.listdir(download_folder)[0]
-
-            return os.path.join(download_folder, song_name)
+        entry = self._index.get(song_id)
+        return entry["path"] if entry else None
 
     def __getitem__(self, item):
         """Returns the item contained in the underlying video_data.
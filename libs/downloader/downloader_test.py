@@ -86,6 +86,9 @@ def test_downloader():
 
 
 def test_downloader_cleanup():
+    for file in (".metadata.db", ".downloads.db"):
+        if os.path.exists(f"./test_songs/{file}"):
+            os.remove(f"./test_songs/{file}")
     for folder in os.listdir("./test_songs"):
         for file in os.listdir(f"./test_songs/{folder}"):
             os.remove(f"./test_songs/{folder}/{file}")
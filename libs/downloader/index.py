@@ -0,0 +1,340 @@
+"""Index of the songs downloaded, stored next to them.
+
+The index is read once and kept in memory, so checking if a song is downloaded doesn't touch the disk.
+It's updated when a song is downloaded, tagged or deleted, and can be checked against the files with verify.
+
+A song goes through three states: pending while its video is downloaded, partial once the video is there
+but isn't converted and tagged yet, and complete. Only the complete songs count as downloaded,
+the others are resumed by the next download.
+
+The video of every song is recorded too, so a song whose video is already stored for another song
+is hard linked to the same file instead of being downloaded again, see space for what it saves.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Iterator, Optional, Tuple
+
+import music_tag
+
+from .transcode import is_audio
+
+INDEX_FILE = ".downloads.db"
+
+PENDING = "pending"
+PARTIAL = "partial"
+COMPLETE = "complete"
+
+# The files youtube_dl writes while downloading, renamed once complete.
+PARTIAL_SUFFIXES = (".part", ".ytdl")
+
+create_downloads = """
+CREATE TABLE IF NOT EXISTS downloads (
+    song_id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    codec TEXT,
+    bitrate INTEGER,
+    checksum TEXT,
+    indexed_at REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'complete',
+    video_key TEXT
+);
+"""
+get_downloads_columns = "PRAGMA table_info(downloads);"
+# The columns added since the first version, by the indexes created before.
+add_downloads_columns = {
+    "state": "ALTER TABLE downloads ADD COLUMN state TEXT NOT NULL DEFAULT 'complete';",
+    "video_key": "ALTER TABLE downloads ADD COLUMN video_key TEXT;",
+}
+get_downloads = "SELECT song_id, path, size, codec, bitrate, checksum, indexed_at, state, video_key FROM downloads;"
+set_download = """
+INSERT OR REPLACE INTO downloads(song_id, path, size, codec, bitrate, checksum, indexed_at, state, video_key)
+    VALUES (:song_id, :path, :size, :codec, :bitrate, :checksum, :indexed_at, :state, :video_key);
+"""
+delete_download = "DELETE FROM downloads WHERE song_id = ?;"
+
+
+def checksum(path: str) -> str:
+    """Returns the SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def audio_info(path: str) -> Tuple[Optional[str], Optional[int]]:
+    """Returns the codec and the bitrate of an audio file, None if they can't be read."""
+    try:
+        f = music_tag.load_file(path)
+        return f["#codec"].value, f["#bitrate"].value
+    except Exception:
+        return None, None
+
+
+def song_file(folder: str) -> Optional[str]:
+    """Returns the file stored in the folder of a song, the partial downloads are ignored.
+    The songs can have any audio extension, depending on the codec they were downloaded with.
+
+    :param folder: The folder of the song.
+    :PRE: _
+    :POST: Returns the path of the file, None if there's none. An audio file is preferred to a video.
+    """
+    if not os.path.isdir(folder):
+        return None
+
+    files = sorted((entry.name for entry in os.scandir(folder)
+                    if entry.is_file() and not entry.name.endswith(PARTIAL_SUFFIXES)),
+                   key=lambda name: (not is_audio(name), name))
+    return os.path.join(folder, files[0]) if files else None
+
+
+def scan(download_dir: str) -> Iterator[Tuple[int, str]]:
+    """Lists the songs stored in the download folder, each one in a folder named after its id.
+
+    :param download_dir: The download folder.
+    :PRE: _
+    :POST: Yields the id and the path of every song found, the partial downloads are ignored.
+    """
+    if not os.path.isdir(download_dir):
+        return
+
+    for folder in os.scandir(download_dir):
+        if folder.is_dir() and folder.name.isdigit():
+            path = song_file(folder.path)
+            if path:
+                yield int(folder.name), path
+
+
+class DownloadIndex:
+    _instances: Dict[str, "DownloadIndex"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, download_dir: str):
+        """The index of the songs stored in a download folder, use DownloadIndex.of to share it.
+
+        :param download_dir: The download folder.
+        """
+        self.download_dir = download_dir
+        self.path = os.path.join(download_dir, INDEX_FILE)
+        self._entries: Optional[Dict[int, dict]] = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def of(cls, download_dir: str) -> "DownloadIndex":
+        """Returns the index of a download folder, the same object for every downloader of the process."""
+        key = os.path.abspath(download_dir)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(download_dir)
+            return cls._instances[key]
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        connection.execute(create_downloads)
+        return connection
+
+    @property
+    def entries(self) -> Dict[int, dict]:
+        """The entries of the index by song id, read from the file the first time.
+        A folder without index, downloaded by an older version, is indexed without checksums."""
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._load()
+        return self._entries
+
+    def _load(self):
+        exists = os.path.exists(self.path)
+        with closing(self._connect()) as connection:
+            columns = {column["name"] for column in connection.execute(get_downloads_columns)}
+            with connection:
+                for column, query in add_downloads_columns.items():
+                    if column not in columns:
+                        connection.execute(query)
+            self._entries = {row["song_id"]: dict(row) for row in connection.execute(get_downloads)}
+        if not exists:
+            for song_id, path in scan(self.download_dir):
+                self.record(song_id, path, with_checksum=False)
+
+    def get(self, song_id: int, complete: bool = True) -> Optional[dict]:
+        """Returns the entry of a song, with the absolute path of the file.
+
+        :param song_id: The id of the song.
+        :param complete: If only a complete download should be returned.
+        :PRE: _
+        :POST: Returns the entry, None if the song isn't downloaded.
+        """
+        entry = self.entries.get(song_id)
+        if entry is None or (complete and entry["state"] != COMPLETE):
+            return None
+        return {**entry, "path": os.path.join(self.download_dir, entry["path"])}
+
+    def state(self, song_id: int) -> Optional[str]:
+        entry = self.entries.get(song_id)
+        return entry["state"] if entry else None
+
+    def __contains__(self, song_id: int) -> bool:
+        """Whether a song has been downloaded completely."""
+        return self.state(song_id) == COMPLETE
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _store(self, entry: dict):
+        # Loaded before connecting, the connection creates the file and the folder would never be scanned.
+        entries = self.entries
+        with self._lock:
+            with closing(self._connect()) as connection, connection:
+                connection.execute(set_download, entry)
+            entries[entry["song_id"]] = entry
+
+    def record(self, song_id: int, path: str, with_checksum: bool = True, state: str = COMPLETE,
+               video_key: Optional[str] = None) -> dict:
+        """Adds or updates the entry of a song after its file has been written.
+
+        :param song_id: The id of the song.
+        :param path: The path of the file.
+        :param with_checksum: If the checksum should be computed now, it's left empty for verify otherwise.
+        :param state: The state of the download.
+        :param video_key: The key of the video downloaded, see SongDownloader.video_key. The previous one if None.
+        :PRE: The file needs to exist.
+        :POST: The entry is stored, returns it.
+        """
+        if video_key is None and song_id in self.entries:
+            video_key = self.entries[song_id]["video_key"]
+        codec, bitrate = audio_info(path) if state == COMPLETE else (None, None)
+        entry = {
+            "song_id": song_id,
+            "path": os.path.relpath(path, self.download_dir),
+            "size": os.path.getsize(path),
+            "codec": codec,
+            "bitrate": bitrate,
+            "checksum": checksum(path) if with_checksum else None,
+            "indexed_at": time.time(),
+            "state": state,
+            "video_key": video_key
+        }
+        self._store(entry)
+        return entry
+
+    def mark_pending(self, song_id: int):
+        """Records that the download of a song has started, before any file is complete.
+
+        :param song_id: The id of the song.
+        :PRE: _
+        :POST: The song is pending, it doesn't count as downloaded until it's recorded as complete.
+        """
+        self._store({
+            "song_id": song_id,
+            "path": "",
+            "size": 0,
+            "codec": None,
+            "bitrate": None,
+            "checksum": None,
+            "indexed_at": time.time(),
+            "state": PENDING,
+            "video_key": None
+        })
+
+    def find_video(self, video_key: str, exclude: Optional[int] = None) -> Optional[dict]:
+        """Looks for a song downloaded completely from a video.
+
+        :param video_key: The key of the video.
+        :param exclude: The id of a song to ignore, the one looking for a copy.
+        :PRE: _
+        :POST: Returns the entry of a song whose file still exists like get, None if there's none.
+        """
+        for song_id, entry in list(self.entries.items()):
+            if entry["video_key"] == video_key and song_id != exclude and entry["state"] == COMPLETE:
+                entry = self.get(song_id)
+                if os.path.isfile(entry["path"]):
+                    return entry
+        return None
+
+    def videos(self) -> Dict[str, int]:
+        """Returns the songs downloaded completely by the key of their video, to look up many videos at once.
+
+        :PRE: _
+        :POST: Returns a song id for each video key, see find_video to check its file.
+        """
+        return {entry["video_key"]: song_id for song_id, entry in list(self.entries.items())
+                if entry["video_key"] and entry["state"] == COMPLETE}
+
+    def remove(self, song_id: int):
+        """Removes the entry of a song once its file has been deleted.
+
+        :param song_id: The id of the song.
+        :PRE: _
+        :POST: The song isn't in the index anymore.
+        """
+        with self._lock:
+            if self.entries.pop(song_id, None) is not None:
+                with closing(self._connect()) as connection, connection:
+                    connection.execute(delete_download, (song_id,))
+
+    def verify(self) -> Dict[str, list]:
+        """Compares the index with the files of the download folder and fixes it.
+
+        :PRE: _
+        :POST: The index matches the files. Returns the song ids checked by outcome:
+               "ok", "missing" (removed from the index), "untracked" (added), "modified" (updated)
+               and "partial" (left to be resumed).
+        """
+        report = {"ok": [], "missing": [], "untracked": [], "modified": [], "partial": []}
+        on_disk = dict(scan(self.download_dir))
+
+        for song_id in sorted(set(self.entries) | set(on_disk)):
+            entry = self.get(song_id, complete=False)
+            path = on_disk.get(song_id)
+
+            if entry is not None and entry["state"] != COMPLETE:
+                report["partial"].append(song_id)
+            elif path is None:
+                self.remove(song_id)
+                report["missing"].append(song_id)
+            elif entry is None:
+                self.record(song_id, path)
+                report["untracked"].append(song_id)
+            elif (os.path.normpath(entry["path"]) != os.path.normpath(path)
+                  or entry["size"] != os.path.getsize(path)
+                  or (entry["checksum"] is not None and entry["checksum"] != checksum(path))):
+                self.record(song_id, path)
+                report["modified"].append(song_id)
+            else:
+                if entry["checksum"] is None:
+                    self.record(song_id, path)
+                report["ok"].append(song_id)
+
+        return report
+
+    def space(self) -> Dict[str, int]:
+        """Measures the space taken by the songs downloaded, the songs sharing a file counted once.
+
+        :PRE: _
+        :POST: Returns "songs" (the amount of songs stored), "size" (the bytes they would take on their own),
+               "disk" (the bytes they take), "reclaimed" (the difference) and "shared"
+               (the amount of songs sharing their file with another one).
+        """
+        report = {"songs": 0, "size": 0, "disk": 0, "reclaimed": 0, "shared": 0}
+        files: Dict[Tuple[int, int], int] = {}
+
+        for song_id in list(self.entries):
+            entry = self.get(song_id)
+            if entry is None or not os.path.isfile(entry["path"]):
+                continue
+            stat = os.stat(entry["path"])
+            report["songs"] += 1
+            report["size"] += stat.st_size
+            files[(stat.st_dev, stat.st_ino)] = files.get((stat.st_dev, stat.st_ino), 0) + 1
+            if files[(stat.st_dev, stat.st_ino)] == 1:
+                report["disk"] += stat.st_size
+
+        report["reclaimed"] = report["size"] - report["disk"]
+        report["shared"] = sum(count for count in files.values() if count > 1)
+        return report
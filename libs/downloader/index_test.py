@@ -0,0 +1,88 @@
+import os
+
+from . import SongDownloader
+from .index import PARTIAL, PENDING, DownloadIndex, checksum
+
+
+def write(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def test_index():
+    # A folder downloaded before the index existed is indexed when it's first read.
+    write("./test_index/1/Song 1 - Group.mp3", b"one")
+    write("./test_index/2/Song 2 - Group.mp3.part", b"partial")
+    write("./test_index/3/Song 3 - Group.mp3", b"three")
+
+    index = DownloadIndex("./test_index")
+    assert 1 in index and 3 in index
+    assert 2 not in index
+    assert index.get(1)["size"] == 3
+    assert index.get(1)["checksum"] is None
+    assert os.path.normpath(index.get(3)["path"]) == os.path.normpath("./test_index/3/Song 3 - Group.mp3")
+
+    entry = index.record(1, "./test_index/1/Song 1 - Group.mp3")
+    assert entry["checksum"] == checksum("./test_index/1/Song 1 - Group.mp3")
+
+    # The index is persisted.
+    assert DownloadIndex("./test_index").get(1)["checksum"] == entry["checksum"]
+    assert DownloadIndex.of("./test_index") is DownloadIndex.of("./test_index/")
+
+    index.remove(3)
+    assert 3 not in index
+    assert 3 not in DownloadIndex("./test_index")
+
+    write("./test_index/1/Song 1 - Group.mp3", b"ONE")
+    write("./test_index/4/Song 4 - Group.mp3", b"four")
+    index.record(4, "./test_index/4/Song 4 - Group.mp3")
+    os.remove("./test_index/4/Song 4 - Group.mp3")
+
+    report = index.verify()
+    assert report == {"ok": [], "missing": [4], "untracked": [3], "modified": [1], "partial": []}
+    assert index.get(1)["checksum"] == checksum("./test_index/1/Song 1 - Group.mp3")
+    assert index.verify() == {"ok": [1, 3], "missing": [], "untracked": [], "modified": [], "partial": []}
+
+    # Only the complete downloads count, the others are left for the next download.
+    index.mark_pending(5)
+    write("./test_index/6/Song 6 - Group.webm", b"video")
+    index.record(6, "./test_index/6/Song 6 - Group.webm", with_checksum=False, state=PARTIAL)
+    assert 5 not in index and 6 not in index
+    assert index.get(6) is None
+    assert index.get(6, complete=False)["state"] == PARTIAL
+    assert DownloadIndex("./test_index").state(5) == PENDING
+    assert index.verify()["partial"] == [5, 6]
+
+    # A song whose video is already stored is linked to the same file.
+    write("./test_index/7/Song 7 - Group.mp3", b"seven")
+    index.record(7, "./test_index/7/Song 7 - Group.mp3", video_key="Youtube:f1N5lZw7e78")
+    index.record(7, "./test_index/7/Song 7 - Group.mp3")
+    assert index.get(7)["video_key"] == "Youtube:f1N5lZw7e78"
+    assert index.find_video("Youtube:f1N5lZw7e78")["song_id"] == 7
+    assert index.find_video("Youtube:f1N5lZw7e78", exclude=7) is None
+    assert index.videos() == {"Youtube:f1N5lZw7e78": 7}
+
+    downloader = SongDownloader({"download_dir": "./test_index"})
+    song = {"song_id": 8, "song_name": "Song 8", "group_name": "Group", "link": "https://youtu.be/f1N5lZw7e78"}
+    assert downloader.link_duplicate({**song, "song_id": 7}, videos=downloader.downloaded_videos()) is None
+    path = downloader.link_duplicate(song, videos=downloader.downloaded_videos())
+    assert os.path.samefile(path, "./test_index/7/Song 7 - Group.mp3")
+    index = DownloadIndex.of("./test_index")
+    assert index.state(8) == PARTIAL
+    assert downloader.link_duplicate({**song, "song_id": 9, "link": "https://youtu.be/dQw4w9WgXcQ"}) is None
+
+    index.record(8, path)
+    assert index.space() == {"songs": 4, "size": 18, "disk": 13, "reclaimed": 5, "shared": 2}
+
+
+def test_index_cleanup():
+    for folder in os.listdir("./test_index"):
+        path = f"./test_index/{folder}"
+        if os.path.isdir(path):
+            for file in os.listdir(path):
+                os.remove(f"{path}/{file}")
+            os.rmdir(path)
+        else:
+            os.remove(path)
+    os.rmdir("./test_index")
@@ -0,0 +1,74 @@
+"""The SongDownloader instances of the process.
+
+Creating a SongDownloader initializes every youtube_dl extractor, so they're created once per configuration
+and lent to whoever needs to fetch or download a song, one user at a time.
+"""
+import json
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List
+
+from . import SongDownloader
+
+
+def config_key(config: dict = None) -> str:
+    """Returns a key identifying a configuration, the progress hooks excluded since they're set at each lease."""
+    config = {key: value for key, value in (config or {}).items() if key != "progress_hooks"}
+    return json.dumps(config, sort_keys=True, default=repr)
+
+
+class DownloaderManager:
+    def __init__(self):
+        """Keeps the idle SongDownloader instances of every configuration."""
+        self._idle: Dict[str, List[SongDownloader]] = {}
+        self._shared: Dict[str, SongDownloader] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def _create(self, config: dict = None) -> SongDownloader:
+        with self._lock:
+            self.created += 1
+        return SongDownloader({key: value for key, value in (config or {}).items() if key != "progress_hooks"})
+
+    @contextmanager
+    def lease(self, config: dict = None, progress_hooks: Iterable[Callable] = ()):
+        """Lends a SongDownloader to fetch and download songs, it's given back at the end of the block.
+
+        :param config: The SongDownloader configuration.
+        :param progress_hooks: The youtube_dl progress hooks called during this lease only.
+        :PRE: _
+        :POST: Yields a SongDownloader no one else uses until the end of the block.
+        """
+        key = config_key(config)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            downloader = idle.pop() if idle else None
+        if downloader is None:
+            downloader = self._create(config)
+
+        downloader.reset(progress_hooks)
+        try:
+            yield downloader
+        finally:
+            downloader.reset()
+            with self._lock:
+                self._idle[key].append(downloader)
+
+    def get(self, config: dict = None) -> SongDownloader:
+        """Returns a SongDownloader shared by everyone, only to look up, tag or delete the songs stored.
+
+        :param config: The SongDownloader configuration.
+        :PRE: _
+        :POST: Returns the same SongDownloader for the same configuration, it musn't be used to fetch or download.
+        """
+        key = config_key(config)
+        with self._lock:
+            downloader = self._shared.get(key)
+        if downloader is None:
+            downloader = self._create(config)
+            with self._lock:
+                downloader = self._shared.setdefault(key, downloader)
+        return downloader
+
+
+downloaders = DownloaderManager()
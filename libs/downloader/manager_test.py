@@ -0,0 +1,36 @@
+import os
+
+from .manager import DownloaderManager, config_key
+from .throttle import throttle
+
+
+def test_manager():
+    config = {"download_dir": "./test_manager"}
+    manager = DownloaderManager()
+
+    with manager.lease(config) as first:
+        with manager.lease(config) as second:
+            assert first is not second
+    assert manager.created == 2
+
+    hook = print
+    with manager.lease(config, [hook]) as downloader:
+        assert downloader in (first, second)
+        assert downloader._progress_hooks == [hook, throttle.hook]
+    assert downloader._progress_hooks == [throttle.hook]
+    assert manager.created == 2
+
+    with manager.lease({**config, "quiet": False}) as other:
+        assert other not in (first, second)
+    assert manager.created == 3
+
+    assert manager.get(config) is manager.get(config)
+    assert config_key({**config, "progress_hooks": [hook]}) == config_key(config)
+
+    # The path comes from the template, the shared parameters are never changed.
+    outtmpl = first.params["outtmpl"]
+    info = {"id": "x", "song_id": 69, "song_name": "NAME", "group_name": "GROUP", "ext": "mp3"}
+    assert os.path.normpath(first.prepare_filename(info)) == os.path.normpath("./test_manager/69/NAME - GROUP.mp3")
+    assert first.params["outtmpl"] == outtmpl
+
+    os.rmdir("./test_manager")
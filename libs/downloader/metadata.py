@@ -0,0 +1,96 @@
+"""Cache of the information fetched about the videos, stored next to the songs.
+
+Fetching a video takes a few requests to YouTube, so the information is kept in a small SQLite file
+keyed by the extractor and the id of the video. It's used until it's older than the TTL,
+the oldest entries are evicted once there are too many.
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Optional
+
+METADATA_FILE = ".metadata.db"
+METADATA_TTL = 7 * 24 * 3600
+METADATA_SIZE = 5000
+# The links of the formats are signed and expire after a few hours, older information needs a new fetch to download.
+FORMATS_TTL = 3600
+
+# Information about the video that is never needed to download it, but can be huge.
+SKIPPED_FIELDS = ("requested_formats", "requested_subtitles", "subtitles", "automatic_captions", "thumbnails")
+
+create_videos = """
+CREATE TABLE IF NOT EXISTS videos (
+    key TEXT PRIMARY KEY,
+    title TEXT,
+    duration INTEGER,
+    info TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+create_index_videos_fetched = "CREATE INDEX IF NOT EXISTS idx_videos_fetched ON videos(fetched_at);"
+get_video = "SELECT info, fetched_at FROM videos WHERE key = ? AND fetched_at >= ?;"
+set_video = "INSERT OR REPLACE INTO videos(key, title, duration, info, fetched_at) VALUES (?, ?, ?, ?, ?);"
+delete_expired = "DELETE FROM videos WHERE fetched_at < ?;"
+delete_oldest = "DELETE FROM videos WHERE key NOT IN (SELECT key FROM videos ORDER BY fetched_at DESC LIMIT ?);"
+count_videos = "SELECT count(*) FROM videos;"
+
+
+class MetadataCache:
+    def __init__(self, path: str, ttl: float = METADATA_TTL, size: int = METADATA_SIZE):
+        """The information of the videos fetched, the file is only created when something is stored.
+
+        :param path: The path to the cache file.
+        :param ttl: How long the information is used, in seconds.
+        :param size: The maximum amount of videos kept.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.size = size
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute(create_videos)
+        connection.execute(create_index_videos_fetched)
+        return connection
+
+    def get(self, key: str) -> Optional[dict]:
+        """Returns the information of a video if it's fresh.
+
+        :param key: The key of the video.
+        :PRE: _
+        :POST: Returns the information with its "fetched_at" timestamp, None if it isn't cached or is too old.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        with closing(self._connect()) as connection:
+            row = connection.execute(get_video, (key, time.time() - self.ttl)).fetchone()
+        if not row:
+            return None
+
+        return {**json.loads(row[0]), "fetched_at": row[1]}
+
+    def put(self, key: str, info: dict):
+        """Stores the information of a video and evicts the expired and the oldest ones.
+
+        :param key: The key of the video.
+        :param info: The information returned by youtube_dl.
+        :PRE: _
+        :POST: The information is stored with the current time, unless it has a "fetched_at" timestamp.
+        """
+        fetched_at = info.get("fetched_at") or time.time()
+        data = json.dumps({k: v for k, v in info.items() if k not in SKIPPED_FIELDS and k != "fetched_at"},
+                          default=repr)
+
+        with closing(self._connect()) as connection, connection:
+            connection.execute(set_video, (key, info.get("title"), info.get("duration"), data, fetched_at))
+            connection.execute(delete_expired, (time.time() - self.ttl,))
+            connection.execute(delete_oldest, (self.size,))
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+        with closing(self._connect()) as connection:
+            return connection.execute(count_videos).fetchone()[0]
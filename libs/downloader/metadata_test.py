@@ -0,0 +1,50 @@
+import os
+import time
+
+from . import SongDownloader
+from .metadata import MetadataCache
+
+
+def test_metadata_cache():
+    cache = MetadataCache("./test-metadata.db", ttl=60, size=2)
+
+    assert cache.get("Youtube:a") is None
+    assert os.path.exists("./test-metadata.db") is False
+
+    cache.put("Youtube:a", {"title": "A", "duration": 60, "formats": [{"url": "a"}], "thumbnails": ["big"]})
+    info = cache.get("Youtube:a")
+    assert info["title"] == "A"
+    assert info["formats"] == [{"url": "a"}]
+    assert "thumbnails" not in info
+    assert time.time() - info["fetched_at"] < 5
+
+    # Expired entries are never returned and evicted on the next write.
+    cache.put("Youtube:old", {"title": "Old", "fetched_at": time.time() - 120})
+    assert cache.get("Youtube:old") is None
+    assert len(cache) == 1
+
+    # The oldest entries are evicted once the cache is full.
+    cache.put("Youtube:b", {"title": "B", "fetched_at": time.time() - 10})
+    cache.put("Youtube:c", {"title": "C"})
+    assert cache.get("Youtube:b") is None
+    assert cache.get("Youtube:a")["title"] == "A"
+    assert len(cache) == 2
+
+    os.remove("./test-metadata.db")
+
+
+def test_fetch_cached():
+    downloader = SongDownloader({"download_dir": "./test_metadata"})
+
+    assert downloader.video_key("https://www.youtube.com/watch?v=f1N5lZw7e78") == "Youtube:f1N5lZw7e78"
+    assert downloader.video_key("https://youtu.be/f1N5lZw7e78") == "Youtube:f1N5lZw7e78"
+    assert downloader.video_key("https://example.com/song.mp3") is None
+
+    # Served from the cache, without any request.
+    downloader._metadata.put("Youtube:f1N5lZw7e78", {"title": "Slow Clap - Meme", "duration": 5})
+    info = downloader.fetch_song("https://youtu.be/f1N5lZw7e78")
+    assert info["duration"] == 5
+    assert downloader["title"] == "Slow Clap - Meme"
+
+    os.remove("./test_metadata/.metadata.db")
+    os.rmdir("./test_metadata")
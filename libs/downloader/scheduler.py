@@ -0,0 +1,291 @@
+"""Downloads many songs at once.
+
+The links are fetched, the videos downloaded and the audio extracted by separate pools of threads.
+The conversions run in FFmpeg processes, the transcode pool is as big as the machine so every core is kept busy.
+Each stage leases a SongDownloader from the manager, youtube_dl not being thread-safe,
+and the database is never touched: the results are returned instead.
+
+An interrupted run is resumed by the next one: the complete songs are skipped,
+the partial downloads continued and the videos already downloaded only converted.
+The songs sharing their video with another one are only downloaded once, and linked to the same file.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from ..logger import get_logger
+from . import default_config, manager
+from .transcode import check_format, transcode
+
+FETCH_WORKERS = 3
+DOWNLOAD_WORKERS = 3
+TRANSCODE_WORKERS = os.cpu_count() or 2
+
+STAGES = ("fetch", "download", "transcode")
+
+logger = get_logger("scheduler")
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadCancelled(DownloadError):
+    pass
+
+
+class SongResult:
+    def __init__(self, song: dict):
+        """The outcome of the download of a song.
+
+        :param song: The information about the song stored in the database.
+        """
+        self.song = song
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.path: Optional[str] = None
+        self.duration: Optional[int] = None
+        self.elapsed = 0.0
+
+    @property
+    def failed(self) -> bool:
+        return self.status == "failed"
+
+    def __repr__(self):
+        return f"<SongResult {self.song['song_name']!r} {self.status}>"
+
+
+class DownloadProgress:
+    def __init__(self, total: int, stream=None):
+        """Counts the songs in every stage and the bytes downloaded, shared by all the threads.
+
+        :param total: The amount of songs to download.
+        :param stream: Where to render the progress line, nothing is rendered if None.
+        """
+        self.total = total
+        self.stream = stream
+        self.active = {stage: 0 for stage in STAGES}
+        self.counts = {"done": 0, "skipped": 0, "failed": 0}
+        self._bytes: Dict[str, int] = {}
+        self._speeds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def enter(self, stage: str):
+        with self._lock:
+            self.active[stage] += 1
+
+    def leave(self, stage: str):
+        with self._lock:
+            self.active[stage] -= 1
+
+    def finish(self, result: SongResult):
+        with self._lock:
+            self.counts[result.status] += 1
+        if self.stream and result.failed:
+            self.stream.write(f"\r\033[K{result.song['song_name']} - {result.song['group_name']}: {result.error}\n")
+
+    def hook(self, data: dict):
+        """Progress hook of youtube_dl, called by the downloading threads.
+
+        :param data: The status of a download.
+        :PRE: _
+        :POST: The bytes and the speed of the download are updated.
+        """
+        with self._lock:
+            name = data.get("filename", "")
+            self._bytes[name] = data.get("downloaded_bytes") or data.get("total_bytes") or 0
+            if data["status"] == "downloading":
+                self._speeds[name] = data.get("speed") or 0
+            else:
+                self._speeds.pop(name, None)
+
+    @property
+    def downloaded_bytes(self) -> int:
+        return sum(self._bytes.values())
+
+    def line(self) -> str:
+        with self._lock:
+            finished = sum(self.counts.values())
+            speed = sum(self._speeds.values()) / 1024 / 1024
+            return (f"[{finished}/{self.total}] "
+                    f"fetching {self.active['fetch']}, "
+                    f"downloading {self.active['download']} ({speed:.1f} MiB/s), "
+                    f"converting {self.active['transcode']} | "
+                    f"{self.counts['done']} done, {self.counts['skipped']} skipped, {self.counts['failed']} failed")
+
+    def render(self):
+        if self.stream:
+            self.stream.write(f"\r\033[K{self.line()}")
+            self.stream.flush()
+
+    def close(self):
+        if self.stream:
+            self.render()
+            elapsed = time.monotonic() - self._start
+            self.stream.write(f"\n{self.downloaded_bytes / 1024 / 1024:.1f} MiB in {elapsed:.1f} s\n")
+
+
+class DownloadScheduler:
+    def __init__(self, config: dict = None, fetchers: int = FETCH_WORKERS, downloaders: int = DOWNLOAD_WORKERS,
+                 transcoders: int = TRANSCODE_WORKERS, refresh: bool = False):
+        """Downloads songs with a pool of threads for every stage.
+
+        :param config: The SongDownloader configuration, its audio codec and preset are used by the transcode stage.
+        :param fetchers: How many links are fetched at the same time, kept low to avoid being rate limited.
+        :param downloaders: How many videos are downloaded at the same time.
+        :param transcoders: How many FFmpeg conversions run at the same time.
+        :param refresh: If the videos information should be fetched again instead of being read from the cache.
+        :raises ValueError if the audio codec or preset configured is unknown.
+        """
+        self._config = {**(config or {}), "postprocessors": []}
+        self._codec = self._config.get("audio_codec", default_config["audio_codec"])
+        self._preset = self._config.get("audio_preset", default_config["audio_preset"])
+        check_format(self._codec, self._preset)
+        self._workers = {"fetch": fetchers, "download": downloaders, "transcode": transcoders}
+        self._progress: Optional[DownloadProgress] = None
+        self._refresh = refresh
+        self._overwrite = False
+        self._stop = threading.Event()
+
+    def _check_stop(self, _):
+        """Progress hook aborting the downloads once the run is interrupted, their partial files are kept."""
+        if self._stop.is_set():
+            raise DownloadCancelled("The download has been interrupted.")
+
+    def _lease(self):
+        hooks = [*self._config.get("progress_hooks", []), self._progress.hook, self._check_stop]
+        return manager.downloaders.lease(self._config, hooks)
+
+    def fetch(self, result: SongResult) -> dict:
+        with self._lease() as downloader:
+            info = downloader.fetch_song(result.song["link"], self._refresh)
+        if not info:
+            raise DownloadError("No video could be found with the provided link.")
+        result.duration = info.get("duration")
+        return info
+
+    def download(self, result: SongResult, info: dict) -> str:
+        with self._lease() as downloader:
+            if self._overwrite:
+                downloader.delete_song(result.song["song_id"])
+            path = downloader.download_source(result.song, info, reuse=not self._overwrite)
+        if not path:
+            raise DownloadError("The video couldn't be downloaded.")
+        return path
+
+    def transcode(self, result: SongResult, path: str) -> str:
+        path = transcode(path, self._codec, self._preset)
+        with self._lease() as downloader:
+            downloader.update_metadata(result.song)
+        return path
+
+    def _run_stage(self, stage: str, result: SongResult, *args):
+        self._progress.enter(stage)
+        try:
+            return getattr(self, stage)(result, *args)
+        finally:
+            self._progress.leave(stage)
+
+    def run(self, songs: List[dict], overwrite: bool = False, stream=None) -> List[SongResult]:
+        """Downloads the songs, each one going through the fetch, download and transcode stages.
+
+        :param songs: The information about the songs stored in the database.
+        :param overwrite: If the songs already downloaded should be downloaded again, from scratch.
+        :param stream: Where to render the progress, sys.stdout for example. Nothing is rendered if None.
+        :PRE: _
+        :POST: Returns the result of every song, in the same order.
+               A song that failed doesn't stop the others, its error is in its result.
+               A song whose video is stored for another song isn't downloaded, it's linked to the same file.
+               If interrupted, the downloads in progress are aborted before KeyboardInterrupt is raised again.
+        """
+        results = [SongResult(song) for song in songs]
+        self._progress = progress = DownloadProgress(len(results), stream)
+        self._overwrite = overwrite
+        self._stop.clear()
+        checker = manager.downloaders.get(self._config)
+        started = {}
+
+        pools = {stage: ThreadPoolExecutor(self._workers[stage], thread_name_prefix=stage) for stage in STAGES}
+        futures = {}
+        # The songs whose video is being downloaded for another one, by the key of the video.
+        waiting: Dict[str, List[SongResult]] = {}
+        leaders: Dict[int, str] = {}
+        # The songs downloaded by the key of their video, looked up instead of the whole index for every song.
+        videos = checker.downloaded_videos()
+
+        def submit(stage: str, result: SongResult, *args):
+            futures[pools[stage].submit(self._run_stage, stage, result, *args)] = (stage, result)
+
+        try:
+            for result in results:
+                if not overwrite and checker.is_downloaded(result.song["song_id"]):
+                    result.status = "skipped"
+                    progress.finish(result)
+                    continue
+                started[id(result)] = time.monotonic()
+
+                partial_path = None if overwrite else checker.partial_path(result.song["song_id"])
+                key = checker.video_key(result.song["link"])
+                linked_path = None if overwrite or not key else checker.link_duplicate(result.song, key, videos)
+                if partial_path or linked_path:
+                    submit("transcode", result, partial_path or linked_path)
+                elif key in waiting:
+                    waiting[key].append(result)
+                else:
+                    if key:
+                        waiting[key] = []
+                        leaders[id(result)] = key
+                    submit("fetch", result)
+
+            while futures:
+                progress.render()
+                done, _ = wait(futures, timeout=0.5, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage, result = futures.pop(future)
+                    try:
+                        output = future.result()
+                    except Exception as e:
+                        result.status = "failed"
+                        result.error = str(e) or type(e).__name__
+                        logger.error(f"The song {result.song['song_name']} couldn't be downloaded ({stage}): {e}")
+                    else:
+                        next_index = STAGES.index(stage) + 1
+                        if next_index < len(STAGES):
+                            next_stage = STAGES[next_index]
+                            future = pools[next_stage].submit(self._run_stage, next_stage, result, output)
+                            futures[future] = (next_stage, result)
+                            continue
+                        result.status = "done"
+                        result.path = output
+                        logger.info(f"The song {result.song['song_name']} has been downloaded.")
+
+                    result.elapsed = time.monotonic() - started[id(result)]
+                    progress.finish(result)
+
+                    key = leaders.pop(id(result), None)
+                    if key and not result.failed:
+                        videos[key] = result.song["song_id"]
+                    for follower in waiting.pop(key, []):
+                        if overwrite:
+                            checker.delete_song(follower.song["song_id"])
+                        linked_path = checker.link_duplicate(follower.song, key, videos) if not result.failed else None
+                        if linked_path:
+                            submit("transcode", follower, linked_path)
+                        else:
+                            submit("fetch", follower)
+        except KeyboardInterrupt:
+            self._stop.set()
+            raise
+        finally:
+            # The songs not started yet are dropped, shutdown(cancel_futures=True) needing Python 3.9.
+            for future in futures:
+                future.cancel()
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+            progress.close()
+
+        return results
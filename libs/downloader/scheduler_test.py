@@ -0,0 +1,79 @@
+import io
+import os
+import threading
+import time
+
+from .index import PARTIAL, DownloadIndex
+from .scheduler import DownloadError, DownloadScheduler
+
+
+class FakeScheduler(DownloadScheduler):
+    """Runs the stages without the network nor FFmpeg, recording how many songs were in each stage at once."""
+    def __init__(self, **kwargs):
+        super().__init__({"download_dir": "./test_scheduler"}, **kwargs)
+        self.lock = threading.Lock()
+        self.active = {"fetch": 0, "download": 0, "transcode": 0}
+        self.peak = dict(self.active)
+        self.fetched = []
+
+    def _stage(self, stage: str, output, duration: float = 0.05):
+        with self.lock:
+            self.active[stage] += 1
+            self.peak[stage] = max(self.peak[stage], self.active[stage])
+        time.sleep(duration)
+        with self.lock:
+            self.active[stage] -= 1
+        return output
+
+    def fetch(self, result):
+        if result.song["link"] == "invalid":
+            raise DownloadError("No video could be found with the provided link.")
+        result.duration = 60
+        self.fetched.append(result.song["song_id"])
+        return self._stage("fetch", {"url": result.song["link"]})
+
+    def download(self, result, info):
+        # Slower than the fetch, so the downloads pile up to the size of their pool.
+        return self._stage("download", f"{result.song['song_id']}.webm", 0.15)
+
+    def transcode(self, result, path):
+        return self._stage("transcode", path.replace(".webm", ".mp3"))
+
+
+def test_scheduler():
+    songs = [{"song_id": i, "song_name": f"Song {i}", "group_name": "Group", "link": f"link {i}"} for i in range(12)]
+    songs[3]["link"] = "invalid"
+    os.makedirs("./test_scheduler/5")
+    with open("./test_scheduler/5/Song 5 - Group.mp3", "w"):
+        pass
+    # The video of this one was downloaded by an interrupted run, it only needs to be converted.
+    os.makedirs("./test_scheduler/7")
+    with open("./test_scheduler/7/Song 7 - Group.webm", "w"):
+        pass
+    DownloadIndex.of("./test_scheduler").record(7, "./test_scheduler/7/Song 7 - Group.webm", False, PARTIAL)
+
+    scheduler = FakeScheduler(fetchers=2, downloaders=3, transcoders=2)
+    stream = io.StringIO()
+    results = scheduler.run(songs, stream=stream)
+
+    assert [result.song for result in results] == songs
+    assert [result.status for result in results] == ["done"] * 3 + ["failed", "done", "skipped"] + ["done"] * 6
+    assert results[3].error == "No video could be found with the provided link."
+    assert results[0].path == "0.mp3" and results[0].duration == 60
+    assert results[5].path is None
+    assert 7 not in scheduler.fetched
+    assert os.path.normpath(results[7].path) == os.path.normpath("./test_scheduler/7/Song 7 - Group.mp3")
+    assert scheduler.peak == {"fetch": 2, "download": 3, "transcode": 2}
+    assert "10 done, 1 skipped, 1 failed" in stream.getvalue()
+
+    results = scheduler.run(songs[5:6], overwrite=True)
+    assert results[0].status == "done"
+
+
+def test_scheduler_cleanup():
+    os.remove("./test_scheduler/5/Song 5 - Group.mp3")
+    os.rmdir("./test_scheduler/5")
+    os.remove("./test_scheduler/7/Song 7 - Group.webm")
+    os.rmdir("./test_scheduler/7")
+    os.remove("./test_scheduler/.downloads.db")
+    os.rmdir("./test_scheduler")
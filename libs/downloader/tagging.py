@@ -0,0 +1,274 @@
+"""Writing the tags of the songs downloaded.
+
+Tagging a song rewrites its whole file, so the edits of the songs aren't written right away: they're queued,
+the edits of the same song merged, and written in batches by a pool of threads after a short delay.
+The downloads still tag their songs right away, a song only being complete once it's tagged.
+"""
+import atexit
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import music_tag
+
+from ..logger import get_logger
+from .index import DownloadIndex, song_file
+
+TAG_WORKERS = min(8, os.cpu_count() or 2)
+TAG_DELAY = 1.0
+TAG_BATCH = 32
+
+# The tags written and the fields of the songs they come from.
+TAGS = {
+    "artist": "group_name",
+    "genre": "genre",
+    "tracktitle": "song_name",
+}
+
+logger = get_logger("tagging")
+
+
+def song_tags(song_data: dict) -> Dict[str, str]:
+    """Returns the tags of a song from the information stored in the database."""
+    return {tag: song_data[field] for tag, field in TAGS.items()}
+
+
+def write_tags(path: str, tags: Dict[str, str]) -> bool:
+    """Writes the tags of an audio file, unless it already has them.
+
+    :param path: The path of the audio file.
+    :param tags: The value of every tag.
+    :PRE: The file needs to exist.
+    :POST: Returns True if the file has been rewritten, False if its tags already matched.
+           A file hard linked to other songs is copied first, so their tags aren't changed.
+    :raises NotImplementedError if music_tag doesn't support the container of the file.
+    """
+    f = music_tag.load_file(path)
+    if all(f[tag].first == (value or None) for tag, value in tags.items()):
+        return False
+
+    if os.stat(path).st_nlink > 1:
+        copy = f"{path}.part"
+        shutil.copy2(path, copy)
+        os.replace(copy, path)
+        f = music_tag.load_file(path)
+
+    for tag, value in tags.items():
+        f[tag] = value
+    f.save()
+    return True
+
+
+class TagQueue:
+    _instances: Dict[str, "TagQueue"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, download_dir: str, workers: int = TAG_WORKERS, delay: float = TAG_DELAY,
+                 batch_size: int = TAG_BATCH):
+        """The tags waiting to be written to the songs of a download folder, use TagQueue.of to share it.
+
+        :param download_dir: The download folder.
+        :param workers: How many threads write the tags.
+        :param delay: How long the edits are kept before being written, to merge the edits of the same song.
+        :param batch_size: The maximum amount of songs tagged by a thread at once.
+        """
+        self.download_dir = download_dir
+        self.workers = workers
+        self.delay = delay
+        self.batch_size = batch_size
+        self.written = 0
+        self.coalesced = 0
+        self._index = DownloadIndex.of(download_dir)
+        self._pending: "OrderedDict[int, Dict[str, str]]" = OrderedDict()
+        self._writing: Set[int] = set()
+        self._futures = set()
+        self._timer: Optional[threading.Timer] = None
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="tag")
+
+    @classmethod
+    def of(cls, download_dir: str) -> "TagQueue":
+        """Returns the queue of a download folder, the same object for every downloader of the process.
+        The queues are flushed when the process exits."""
+        key = os.path.abspath(download_dir)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                if not cls._instances:
+                    atexit.register(cls.flush_all)
+                cls._instances[key] = cls(download_dir)
+            return cls._instances[key]
+
+    @classmethod
+    def flush_all(cls):
+        with cls._instances_lock:
+            queues = list(cls._instances.values())
+        for queue in queues:
+            queue.flush()
+
+    def tag(self, song_id: int, tags: Dict[str, str], with_checksum: bool = True) -> bool:
+        """Writes the tags of a song right away, replacing the ones queued.
+
+        :param song_id: The id of the song.
+        :param tags: The value of every tag.
+        :param with_checksum: If the checksum of a rewritten file is computed now, it's left for verify otherwise.
+        :PRE: _
+        :POST: The song is tagged and recorded as complete in the index if it exists.
+               Returns True if its file has been rewritten.
+        """
+        with self._condition:
+            self._pending.pop(song_id, None)
+            while song_id in self._writing:
+                self._condition.wait()
+            self._writing.add(song_id)
+        try:
+            return self._write(song_id, tags, with_checksum)
+        finally:
+            with self._condition:
+                self._writing.discard(song_id)
+                self._condition.notify_all()
+
+    def put(self, song_id: int, tags: Dict[str, str]):
+        """Queues the tags of a song, they're written after the delay or once a batch is full.
+
+        :param song_id: The id of the song.
+        :param tags: The value of every tag.
+        :PRE: _
+        :POST: The tags replace the ones queued for the same song, if any.
+        """
+        with self._condition:
+            if self._pending.pop(song_id, None) is not None:
+                self.coalesced += 1
+            self._pending[song_id] = tags
+
+            if len(self._pending) >= self.batch_size:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.delay, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def __len__(self):
+        """The amount of songs waiting to be tagged, or being tagged."""
+        with self._condition:
+            return len(self._pending) + len(self._writing)
+
+    def _write(self, song_id: int, tags: Dict[str, str], with_checksum: bool = True) -> bool:
+        path = song_file(os.path.join(self.download_dir, str(song_id)))
+        if not path:
+            return False
+        try:
+            rewritten = write_tags(path, tags)
+        except NotImplementedError:
+            logger.warning(f"The song {path} can't be tagged, its container isn't supported.")
+            rewritten = False
+
+        # The entry of a file left as it was is still valid, it's only recorded again if it changed.
+        entry = self._index.get(song_id)
+        if rewritten or entry is None or os.path.normpath(entry["path"]) != os.path.normpath(path):
+            self._index.record(song_id, path, with_checksum)
+        with self._condition:
+            self.written += rewritten
+        return rewritten
+
+    def _take_batch(self) -> List[Tuple[int, Dict[str, str]]]:
+        # A song being written is left in the queue, its new tags are written once the previous ones are.
+        batch = [(song_id, tags) for song_id, tags in self._pending.items() if song_id not in self._writing]
+        batch = batch[:self.batch_size]
+        for song_id, _ in batch:
+            del self._pending[song_id]
+            self._writing.add(song_id)
+        return batch
+
+    def _write_batch(self, batch: List[Tuple[int, Dict[str, str]]]):
+        for song_id, tags in batch:
+            try:
+                self._write(song_id, tags)
+            except Exception as e:
+                logger.error(f"The tags of the song {song_id} couldn't be written: {e}")
+            finally:
+                with self._condition:
+                    self._writing.discard(song_id)
+                    self._condition.notify_all()
+
+        with self._condition:
+            if self._pending and self._timer is None:
+                self._dispatch()
+
+    def _on_timer(self):
+        with self._condition:
+            self._timer = None
+            self._dispatch()
+
+    def _dispatch(self):
+        """Hands the songs queued to the threads, the condition needs to be held."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                future = self._executor.submit(self._write_batch, batch)
+            except RuntimeError:
+                # The interpreter is exiting, flush writes them instead.
+                for song_id, tags in batch:
+                    self._writing.discard(song_id)
+                    self._pending[song_id] = tags
+                return
+            self._futures.add(future)
+            future.add_done_callback(self._futures.discard)
+
+    def flush(self):
+        """Writes every tag queued, without waiting for the delay.
+
+        :PRE: _
+        :POST: Every song queued has been tagged.
+        """
+        with self._condition:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            futures = set(self._futures)
+
+        wait(futures)
+        while True:
+            with self._condition:
+                batch = self._take_batch()
+                if not batch:
+                    if not self._pending and not self._writing:
+                        return
+                    self._condition.wait()
+                    continue
+            self._write_batch(batch)
+
+    def sync(self, songs: Iterable[dict]) -> Dict[str, List[int]]:
+        """Writes the tags of many songs in parallel, skipping the files whose tags already match.
+
+        :param songs: The information about the songs stored in the database.
+        :PRE: _
+        :POST: Returns the song ids by outcome: "updated", "unchanged", "missing" (not downloaded)
+               and "failed" (the error is logged). The checksums of the files rewritten are left for verify.
+        """
+        report = {"updated": [], "unchanged": [], "missing": [], "failed": []}
+        # Not the threads of the queue: these wait for the songs they're writing.
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="retag") as executor:
+            futures = {}
+            for song in songs:
+                if song["song_id"] not in self._index:
+                    report["missing"].append(song["song_id"])
+                else:
+                    futures[executor.submit(self.tag, song["song_id"], song_tags(song), False)] = song["song_id"]
+
+            for future, song_id in futures.items():
+                try:
+                    report["updated" if future.result() else "unchanged"].append(song_id)
+                except Exception as e:
+                    logger.error(f"The tags of the song {song_id} couldn't be written: {e}")
+                    report["failed"].append(song_id)
+
+        return report
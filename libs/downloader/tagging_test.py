@@ -0,0 +1,66 @@
+import os
+import struct
+
+import music_tag
+
+from .index import DownloadIndex
+from .tagging import TagQueue, song_tags
+
+
+def write_flac(path: str):
+    """Writes a FLAC file without any audio, enough to be tagged."""
+    info = (struct.pack(">HH", 4096, 4096) + bytes(6)
+            + ((44100 << 44) | (1 << 41) | (15 << 36)).to_bytes(8, "big") + bytes(16))
+    with open(path, "wb") as f:
+        f.write(b"fLaC" + bytes([0x80]) + len(info).to_bytes(3, "big") + info)
+
+
+def test_tagging():
+    songs = [{"song_id": i, "song_name": f"Song {i}", "group_name": "Group", "genre": "Rock"} for i in range(4)]
+    index = DownloadIndex.of("./test_tagging")
+    for song in songs[:3]:
+        os.makedirs(f"./test_tagging/{song['song_id']}")
+        write_flac(f"./test_tagging/{song['song_id']}/song.flac")
+        index.record(song["song_id"], f"./test_tagging/{song['song_id']}/song.flac", with_checksum=False)
+
+    queue = TagQueue("./test_tagging", workers=2, delay=60, batch_size=2)
+
+    # The edits of the same song are merged, nothing is written before the delay.
+    queue.put(0, song_tags({**songs[0], "genre": "Pop"}))
+    queue.put(0, song_tags(songs[0]))
+    assert queue.coalesced == 1
+    assert len(queue) == 1
+    assert music_tag.load_file("./test_tagging/0/song.flac")["genre"].first is None
+
+    # A full batch is written without waiting.
+    queue.put(1, song_tags(songs[1]))
+    queue.flush()
+    assert len(queue) == 0
+    assert queue.written == 2
+    f = music_tag.load_file("./test_tagging/1/song.flac")
+    assert (f["artist"].first, f["genre"].first, f["tracktitle"].first) == ("Group", "Rock", "Song 1")
+
+    # The files already matching aren't rewritten, nor indexed again.
+    indexed_at = index.get(1)["indexed_at"]
+    report = queue.sync([{**songs[0], "genre": "Jazz"}, *songs[1:]])
+    assert report == {"updated": [0, 2], "unchanged": [1], "missing": [3], "failed": []}
+    assert music_tag.load_file("./test_tagging/0/song.flac")["genre"].first == "Jazz"
+    assert index.get(1)["indexed_at"] == indexed_at
+    assert index.get(0)["checksum"] is None
+    assert queue.tag(0, song_tags({**songs[0], "genre": "Jazz"})) is False
+
+    # A file shared with another song is copied before being tagged differently.
+    os.remove("./test_tagging/2/song.flac")
+    os.link("./test_tagging/0/song.flac", "./test_tagging/2/song.flac")
+    assert queue.tag(2, song_tags(songs[2])) is True
+    assert not os.path.samefile("./test_tagging/0/song.flac", "./test_tagging/2/song.flac")
+    assert music_tag.load_file("./test_tagging/0/song.flac")["tracktitle"].first == "Song 0"
+    assert music_tag.load_file("./test_tagging/2/song.flac")["tracktitle"].first == "Song 2"
+
+
+def test_tagging_cleanup():
+    for song_id in range(3):
+        os.remove(f"./test_tagging/{song_id}/song.flac")
+        os.rmdir(f"./test_tagging/{song_id}")
+    os.remove("./test_tagging/.downloads.db")
+    os.rmdir("./test_tagging")
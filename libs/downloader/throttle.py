@@ -0,0 +1,207 @@
+"""Limits of the requests and the bandwidth shared by every download of the process.
+
+Each SongDownloader sends its requests through the same Throttle: the requests to a host are spread by a token
+bucket, the bytes downloaded are counted against a global bucket and one per host, and a host answering
+429 or 403 is left alone for a while, twice as long after each refusal. The buckets accept bursts,
+so the downloads go as fast as allowed and only wait once the average is over the limit.
+
+The hosts are grouped by domain, the videos being served by many servers of the same domain.
+"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from youtube_dl.downloader.common import FileDownloader
+
+REQUESTS_PER_SECOND = 4.0
+MAX_BACKOFF = 60.0
+BACKOFF_BASE = 2.0
+# The status codes meaning the host refuses to answer so many requests.
+THROTTLE_CODES = (429, 403)
+THROTTLE_RETRIES = 3
+
+
+def parse_rate(rate: Optional[str]) -> Optional[int]:
+    """Returns a bandwidth in bytes per second, like "500K" or "2M".
+
+    :param rate: The bandwidth, a number of bytes optionally followed by a unit.
+    :PRE: _
+    :POST: Returns the amount of bytes, None if there's no limit (empty or 0).
+    :raises ValueError if the bandwidth can't be read.
+    """
+    if rate is None or str(rate).strip() in ("", "0"):
+        return None
+    parsed = FileDownloader.parse_bytes(str(rate).strip())
+    if parsed is None:
+        raise ValueError(f"Invalid bandwidth {rate!r}, expected a number of bytes like 500K or 2M.")
+    return int(parsed)
+
+
+def host_key(url: str) -> str:
+    """Returns the domain of an url, the servers of the same domain sharing their limits."""
+    host = (urlparse(url).hostname or "").lower()
+    return ".".join(host.split(".")[-2:])
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """Allows an amount of something per second, with bursts up to the capacity.
+
+        :param rate: How many tokens are added per second.
+        :param capacity: The maximum amount of tokens stored, one second worth of tokens if None.
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """Takes tokens from the bucket, going in debt if there aren't enough.
+
+        :param amount: The amount of tokens.
+        :PRE: _
+        :POST: Returns how long to wait before using them, in seconds. Everyone waits their turn.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def take(self, amount: float = 1):
+        """Waits until the tokens can be used."""
+        time.sleep(self.reserve(amount))
+
+
+class Throttle:
+    def __init__(self, bandwidth: Optional[int] = None, host_bandwidth: Optional[int] = None,
+                 requests: Optional[float] = REQUESTS_PER_SECOND, max_backoff: float = MAX_BACKOFF):
+        """The limits shared by the downloads, see configure.
+
+        :param bandwidth: The bytes per second downloaded from every host, None for no limit.
+        :param host_bandwidth: The bytes per second downloaded from a host, None for no limit.
+        :param requests: The requests per second sent to a host, None for no limit.
+        :param max_backoff: The longest time a host refusing the requests is left alone, in seconds.
+        """
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._failures: Dict[str, int] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._received: Dict[str, int] = {}
+        self.waited = 0.0
+        self.refusals = 0
+        self.configure(bandwidth, host_bandwidth, requests, max_backoff)
+
+    def configure(self, bandwidth: Optional[int] = None, host_bandwidth: Optional[int] = None,
+                  requests: Optional[float] = REQUESTS_PER_SECOND, max_backoff: float = MAX_BACKOFF):
+        """Changes the limits, the downloads in progress use them right away.
+
+        :param bandwidth: The bytes per second downloaded from every host, None for no limit.
+        :param host_bandwidth: The bytes per second downloaded from a host, None for no limit.
+        :param requests: The requests per second sent to a host, None for no limit.
+        :param max_backoff: The longest time a host refusing the requests is left alone, in seconds.
+        :PRE: _
+        :POST: The buckets are replaced, the hosts being left alone still are.
+        """
+        with self._lock:
+            self.bandwidth = bandwidth
+            self.host_bandwidth = host_bandwidth
+            self.requests = requests
+            self.max_backoff = max_backoff
+            self._bandwidth = TokenBucket(bandwidth) if bandwidth else None
+            self._host_bandwidth: Dict[str, TokenBucket] = {}
+            self._requests: Dict[str, TokenBucket] = {}
+            # The requests sent in a burst, the bucket being refilled at the rate afterwards.
+            self._burst = max(1.0, 2 * requests) if requests else None
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], host: str, rate: float, capacity: Optional[float] = None):
+        with self._lock:
+            if host not in buckets:
+                buckets[host] = TokenBucket(rate, capacity)
+            return buckets[host]
+
+    def _sleep(self, delay: float):
+        if delay > 0:
+            with self._lock:
+                self.waited += delay
+            time.sleep(delay)
+
+    def before_request(self, url: str):
+        """Waits until a request can be sent, called by every request.
+
+        :param url: The url requested.
+        :PRE: _
+        :POST: The host isn't being left alone and the request fits in its rate.
+               The bytes downloaded next by this thread count against the bandwidth of this host.
+        """
+        host = host_key(url)
+        self._local.host = host
+        with self._lock:
+            blocked = self._blocked_until.get(host, 0) - time.monotonic()
+        self._sleep(blocked)
+
+        if self.requests:
+            self._sleep(self._bucket(self._requests, host, self.requests, self._burst).reserve())
+
+    def refused(self, url: str, retry_after: Optional[str] = None) -> float:
+        """Leaves a host alone after it refused a request.
+
+        :param url: The url requested.
+        :param retry_after: The Retry-After header of the answer, in seconds.
+        :PRE: _
+        :POST: Returns how long the host is left alone, the delay doubling with each refusal in a row.
+        """
+        host = host_key(url)
+        with self._lock:
+            self.refusals += 1
+            self._failures[host] = failures = self._failures.get(host, 0) + 1
+            delay = BACKOFF_BASE * 2 ** (failures - 1) * random.uniform(1, 1.25)
+            if retry_after and retry_after.strip().isdigit():
+                delay = max(delay, float(retry_after))
+            delay = min(delay, self.max_backoff)
+            self._blocked_until[host] = max(self._blocked_until.get(host, 0), time.monotonic() + delay)
+        return delay
+
+    def succeeded(self, url: str):
+        """Records that a host answered, the next refusal is waited for from the start again."""
+        with self._lock:
+            self._failures.pop(host_key(url), None)
+
+    def hook(self, data: dict):
+        """Progress hook of youtube_dl, slowing the download down to the bandwidth allowed.
+
+        :param data: The status of a download.
+        :PRE: The download needs to be made by this thread, after before_request.
+        :POST: Waits until the bytes received since the last call fit in the bandwidth.
+        """
+        name = data.get("tmpfilename") or data.get("filename", "")
+        downloaded = data.get("downloaded_bytes") or 0
+        with self._lock:
+            # A resumed download starts with the bytes of the partial file, they aren't counted.
+            received = downloaded - self._received.get(name, downloaded)
+            if data["status"] == "downloading":
+                self._received[name] = downloaded
+            else:
+                self._received.pop(name, None)
+        if received <= 0:
+            return
+
+        host = getattr(self._local, "host", "")
+        delays = []
+        if self._bandwidth:
+            delays.append(self._bandwidth.reserve(received))
+        if self.host_bandwidth:
+            delays.append(self._bucket(self._host_bandwidth, host, self.host_bandwidth).reserve(received))
+        self._sleep(max(delays, default=0))
+
+    def stats(self) -> dict:
+        """Returns the seconds waited because of the limits, and the amount of requests refused."""
+        with self._lock:
+            return {"waited": self.waited, "refusals": self.refusals}
+
+
+throttle = Throttle()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+from io import BytesIO
+
+import pytest
+import youtube_dl
+from youtube_dl.compat import compat_HTTPError
+
+from . import SongDownloader
+from .throttle import THROTTLE_RETRIES, Throttle, TokenBucket, host_key, parse_rate, throttle
+
+
+def test_throttle():
+    assert parse_rate("0") is None and parse_rate(None) is None
+    assert parse_rate("500K") == 500 * 1024
+    assert parse_rate("2M") == 2 * 1024 * 1024
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+    assert host_key("https://r4---sn-q4fl6n7s.googlevideo.com/videoplayback?id=1") == "googlevideo.com"
+
+    # Bursts up to the capacity, then the average rate.
+    bucket = TokenBucket(10, capacity=5)
+    assert [bucket.reserve() for _ in range(5)] == [0] * 5
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+    limits = Throttle(bandwidth=1000, requests=None)
+    limits.before_request("https://example.com/song")
+    start = time.monotonic()
+    limits.hook({"status": "downloading", "filename": "song", "downloaded_bytes": 100})
+    limits.hook({"status": "downloading", "filename": "song", "downloaded_bytes": 1100})
+    limits.hook({"status": "finished", "filename": "song", "downloaded_bytes": 1300})
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.1)
+
+    # The host is left alone twice as long after each refusal, the others aren't.
+    first = limits.refused("https://a.example.com/1")
+    second = limits.refused("https://b.example.com/2")
+    assert 2 <= first <= 2.5 and 4 <= second <= 5
+    limits.succeeded("https://example.com")
+    assert 2 <= limits.refused("https://example.com", "1") <= 2.5
+    assert limits.refused("https://example.com", "3600") == limits.max_backoff
+    start = time.monotonic()
+    limits.before_request("https://other.com")
+    assert time.monotonic() - start < 0.1
+    assert limits.stats()["refusals"] == 4
+
+
+def test_throttle_retries(monkeypatch):
+    answers = []
+    refusals = [THROTTLE_RETRIES]
+
+    def urlopen(self, req):
+        answers.append(req)
+        if len(answers) <= refusals[0]:
+            raise compat_HTTPError(req, 429, "Too Many Requests", {"Retry-After": "0"}, BytesIO())
+        return "answer"
+
+    monkeypatch.setattr(youtube_dl.YoutubeDL, "urlopen", urlopen)
+    monkeypatch.setattr(sys.modules[Throttle.__module__], "BACKOFF_BASE", 0.01)
+    throttle.configure(requests=None)
+    downloader = SongDownloader({"download_dir": "./test_throttle"})
+
+    assert downloader.urlopen("https://example.com/video") == "answer"
+    assert len(answers) == THROTTLE_RETRIES + 1
+
+    # It gives up after a few refusals.
+    answers.clear()
+    refusals[0] = THROTTLE_RETRIES + 1
+    with pytest.raises(compat_HTTPError):
+        downloader.urlopen("https://example.com/video")
+    assert len(answers) == THROTTLE_RETRIES + 1
+    throttle.configure()
+
+
+def test_throttle_cleanup():
+    os.rmdir("./test_throttle")
@@ -0,0 +1,179 @@
+"""Conversion of the downloaded videos to the audio format chosen.
+
+FFmpeg is run directly instead of through the youtube_dl postprocessors, so the conversion is its own stage:
+the functions here only need paths and names, they're run by a pool of threads while other songs download.
+
+A video whose audio stream already has the codec chosen is only remuxed, without being encoded again.
+The "native" codec always keeps the audio stream of the video, in a container that can be tagged:
+nothing is decoded, which is the fastest but leaves the songs with different extensions.
+"""
+import os
+import shutil
+import subprocess
+from typing import List, Optional, Tuple
+
+DEFAULT_CODEC = "mp3"
+DEFAULT_PRESET = "medium"
+
+# The extension and the FFmpeg encoder of every codec, and the audio streams stored as is.
+CODECS = {
+    "mp3": {"ext": "mp3", "encoder": "libmp3lame", "copy": ("mp3",)},
+    "flac": {"ext": "flac", "encoder": "flac", "copy": ("flac",)},
+    "opus": {"ext": "opus", "encoder": "libopus", "copy": ("opus",)},
+    "m4a": {"ext": "m4a", "encoder": "aac", "copy": ("aac",)},
+}
+
+# The FFmpeg options of every codec by quality, FLAC being lossless only its compression changes.
+PRESETS = {
+    "low": {
+        "mp3": ["-b:a", "128k"],
+        "flac": ["-compression_level", "0"],
+        "opus": ["-b:a", "96k"],
+        "m4a": ["-b:a", "128k"],
+    },
+    "medium": {
+        "mp3": ["-b:a", "192k"],
+        "flac": ["-compression_level", "5"],
+        "opus": ["-b:a", "128k"],
+        "m4a": ["-b:a", "192k"],
+    },
+    "high": {
+        "mp3": ["-q:a", "0"],
+        "flac": ["-compression_level", "8"],
+        "opus": ["-b:a", "192k"],
+        "m4a": ["-b:a", "256k"],
+    },
+}
+
+# Keeps the audio stream of the video as is, in the container of NATIVE_CONTAINERS matching its codec.
+NATIVE = "native"
+NATIVE_CONTAINERS = {
+    "opus": "opus",
+    "vorbis": "ogg",
+    "aac": "m4a",
+    "alac": "m4a",
+    "mp3": "mp3",
+    "flac": "flac",
+}
+# The codec used when a stream can't be kept, no container that can be tagged accepting it.
+NATIVE_FALLBACK = DEFAULT_CODEC
+
+# The extensions of the audio files, the other files of a song are the videos downloaded.
+AUDIO_EXTENSIONS = frozenset(NATIVE_CONTAINERS.values()) | {codec["ext"] for codec in CODECS.values()}
+
+WORK_FOLDER = ".transcode"
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def check_format(codec: str, preset: str):
+    """Checks that a codec and a preset exist.
+
+    :param codec: The name of the codec.
+    :param preset: The name of the preset.
+    :PRE: _
+    :POST: _
+    :raises ValueError if one of them is unknown.
+    """
+    if codec not in CODECS and codec != NATIVE:
+        raise ValueError(f"Unknown codec {codec}, it should be one of {', '.join(CODECS)} or {NATIVE}.")
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown preset {preset}, it should be one of {', '.join(PRESETS)}.")
+
+
+def probe_codec(path: str) -> Optional[str]:
+    """Returns the codec of the audio stream of a file with ffprobe, None if it can't be read."""
+    command = ["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries", "stream=codec_name",
+               "-of", "default=noprint_wrappers=1:nokey=1", path]
+    try:
+        process = subprocess.run(command, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    except OSError:
+        return None
+    if process.returncode != 0:
+        return None
+    return process.stdout.strip() or None
+
+
+def is_audio(path: str) -> bool:
+    """Whether a file is an audio file written by transcode, from its extension."""
+    return os.path.splitext(path)[1][1:].lower() in AUDIO_EXTENSIONS
+
+
+def output_format(path: str, codec: str) -> Tuple[str, str, bool]:
+    """Chooses how a downloaded video is converted.
+
+    :param path: The path of the downloaded file.
+    :param codec: The name of the codec, or NATIVE.
+    :PRE: The codec needs to exist.
+    :POST: Returns the codec encoding the audio, the extension of the audio file
+           and whether the audio stream is stored as is, the codec being unused then.
+    """
+    stream = probe_codec(path)
+    if codec == NATIVE:
+        if stream in NATIVE_CONTAINERS:
+            return codec, NATIVE_CONTAINERS[stream], True
+        codec = NATIVE_FALLBACK
+    return codec, CODECS[codec]["ext"], stream in CODECS[codec]["copy"]
+
+
+def ffmpeg_command(source: str, target: str, codec: str, preset: str, copy: bool = False) -> List[str]:
+    """Returns the FFmpeg command converting a file.
+
+    :param source: The path of the file converted.
+    :param target: The path of the audio file written.
+    :param codec: The name of the codec.
+    :param preset: The name of the preset.
+    :param copy: If the audio stream should be stored as is.
+    :PRE: The codec and the preset need to exist.
+    :POST: Returns the arguments of the command, the video streams and the metadata are left out.
+    """
+    options = ["-c:a", "copy"] if copy else ["-c:a", CODECS[codec]["encoder"], *PRESETS[preset][codec]]
+    return ["ffmpeg", "-y", "-nostdin", "-loglevel", "error", "-i", source,
+            "-vn", "-sn", "-map_metadata", "-1", *options, target]
+
+
+def transcode(path: str, codec: str = DEFAULT_CODEC, preset: str = DEFAULT_PRESET) -> str:
+    """Converts a downloaded video to an audio file next to it.
+
+    :param path: The path of the downloaded file.
+    :param codec: The name of the codec, or NATIVE to keep the audio stream of the video.
+    :param preset: The name of the preset.
+    :PRE: FFmpeg needs to be installed.
+    :POST: The file is replaced by the audio file, returns the path of the audio file.
+           A file that already has the extension of the codec, any audio extension for NATIVE, is left as is.
+           The conversion is made in a temporary folder, so an interrupted one leaves no partial file.
+    :raises ValueError if the codec or the preset is unknown.
+    :raises TranscodeError if the conversion failed.
+    """
+    check_format(codec, preset)
+    folder, name = os.path.split(path)
+    if is_audio(name) if codec == NATIVE else name.endswith(f".{CODECS[codec]['ext']}"):
+        return path
+
+    codec, ext, copy = output_format(path, codec)
+    audio_name = f"{os.path.splitext(name)[0]}.{ext}"
+
+    work_folder = os.path.join(folder, WORK_FOLDER)
+    shutil.rmtree(work_folder, ignore_errors=True)
+    os.mkdir(work_folder)
+
+    try:
+        target = os.path.join(work_folder, audio_name)
+        try:
+            process = subprocess.run(ffmpeg_command(path, target, codec, preset, copy),
+                                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE, text=True)
+        except OSError as e:
+            raise TranscodeError(f"FFmpeg couldn't be run, is it installed? ({e})")
+        if process.returncode != 0 or not os.path.exists(target):
+            errors = process.stderr.strip().splitlines()
+            raise TranscodeError(errors[-1] if errors else f"FFmpeg failed with the code {process.returncode}.")
+
+        audio_path = os.path.join(folder, audio_name)
+        os.replace(target, audio_path)
+        os.remove(path)
+        return audio_path
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
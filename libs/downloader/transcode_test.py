@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from .index import song_file
+from .scheduler import DownloadScheduler
+from .transcode import NATIVE, TranscodeError, check_format, ffmpeg_command, is_audio, transcode
+
+
+def test_transcode():
+    check_format("flac", "high")
+    check_format(NATIVE, "low")
+    with pytest.raises(ValueError):
+        check_format("wav", "medium")
+    with pytest.raises(ValueError):
+        check_format("mp3", "best")
+    with pytest.raises(ValueError):
+        DownloadScheduler({"audio_codec": "wav"})
+
+    command = ffmpeg_command("a.webm", "a.mp3", "mp3", "medium")
+    assert command[-5:] == ["-c:a", "libmp3lame", "-b:a", "192k", "a.mp3"]
+    assert "-vn" in command
+    command = ffmpeg_command("a.webm", "a.opus", "opus", "low", copy=True)
+    assert command[-3:] == ["-c:a", "copy", "a.opus"]
+    assert is_audio("a.opus") and is_audio("a.M4A") and not is_audio("a.webm")
+
+    os.makedirs("./test_transcode")
+    with open("./test_transcode/song.mp3", "w"):
+        pass
+    with open("./test_transcode/song.webm", "w"):
+        pass
+
+    # Already converted, FFmpeg isn't run.
+    assert transcode("./test_transcode/song.mp3") == "./test_transcode/song.mp3"
+    assert transcode("./test_transcode/song.mp3", NATIVE) == "./test_transcode/song.mp3"
+    # The audio file is found whatever its extension, even next to a video.
+    assert song_file("./test_transcode") == os.path.join("./test_transcode", "song.mp3")
+
+    # An invalid video (or no FFmpeg at all) is an error, and the video is left for the next attempt.
+    with pytest.raises(TranscodeError):
+        transcode("./test_transcode/song.webm", "flac")
+    assert sorted(os.listdir("./test_transcode")) == ["song.mp3", "song.webm"]
+
+
+def test_transcode_cleanup():
+    os.remove("./test_transcode/song.mp3")
+    os.remove("./test_transcode/song.webm")
+    os.rmdir("./test_transcode")
@@ -1,12 +1,15 @@
+import threading
+
+from kivy.clock import mainthread
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.core.clipboard import Clipboard
 
-from ..console_interface.utils import export_playlist
-from ..downloader import SongDownloader
+from ..console_interface.utils import configure_throttle, download_config, export_playlist
+from ..downloader.scheduler import DownloadScheduler
 from ..database import DBMuziek
-from.utils import InfoPopup
+from.utils import ErrorPopup, InfoPopup
 
 
 class DetailsPlaylist(BoxLayout):
@@ -45,16 +48,24 @@ class DetailsPlaylist(BoxLayout):
             self.ids.export_button.disabled = False
 
     def download_playlist(self):
-        dl = SongDownloader()
-
-        for song in self.songs:
-            if dl.is_downloaded(song["song_id"]):
-                dl.delete_song(song["song_id"])
-
-            if not(dl.fetch_song(song["link"])):
-                return
-
-            dl.download_song(song)
+        self.ids.dl_button.disabled = True
+        configure_throttle(self._db)
+        config = download_config(self._db)
+        threading.Thread(target=self._download_songs, args=(list(self.songs), config), daemon=True).start()
+
+    def _download_songs(self, songs, config):
+        results = DownloadScheduler(config).run(songs, overwrite=True)
+        self.download_finished(results)
+
+    @mainthread
+    def download_finished(self, results):
+        self.ids.dl_button.disabled = False
+
+        failed = [result.song["song_name"] for result in results if result.failed]
+        if failed:
+            ErrorPopup(f"These songs couldn't be downloaded: {', '.join(failed)}.")
+        else:
+            InfoPopup("The playlist has been downloaded.")
 
     def export_playlist(self):
         if not self.playlist or not self.songs:
@@ -9,8 +9,9 @@ from kivy.core.clipboard import Clipboard
 from .popup_song import PopupSong
 from .popup_playlist import PopupAddToPlaylist
 from .utils import ErrorPopup, InfoPopup
+from ..console_interface.utils import configure_throttle, download_config
 from ..database import DBMuziek, format_duration
-from ..downloader import SongDownloader
+from ..downloader.manager import downloaders
 
 
 class DetailsSong(BoxLayout):
@@ -60,21 +61,20 @@ class DetailsSong(BoxLayout):
             self.check_download()
 
     def download_song(self):
-        dl = SongDownloader({"progress_hooks": [self.check_download]})
-
-        if dl.is_downloaded(self.song_id):
-            dl.delete_song(self.song_id)
+        configure_throttle(self._db)
+        with downloaders.lease(download_config(self._db), [self.check_download]) as dl:
+            if dl.is_downloaded(self.song_id):
+                dl.delete_song(self.song_id)
 
-        if not(dl.fetch_song(self.song["link"])):
-            ErrorPopup("There was an error when trying to download the song, is the link valid?")
-            return
+            if not(dl.fetch_song(self.song["link"])):
+                ErrorPopup("There was an error when trying to download the song, is the link valid?")
+                return
 
-        dl.download_song(self.song)
+            dl.download_song(self.song)
 
     def check_download(self, data=None):
         if not data:
-            dl = SongDownloader()
-            if dl.is_downloaded(self.song_id):
+            if downloaders.get().is_downloaded(self.song_id):
                 self.ids.dl_button.text = "Redownload"
                 self.ids.dl_button.disabled = False
                 self.ids.dl_location_button.disabled = False
@@ -96,9 +96,7 @@ class DetailsSong(BoxLayout):
             edit.open()
 
     def open_dl_folder(self):
-        dl = SongDownloader()
-
-        path = dl.get_song_path(self.song_id)
+        path = downloaders.get().get_song_path(self.song_id)
 
         if path:
             path = os.path.abspath(path)
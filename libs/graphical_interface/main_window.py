@@ -9,6 +9,7 @@ from kivy.uix.behaviors import ButtonBehavior
 from kivy.uix.label import Label
 from typing import List
 from ..database import DBMuziek, format_duration
+from ..database.pager import SongPager
 from .details_album import DetailsAlbum
 from .details_group import DetailsGroup
 from .details_playlist import DetailsPlaylist
@@ -122,17 +123,26 @@ class GroupsWidget(PageLayout):
 
 
 class SongsWidget(PageLayout):
-    def __init__(self, db: DBMuziek, **kwargs):
+    def __init__(self, db: DBMuziek, query: str = '', **kwargs):
         self._db = db
-        count = db.count_songs()
+        self._query = query
+        self._pager = None
+        count = db.count_search(query) if query else db.count_songs()
         super().__init__(['Author', 'Title', 'Duration'], [.4, .4, .2], count, **kwargs)
 
     def get_page(self, page: int) -> List[List[str]]:
-        songs = self._db.get_songs(offset=page * self.per_page, limit=self.per_page)
+        if self._query:
+            songs = self._db.search(self._query, offset=page * self.per_page, limit=self.per_page)
+        else:
+            # The pager remembers where each page starts, it's only valid as long as the page size doesn't change.
+            if self._pager is None or self._pager.per_page != self.per_page:
+                self._pager = SongPager(self._db, per_page=self.per_page)
+                self.total_items = self._pager.total
+            songs = self._pager.page(page)
         return [[r['song_id'], r['group_name'], r['song_name'], format_duration(r['duration'])] for r in songs]
 
     def show_info(self, song_id: int):
-        self.root.display(DetailsSong(self._db, song_id, lambda: self.root.display_songs(self.page)))
+        self.root.display(DetailsSong(self._db, song_id, lambda: self.root.display_songs(self.page, self._query)))
 
 
 class AlbumsWidget(PageLayout):
@@ -170,8 +180,8 @@ class Root(BoxLayout):
     def display_groups(self, page: int = 0):
         self.display(GroupsWidget(self._db, page=page), lambda: PopupGroup(self._db).open())
 
-    def display_songs(self, page: int = 0):
-        self.display(SongsWidget(self._db, page=page), lambda: PopupSong(self._db).open())
+    def display_songs(self, page: int = 0, query: str = ''):
+        self.display(SongsWidget(self._db, query.strip(), page=page), lambda: PopupSong(self._db).open())
 
     def display_albums(self, page: int = 0):
         self.display(AlbumsWidget(self._db, page=page), lambda: PopupAlbum(self._db).open())
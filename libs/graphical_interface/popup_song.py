@@ -3,7 +3,7 @@ from kivy.uix.dropdown import DropDown
 from kivy.uix.popup import Popup
 
 from ..database import DBMuziek
-from ..downloader import SongDownloader
+from ..downloader.manager import downloaders
 from .popup_group import PopupGroup
 from .utils import ErrorPopup
 
@@ -23,7 +23,7 @@ class PopupSong(Popup):
             self.update_data(update_data)
 
     def submit_form(self):
-        dl = SongDownloader()
+        dl = downloaders.get()
         data = self.validate_form()
         if data:
             with self._db.connection:
@@ -34,7 +34,7 @@ class PopupSong(Popup):
                     self._db.update_song(**data)
 
                     if dl.is_downloaded(data["song_id"]):
-                        dl.update_metadata(self._db.get_song(name, g_id))
+                        dl.update_metadata(self._db.get_song(name, g_id), defer=True)
                 else:
                     self._db.create_song(**data)
             self.dismiss()
@@ -50,8 +50,6 @@ class PopupSong(Popup):
         self.ids.featuring_list_container.size_hint = (1, featuring_list.counter + 1)
 
     def validate_form(self):
-        downloader = SongDownloader()
-
         buffer = {}
         name_input = self.ids.name_input
         featuring_list = self.ids.featuring_list
@@ -80,7 +78,8 @@ class PopupSong(Popup):
 
         buffer["genre"] = genre_input.text
 
-        video_info = downloader.fetch_song(link_input.text)
+        with downloaders.lease() as downloader:
+            video_info = downloader.fetch_song(link_input.text)
         if not link_input.text:
             ErrorPopup("No link provided.")
             return None
@@ -1,13 +1,17 @@
 
 import re
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 import requests
 
 from ..logger import get_logger
 from ..database import DBMuziek
+from .cache import ResponseCache
+from .export import PlaylistExport
 from .oauth2 import Token
+from .pagination import PLAYLIST_FIELDS, PLAYLIST_ITEM_FIELDS, Paginator
+from .session import check_answer, create_session
 
 logger = get_logger('youtube-api')
 
@@ -46,6 +50,7 @@ class PlaylistItem:
 
         self._title = kwargs['snippet']['title']
         self._id = kwargs['snippet']['resourceId']['videoId']
+        self._item_id = kwargs.get('id')
 
     def __str__(self):
         return self.title
@@ -54,6 +59,11 @@ class PlaylistItem:
     def id(self) -> str:
         return self._id
 
+    @property
+    def item_id(self) -> Optional[str]:
+        """The id of the song in the playlist, needed to remove it."""
+        return self._item_id
+
     @property
     def url(self) -> str:
         return f'https://www.youtube.com/watch?v={self.id}'
@@ -64,12 +74,14 @@ class PlaylistItem:
 
 
 class Playlist:
-    def __init__(self, token: Token, **kwargs):
+    def __init__(self, token: Token, session: requests.Session, cache: Optional[ResponseCache] = None, **kwargs):
         kind = kwargs.get('kind', '')
         if kind != 'youtube#playlist':
             raise ValueError(f"Expected kind 'youtube#playlist' but got {kind!r} instead.")
 
         self._token = token
+        self._session = session
+        self._cache = cache
         self._id = kwargs['id']
         self._description = kwargs['snippet']['description']
         self._author = kwargs['snippet']['channelTitle']
@@ -96,41 +108,81 @@ class Playlist:
     def title(self) -> str:
         return self._title
 
+    def iter_songs(self) -> Iterator[PlaylistItem]:
+        """Yields the songs of the playlist as soon as they're fetched, they're kept once all of them are."""
+        if self._songs is not None:
+            yield from self._songs
+            return
+
+        songs = []
+        params = dict(part='snippet', playlistId=self.id)
+        for song in Paginator(self._session, self._token, URL_PLAYLIST_ITEMS, params,
+                              lambda item: PlaylistItem(**item), PLAYLIST_ITEM_FIELDS, self._cache):
+            songs.append(song)
+            yield song
+        self._songs = songs
+
     @property
-    def songs(self) -> str:
+    def songs(self) -> List[PlaylistItem]:
         if self._songs is None:
-            params = dict(part='snippet', playlistId=self.id, maxResults=50)
-            with requests.get(URL_PLAYLIST_ITEMS, params=params, headers=self._token.headers) as r:
-                data = r.json()
-                self._songs = [PlaylistItem(**item) for item in data['items']]
-
-            while data.get('nextPageToken') is not None:
-                params['pageToken'] = data['nextPageToken']
-                with requests.get(URL_PLAYLIST_ITEMS, params=params, headers=self._token.headers) as r:
-                    data = r.json()
-                    self._songs = [PlaylistItem(**item) for item in data['items']]
+            self._songs = list(self.iter_songs())
 
         return self._songs
 
 
 class YoutubeAPI:
-    def __init__(self, db: DBMuziek):
-        self._token: Token = Token(db)
+    def __init__(self, db: DBMuziek, session: Optional[requests.Session] = None,
+                 cache: Optional[ResponseCache] = None):
+        """The client of the YouTube Data API, every request goes through the same pooled connections.
+        It should be closed once it isn't needed anymore, or used as a context manager.
+
+        :param db: The database storing the OAuth2 token.
+        :param session: The HTTP client, one from create_session is created and owned if None.
+        :param cache: The answers of the API stored, the one of the database with its settings if None.
+        """
+        self._owns_session = session is None
+        self._session = session or create_session()
+        self._token: Token = Token(db, self._session)
+        self._cache = cache or ResponseCache.of(db)
         self._playlists: List[Playlist] = None
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Closes the connections kept open, unless the session has been provided."""
+        logger.info(f'Cache of the API: {self.cache_stats()}')
+        if self._owns_session:
+            self._session.close()
+
+    def cache_stats(self) -> dict:
+        """Returns the requests answered from the cache or not, the answers evicted and the size of the cache."""
+        return self._cache.stats()
+
+    def _playlist(self, data: dict) -> Playlist:
+        return Playlist(self._token, self._session, self._cache, **data)
+
+    def iter_playlists(self) -> Iterator[Playlist]:
+        """Yields the playlists of your library as soon as they're fetched, they're kept once all of them are."""
+        if self._playlists is not None:
+            yield from self._playlists
+            return
+
+        playlists = []
+        params = dict(mine=True, part='snippet')
+        for playlist in Paginator(self._session, self._token, URL_PLAYLISTS, params,
+                                  self._playlist, PLAYLIST_FIELDS, self._cache):
+            playlists.append(playlist)
+            yield playlist
+        self._playlists = playlists
+
     @property
     def playlists(self) -> List[Playlist]:
         if self._playlists is None:
-            params = dict(mine=True, part='snippet')
-            with requests.get(URL_PLAYLISTS, params=params, headers=self._token.headers) as r:
-                data = r.json()
-                self._playlists = [Playlist(self._token, **item) for item in data['items']]
-
-            while data.get('nextPageToken') is not None:
-                params['pageToken'] = data['nextPageToken']
-                with requests.get(URL_PLAYLISTS, params=params, headers=self._token.headers) as r:
-                    data = r.json()
-                    self._playlists.extend(Playlist(self._token, **item) for item in data['items'])
+            self._playlists = list(self.iter_playlists())
 
         return self._playlists
 
@@ -139,8 +191,9 @@ class YoutubeAPI:
 
         :param name: The playlist's name to find.
         :return: The playlist if found, None otherwise.
+        :POST: Only the pages up to the playlist are fetched.
         """
-        for playlist in self.playlists:
+        for playlist in self.iter_playlists():
             if playlist.title.lower() == name.lower():
                 return playlist
 
@@ -162,17 +215,13 @@ class YoutubeAPI:
                 'privacyStatus': ['unlisted', 'private'][private]
             }
         }
-        with requests.post(URL_PLAYLISTS, json=data, params=dict(part='snippet'), headers=self._token.headers) as r:
+        params = dict(part='snippet')
+        with self._session.post(URL_PLAYLISTS, json=data, params=params, headers=self._token.headers) as r:
             # fetch the playlists
-            data = r.json()
-            if not r.ok:
-                logger.error(f"An error occured while fetching playlists: {data}")
-                error = data.get('error', {})
-                errors = ', '.join(e.get('reason') for e in error.get('errors', []))
-                raise RuntimeError(f'{error.get("code", r.status_code)}: {error.get("message", "Unknown")} - {errors}')
-
-            playlist = Playlist(self._token, **data)
-            self.playlists.append(playlist)
+            data = check_answer(r, 'creating a playlist')
+            playlist = self._playlist(data)
+            if self._playlists is not None:
+                self._playlists.append(playlist)
 
         return playlist
 
@@ -199,13 +248,60 @@ class YoutubeAPI:
             }
         }
         params = dict(part='snippet')
-        with requests.post(URL_PLAYLIST_ITEMS, json=data, params=params, headers=self._token.headers) as r:
-            data = r.json()
-            if not r.ok:
-                logger.error(f"An error occured while adding a song: {data}")
-                error = data.get('error', {})
-                errors = ', '.join(e.get('reason') for e in error.get('errors', []))
-                raise RuntimeError(f'{error.get("code", r.status_code)}: {error.get("message", "Unknown")} - {errors}')
-
+        with self._session.post(URL_PLAYLIST_ITEMS, json=data, params=params, headers=self._token.headers) as r:
+            data = check_answer(r, 'adding a song')
             if playlist._songs is not None:
-                playlist._songs.append(PlaylistItem(self._token, **data))
+                playlist._songs.append(PlaylistItem(**data))
+
+    def add_songs(self, playlist: Playlist, songs: List[Tuple[str, Optional[str]]],
+                  **kwargs) -> List[Union[PlaylistItem, Exception]]:
+        """Add songs to a Youtube playlist, several at once.
+
+        :param playlist: The playlist object where the songs will be added.
+        :param songs: The song and its note, for each song. Both an url to a video and its videoId are valid.
+        :param kwargs: The limits of the export, see PlaylistExport.
+        :return: For each song, the song added or the error preventing it:
+                 ValueError if the song is not valid, RuntimeError if there is an error from the YoutubeAPI.
+        :PRE: the playlist must exist on the user's account.
+        :POST: The songs added are at the end of the playlist, in the same order.
+               Will refresh the token if needed
+        """
+        results: List[Union[PlaylistItem, Exception]] = [None] * len(songs)
+        valid = []
+        for i, (song, note) in enumerate(songs):
+            try:
+                valid.append((i, parseVideoId(song), note))
+            except ValueError as e:
+                results[i] = e
+
+        # The token is refreshed here, the threads of the export can't ask the user to authorize the app.
+        self._token.ensure_fresh()
+        export = PlaylistExport(self._session, self._token, playlist.id, URL_PLAYLIST_ITEMS, **kwargs)
+        added = export.run([(video_id, note) for _, video_id, note in valid])
+        logger.info(f'Songs exported: {export.stats()}')
+
+        for (i, _, _), item in zip(valid, added):
+            results[i] = item if isinstance(item, Exception) else PlaylistItem(**item)
+        if playlist._songs is not None:
+            playlist._songs.extend(item for item in results if isinstance(item, PlaylistItem))
+        return results
+
+    def remove_songs(self, playlist: Playlist, songs: List[PlaylistItem], **kwargs) -> List[Optional[Exception]]:
+        """Remove songs from a Youtube playlist, several at once.
+
+        :param playlist: The playlist object where the songs will be removed.
+        :param songs: The songs of the playlist to remove.
+        :param kwargs: The limits of the export, see PlaylistExport.
+        :return: For each song, None if it has been removed or the error preventing it.
+        :PRE: the songs must be in the playlist.
+        :POST: Will refresh the token if needed
+        """
+        self._token.ensure_fresh()
+        export = PlaylistExport(self._session, self._token, playlist.id, URL_PLAYLIST_ITEMS, **kwargs)
+        results = export.remove([song.item_id for song in songs])
+        logger.info(f'Songs removed: {export.stats()}')
+
+        if playlist._songs is not None:
+            removed = {song.item_id for song, error in zip(songs, results) if error is None}
+            playlist._songs = [song for song in playlist._songs if song.item_id not in removed]
+        return results
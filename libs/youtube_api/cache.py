@@ -0,0 +1,123 @@
+"""Cache of the answers of the YouTube API, stored in the database with their ETag.
+
+A request whose answer is stored is sent with If-None-Match, the API answers 304 without the body when nothing
+changed, which doesn't use any quota. The answers unused for a while are evicted, then the least recently used
+ones once the cache is too large.
+"""
+import hashlib
+import json
+import threading
+from typing import Optional, Tuple
+
+import requests
+
+from ..database import DBMuziek
+from .session import check_answer
+
+# The size of the bodies stored, in bytes, and how long an answer stays after its last use, in seconds.
+CACHE_SIZE = 5 * 1024 * 1024
+CACHE_AGE = 7 * 24 * 3600
+
+
+def cache_key(url: str, params: dict) -> str:
+    """Returns the key of a request, the same whatever the order of the parameters."""
+    request = json.dumps([url, sorted((str(key), str(value)) for key, value in params.items())])
+    return hashlib.sha1(request.encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, db: DBMuziek, max_size: int = CACHE_SIZE, max_age: int = CACHE_AGE):
+        """The answers of the API stored in the database.
+
+        :param db: The database storing the answers.
+        :param max_size: The maximum size of the bodies stored, in bytes.
+        :param max_age: The time an answer stays in the cache after its last use, in seconds.
+        """
+        self._db = db
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @classmethod
+    def of(cls, db: DBMuziek) -> 'ResponseCache':
+        """Returns the cache with the limits stored in the settings, yt.cache.size and yt.cache.age."""
+        return cls(db, int(db.get_setting('yt.cache.size', CACHE_SIZE)), int(db.get_setting('yt.cache.age', CACHE_AGE)))
+
+    def prepare(self, url: str, params: dict, headers: dict) -> Tuple[str, Optional[tuple], dict]:
+        """Reads the answer stored for a request, before sending it.
+
+        :param url: The url requested.
+        :param params: The parameters of the request.
+        :param headers: The headers of the request.
+        :PRE: _
+        :POST: Returns the key of the request, the ETag and the body stored (None if nothing is stored)
+               and the headers to send, with If-None-Match if an answer is stored.
+        """
+        key = cache_key(url, params)
+        stored = self._db.get_api_answer(key)
+        if stored is not None:
+            headers = dict(headers, **{'If-None-Match': stored[0]})
+        return key, stored, headers
+
+    def answer(self, key: str, stored: Optional[tuple], r: requests.Response, action: str) -> dict:
+        """Returns the data of the answer to a request prepared, storing it.
+
+        :param key: The key of the request, see prepare.
+        :param stored: The ETag and the body stored, see prepare.
+        :param r: The answer of the API.
+        :param action: What is being done, for the logs.
+        :PRE: The request has been sent with the headers of prepare.
+        :POST: Returns the data of the answer. A new answer is stored if the API gave its ETag.
+        :raises YoutubeAPIError if the API answers an error.
+        """
+        if r.status_code == 304 and stored is not None:
+            self._count(hit=True)
+            self._db.touch_api_answer(key)
+            return json.loads(stored[1])
+
+        data = check_answer(r, action)
+        self._count(hit=False)
+        etag: Optional[str] = r.headers.get('ETag')
+        if etag:
+            self._db.set_api_answer(key, etag, r.text)
+            self.evict()
+        return data
+
+    def get(self, session: requests.Session, url: str, params: dict, headers: dict, action: str) -> dict:
+        """Sends a GET request, the answer stored is used if the API answers it didn't change.
+
+        :param session: The HTTP client.
+        :param url: The url requested.
+        :param params: The parameters of the request.
+        :param headers: The headers of the request.
+        :param action: What is being done, for the logs.
+        :PRE: _
+        :POST: Returns the data of the answer. A new answer is stored if the API gave its ETag.
+        :raises YoutubeAPIError if the API answers an error.
+        """
+        key, stored, headers = self.prepare(url, params, headers)
+        with session.get(url, params=params, headers=headers) as r:
+            return self.answer(key, stored, r, action)
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def evict(self):
+        """Removes the answers unused for too long, then the least recently used ones beyond the size."""
+        evicted = self._db.evict_api_answers(self.max_size, self.max_age) or 0
+        with self._lock:
+            self.evicted += evicted
+
+    def stats(self) -> dict:
+        """Returns the requests answered from the cache or not, the answers evicted and the size of the cache."""
+        count, size = self._db.api_cache_size() or (0, 0)
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evicted': self.evicted, 'answers': count,
+                    'size': size}
@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from ..database import DBMuziek
+from .cache import ResponseCache, cache_key
+from .session import create_session
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        query = dict(parse_qsl(urlparse(self.path).query))
+        self.server.requests += 1
+        etag = f'"v{self.server.version}-{query["page"]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = json.dumps({'page': query['page'], 'version': self.server.version}).encode()
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_cache():
+    assert cache_key('url', {'a': 1, 'b': 2}) == cache_key('url', {'b': 2, 'a': 1})
+    assert cache_key('url', {'a': 1}) != cache_key('url', {'a': 2})
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ETagHandler)
+    server.requests = 0
+    server.version = 1
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/playlists'
+
+    try:
+        with DBMuziek('./temp-api-cache.db') as db, create_session() as session:
+            cache = ResponseCache(db)
+            assert cache.get(session, url, {'page': 1}, {}, 'test') == {'page': '1', 'version': 1}
+            assert cache.stats()['misses'] == 1 and cache.stats()['answers'] == 1
+
+            # The answer didn't change, the one stored is used.
+            assert cache.get(session, url, {'page': 1}, {}, 'test') == {'page': '1', 'version': 1}
+            assert cache.stats()['hits'] == 1
+
+            server.version = 2
+            assert cache.get(session, url, {'page': 1}, {}, 'test') == {'page': '1', 'version': 2}
+            assert cache.get(session, url, {'page': 2}, {}, 'test') == {'page': '2', 'version': 2}
+            stats = cache.stats()
+            assert (stats['hits'], stats['misses'], stats['answers']) == (1, 3, 2)
+            assert server.requests == 4
+
+            # The answers are committed right away, without committing the writes pending of the caller.
+            assert not db.connection.in_transaction
+            db.create_group('Pending', ['A'])
+            assert cache.get(session, url, {'page': 3}, {}, 'test') == {'page': '3', 'version': 2}
+            db.connection.rollback()
+            assert db.get_group('Pending') is None
+            cache.get(session, url, {'page': 2}, {}, 'test')
+            assert not db.connection.in_transaction
+            stats = cache.stats()
+
+            # The answers beyond the size are evicted, the least recently used first.
+            cache.max_size = stats['size'] // 2 + 1
+            cache.get(session, url, {'page': 1}, {}, 'test')
+            cache.evict()
+            assert cache.stats()['answers'] == 1 and cache.stats()['evicted'] == 1
+            assert db.get_api_answer(cache_key(url, {'page': 1})) is not None
+
+            # And the ones unused for too long.
+            cache.max_age = -1
+            cache.evict()
+            assert cache.stats()['answers'] == 0 and cache.stats()['evicted'] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_cache_cleanup():
+    os.remove('./temp-api-cache.db')
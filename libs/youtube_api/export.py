@@ -0,0 +1,277 @@
+"""Concurrent insertion and removal of songs in a YouTube playlist.
+
+The API answers an insertion in a few hundred milliseconds, sending them one after the other makes exporting a large
+playlist slow. The songs are inserted by a few threads sharing the pooled session, each insertion being retried on
+its own when the API is momentarily unavailable or asks to slow down. Every thread waits while the API asks to slow
+down, and the export stops once the daily quota is exceeded.
+
+The insertions finishing in any order, the songs are appended and then moved to their position in the playlist,
+only the songs not already in order are moved.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import requests
+
+from ..downloader.throttle import TokenBucket
+from .oauth2 import Token
+from .session import POOL_SIZE, YoutubeAPIError, check_answer
+
+logger = logging.getLogger('youtube-api.export')
+
+# As many insertions at once as the connections kept open to the API.
+INSERT_WORKERS = POOL_SIZE
+INSERTS_PER_SECOND = 5.0
+INSERT_RETRIES = 4
+BACKOFF_BASE = 1.0
+MAX_BACKOFF = 32.0
+# The quota units used by an insertion or a move, out of the units allowed per day.
+QUOTA_WRITE = 50
+DAILY_QUOTA = 10000
+# The answers worth sending the request again, 409 being answered when the playlist is busy.
+RETRY_STATUSES = (409, 429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'SERVICE_UNAVAILABLE'}
+QUOTA_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+
+
+def ordered_subsequence(indexes: List[int]) -> set:
+    """Returns the longest subsequence of increasing indexes, the songs already in order.
+
+    :param indexes: The indexes of the songs in the order of the playlist.
+    :PRE: The indexes are unique.
+    :POST: Returns the indexes of the subsequence.
+    """
+    tails: List[int] = []
+    previous: Dict[int, Optional[int]] = {}
+    for index in indexes:
+        low, high = 0, len(tails)
+        while low < high:
+            middle = (low + high) // 2
+            if tails[middle] < index:
+                low = middle + 1
+            else:
+                high = middle
+        previous[index] = tails[low - 1] if low > 0 else None
+        if low == len(tails):
+            tails.append(index)
+        else:
+            tails[low] = index
+
+    ordered = set()
+    index = tails[-1] if tails else None
+    while index is not None:
+        ordered.add(index)
+        index = previous[index]
+    return ordered
+
+
+class PlaylistExport:
+    def __init__(self, session: requests.Session, token: Token, playlist_id: str, url: str,
+                 workers: int = INSERT_WORKERS, rate: Optional[float] = INSERTS_PER_SECOND,
+                 retries: int = INSERT_RETRIES):
+        """Inserts songs in a playlist concurrently.
+
+        :param session: The HTTP client.
+        :param token: The token authorizing the requests.
+        :param playlist_id: The id of the playlist.
+        :param url: The url of the playlistItems of the API.
+        :param workers: The maximum amount of requests sent at once.
+        :param rate: The requests sent per second, None for no limit.
+        :param retries: How many times a request refused by the API is sent again.
+        """
+        self._session = session
+        self._token = token
+        self._playlist_id = playlist_id
+        self._url = url
+        self._workers = workers
+        self._retries = retries
+        self._bucket = TokenBucket(rate) if rate else None
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._quota_error: Optional[YoutubeAPIError] = None
+        self.quota_used = 0
+        self.retried = 0
+        self.moved = 0
+
+    def _wait(self):
+        with self._lock:
+            delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if self._bucket:
+            self._bucket.take()
+
+    def _pause(self, attempt: int, retry_after: Optional[str]):
+        delay = BACKOFF_BASE * 2 ** attempt * random.uniform(1, 1.25)
+        if retry_after and retry_after.strip().isdigit():
+            delay = max(delay, float(retry_after))
+        delay = min(delay, MAX_BACKOFF)
+        with self._lock:
+            self.retried += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def _send(self, method: str, data: Optional[dict], action: str, params: Optional[dict] = None) -> dict:
+        """Sends a write request, again while the API asks to wait.
+
+        :param method: The HTTP method.
+        :param data: The playlistItem sent, None for no body.
+        :param action: What is being done, for the logs.
+        :param params: The parameters of the request, the snippet part if None.
+        :PRE: _
+        :POST: Returns the playlistItem answered.
+        :raises YoutubeAPIError if the API refused it, or if the daily quota has been exceeded.
+        """
+        for attempt in range(self._retries + 1):
+            if self._quota_error is not None:
+                raise self._quota_error
+            self._wait()
+
+            with self._lock:
+                self.quota_used += QUOTA_WRITE
+            try:
+                with self._session.request(method, self._url, json=data, params=params or dict(part='snippet'),
+                                           headers=self._token.headers) as r:
+                    return check_answer(r, action)
+            except YoutubeAPIError as e:
+                if e.reasons & QUOTA_REASONS:
+                    self._quota_error = e
+                    raise
+                retryable = e.status in RETRY_STATUSES or e.reasons & RATE_LIMIT_REASONS
+                if not retryable or attempt == self._retries:
+                    raise
+                logger.info(f'The API refused to {action}, trying again: {e}')
+                self._pause(attempt, e.retry_after)
+
+    def insert(self, video_id: str, note: Optional[str] = None) -> dict:
+        """Appends a song to the playlist.
+
+        :param video_id: The id of the video.
+        :param note: The note of the song in the playlist.
+        :PRE: _
+        :POST: Returns the playlistItem added.
+        :raises YoutubeAPIError if the API refused it.
+        """
+        data = {
+            'snippet': {
+                'playlistId': self._playlist_id,
+                'resourceId': {
+                    'kind': 'youtube#video',
+                    'videoId': video_id
+                },
+                'contentDetails': {
+                    'note': note
+                }
+            }
+        }
+        return self._send('POST', data, 'add a song')
+
+    def move(self, item: dict, position: int) -> dict:
+        """Moves a song of the playlist.
+
+        :param item: The playlistItem.
+        :param position: The position it's moved to, from 0.
+        :PRE: _
+        :POST: Returns the playlistItem moved.
+        :raises YoutubeAPIError if the API refused it.
+        """
+        data = {
+            'id': item['id'],
+            'snippet': {
+                'playlistId': self._playlist_id,
+                'resourceId': item['snippet']['resourceId'],
+                'position': position
+            }
+        }
+        return self._send('PUT', data, 'move a song')
+
+    def delete(self, item_id: str):
+        """Removes a song from the playlist.
+
+        :param item_id: The id of the playlistItem.
+        :PRE: _
+        :POST: The song isn't in the playlist anymore.
+        :raises YoutubeAPIError if the API refused it.
+        """
+        self._send('DELETE', None, 'remove a song', dict(id=item_id))
+
+    def _gather(self, task: Callable, arguments: List[tuple]) -> list:
+        with ThreadPoolExecutor(self._workers, thread_name_prefix='yt-export') as executor:
+            futures = [executor.submit(task, *args) for args in arguments]
+
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def remove(self, item_ids: List[str]) -> List[Optional[Exception]]:
+        """Removes songs from the playlist.
+
+        :param item_ids: The ids of the playlistItems.
+        :PRE: The token has been refreshed if needed, the threads don't prompt the user.
+        :POST: Returns, for each song, None if it has been removed or the error preventing it.
+        """
+        return self._gather(self.delete, [(item_id,) for item_id in item_ids])
+
+    def run(self, songs: List[Tuple[str, Optional[str]]]) -> List[Union[dict, Exception]]:
+        """Appends songs to the playlist, in the same order.
+
+        :param songs: The videoId and the note of each song.
+        :PRE: The token has been refreshed if needed, the threads don't prompt the user.
+        :POST: Returns, for each song, the playlistItem added or the error preventing it.
+               The songs added are in the same order at the end of the playlist.
+        """
+        if len(songs) * QUOTA_WRITE > DAILY_QUOTA:
+            logger.warning(f'Adding {len(songs)} songs needs more than the {DAILY_QUOTA} quota units of a day.')
+
+        results: List[Union[dict, Exception]] = self._gather(self.insert, songs)
+        self.reorder([(index, item) for index, item in enumerate(results) if isinstance(item, dict)])
+        return results
+
+    def reorder(self, items: List[Tuple[int, dict]]):
+        """Moves the songs appended out of order.
+
+        :param items: The index of each song added and its playlistItem.
+        :PRE: The songs have been appended, their position is the one answered.
+        :POST: The songs are in the order of their index, after the songs already in the playlist.
+               The songs that can't be moved are left where they are.
+        """
+        if any('position' not in item['snippet'] for _, item in items):
+            logger.warning('The positions of the songs added are unknown, they are left in the order added.')
+            return
+        if not items:
+            return
+
+        playlist = sorted(items, key=lambda song: song[1]['snippet']['position'])
+        start = playlist[0][1]['snippet']['position']
+        order = [index for index, _ in playlist]
+        ordered = ordered_subsequence(order)
+
+        # Each song out of order is moved right after the previous one, which has been placed before it.
+        added = sorted(order)
+        by_index = dict(items)
+        for rank, index in enumerate(added):
+            if index in ordered:
+                continue
+            moved = [song for song in order if song != index]
+            position = moved.index(added[rank - 1]) + 1 if rank > 0 else 0
+            try:
+                self.move(by_index[index], start + position)
+            except YoutubeAPIError as e:
+                logger.error(f'Unable to move a song to its position: {e}')
+                continue
+            moved.insert(position, index)
+            order = moved
+            with self._lock:
+                self.moved += 1
+
+    def stats(self) -> dict:
+        """Returns the quota units used, the requests sent again and the songs moved."""
+        with self._lock:
+            return {'quota': self.quota_used, 'retried': self.retried, 'moved': self.moved}
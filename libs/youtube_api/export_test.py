@@ -0,0 +1,121 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import export as export_module
+from .export import PlaylistExport, ordered_subsequence
+from .session import create_session
+
+
+class FakeToken:
+    headers = {'Authorization': 'Bearer test', 'Accept': 'application/json'}
+
+
+class PlaylistHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def reply(self, status, data, headers=()):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        for header in headers:
+            self.send_header(*header)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def refuse(self, status, reason):
+        self.reply(status, {'error': {'code': status, 'message': reason, 'errors': [{'reason': reason}]}},
+                   [('Retry-After', '0')])
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        video_id = data['snippet']['resourceId']['videoId']
+        server = self.server
+        # Some songs are refused once, or for good.
+        if video_id in server.refusals:
+            return self.refuse(*server.refusals.pop(video_id))
+        if video_id == 'invalid0000':
+            return self.refuse(404, 'videoNotFound')
+
+        # The insertions finish in any order.
+        time.sleep(random.uniform(0, 0.05))
+        with server.lock:
+            item = {'kind': 'youtube#playlistItem', 'id': f'item-{video_id}', 'snippet': {
+                'title': video_id, 'resourceId': data['snippet']['resourceId'], 'position': len(server.items)}}
+            server.items.append(item)
+        self.reply(200, item)
+
+    def do_PUT(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.moves += 1
+            item = next(item for item in server.items if item['id'] == data['id'])
+            server.items.remove(item)
+            server.items.insert(data['snippet']['position'], item)
+        self.reply(200, item)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_ordered_subsequence():
+    assert ordered_subsequence([]) == set()
+    assert ordered_subsequence([0, 1, 2]) == {0, 1, 2}
+    assert ordered_subsequence([4, 0, 1, 5, 2, 3]) == {0, 1, 2, 3}
+    assert len(ordered_subsequence([3, 2, 1, 0])) == 1
+
+
+def test_export(monkeypatch):
+    monkeypatch.setattr(export_module, 'BACKOFF_BASE', 0.01)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PlaylistHandler)
+    server.lock = threading.Lock()
+    server.items = [{'kind': 'youtube#playlistItem', 'id': 'existing', 'snippet': {'position': 0}}]
+    server.moves = 0
+    server.refusals = {'song0000003': (503, 'backendError'), 'song0000007': (403, 'rateLimitExceeded')}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/playlistItems'
+
+    songs = [(f'song{i:07}', f'note {i}') for i in range(12)]
+    songs.insert(5, ('invalid0000', None))
+    try:
+        with create_session() as session:
+            export = PlaylistExport(session, FakeToken(), 'playlist', url, workers=4, rate=None)
+            results = export.run(songs)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Every song is added after the songs already there, in order, except the one refused.
+    assert isinstance(results[5], RuntimeError) and '404' in str(results[5])
+    assert [item['id'] for item in results if isinstance(item, dict)] == [f'item-song{i:07}' for i in range(12)]
+    assert [item['id'] for item in server.items] == ['existing'] + [f'item-song{i:07}' for i in range(12)]
+    stats = export.stats()
+    assert stats['retried'] == 2
+    assert stats['moved'] == server.moves
+    assert stats['quota'] == 50 * (len(songs) + 2 + server.moves)
+
+
+def test_export_quota():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PlaylistHandler)
+    server.lock = threading.Lock()
+    server.items = []
+    server.moves = 0
+    server.refusals = {'song0000000': (403, 'quotaExceeded')}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/playlistItems'
+
+    try:
+        with create_session() as session:
+            export = PlaylistExport(session, FakeToken(), 'playlist', url, workers=1, rate=None)
+            results = export.run([(f'song{i:07}', None) for i in range(3)])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Nothing is sent once the quota of the day is used.
+    assert all(isinstance(result, RuntimeError) and 'quotaExceeded' in str(result) for result in results)
+    assert server.items == []
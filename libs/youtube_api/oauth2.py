@@ -1,10 +1,11 @@
 import logging
 import os
+import threading
 import time
 import webbrowser
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from typing import Union
+from typing import Optional, Union
 from urllib.parse import parse_qsl, urlencode, urlparse
 
 import requests
@@ -107,8 +108,10 @@ class CallbackServer(ThreadingHTTPServer):
 
 
 class Token:
-    def __init__(self, db: DBMuziek):
+    def __init__(self, db: DBMuziek, session: Optional[requests.Session] = None):
         self._database = db
+        self._session = session or requests.Session()
+        self._lock = threading.Lock()
         self._oauth_code = db.get_setting('yt.oauth2.code')
         self._access_token = db.get_setting('yt.oauth2.access')
         self._refresh_token = db.get_setting('yt.oauth2.refresh')
@@ -162,7 +165,7 @@ class Token:
             data['refresh_token'] = self._refresh_token
 
         logger.info('Refreshing access token')
-        with requests.post(URL_REFRESH_TOKEN, data=data) as r:
+        with self._session.post(URL_REFRESH_TOKEN, data=data) as r:
             data = r.json()
             if 'error' in data:
                 logger.debug(f'Could not get a new token. Reason: {data["error"]}.')
@@ -183,11 +186,20 @@ class Token:
 
         logger.info('Token refreshed')
 
+    def ensure_fresh(self):
+        """Refreshes the token if it's about to expire, asking the user to authorize the app if needed.
+
+        :PRE: _
+        :POST: The token can be used without refreshing it, by other threads for example.
+        """
+        # The requests sent at once wait for a single refresh.
+        with self._lock:
+            if self.needs_refresh:
+                self.refresh()
+
     @property
     def headers(self):
-        if self.needs_refresh:
-            self.refresh()
-
+        self.ensure_fresh()
         return {
             'Authorization': f'Bearer {self._access_token}',
             'Accept': 'application/json'
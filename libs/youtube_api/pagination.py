@@ -0,0 +1,78 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Generic, Iterator, Optional, Tuple, TypeVar
+
+import requests
+
+from .cache import ResponseCache
+from .oauth2 import Token
+from .session import check_answer
+
+T = TypeVar('T')
+
+# The most items the API answers in a page.
+PAGE_SIZE = 50
+# The parts of the answers used, the rest isn't sent by the API.
+PLAYLIST_FIELDS = 'nextPageToken,items(kind,id,snippet(title,description,channelTitle))'
+PLAYLIST_ITEM_FIELDS = 'nextPageToken,items(kind,id,snippet(title,resourceId/videoId))'
+
+
+class Paginator(Generic[T]):
+    def __init__(self, session: requests.Session, token: Token, url: str, params: dict,
+                 item: Callable[[dict], T], fields: Optional[str] = None, cache: Optional[ResponseCache] = None):
+        """The items of a list of the API, fetched page by page while they're used.
+
+        :param session: The HTTP client.
+        :param token: The token authorizing the requests.
+        :param url: The url of the list.
+        :param params: The parameters of the request, without the page.
+        :param item: Creates an item from its data.
+        :param fields: The fields of the answer used, every field if None.
+        :param cache: The answers stored, the pages which didn't change aren't sent again. No cache if None.
+        """
+        self._session = session
+        self._token = token
+        self._url = url
+        self._params = dict(params, maxResults=PAGE_SIZE)
+        if fields is not None:
+            self._params['fields'] = fields
+        self._item = item
+        self._cache = cache
+        self.pages = 0
+
+    def _request(self, params: dict, headers: dict) -> requests.Response:
+        # Only sends the request: the cache uses the database, whose connections belong to the thread iterating.
+        with self._session.get(self._url, params=params, headers=headers) as r:
+            return r
+
+    def _submit(self, executor: ThreadPoolExecutor, params: dict) -> Tuple[Optional[str], Optional[tuple], Future]:
+        self.pages += 1
+        # The headers are read here so the token is never refreshed by the thread prefetching.
+        key, stored, headers = None, None, self._token.headers
+        if self._cache is not None:
+            key, stored, headers = self._cache.prepare(self._url, params, headers)
+        return key, stored, executor.submit(self._request, params, headers)
+
+    def _answer(self, key: Optional[str], stored: Optional[tuple], page: Future) -> dict:
+        if self._cache is not None:
+            return self._cache.answer(key, stored, page.result(), 'fetching a page')
+        return check_answer(page.result(), 'fetching a page')
+
+    def __iter__(self) -> Iterator[T]:
+        """Yields the items as soon as their page arrives.
+
+        :PRE: _
+        :POST: The next page is requested as soon as a page arrives, while its items are used.
+               Will refresh the token and use the cache if needed, in the thread iterating.
+        :raises YoutubeAPIError if the API answers an error.
+        """
+        with ThreadPoolExecutor(1, thread_name_prefix='yt-pages') as executor:
+            page = self._submit(executor, self._params)
+            while page is not None:
+                data = self._answer(*page)
+                token = data.get('nextPageToken')
+                page = None
+                if token:
+                    page = self._submit(executor, dict(self._params, pageToken=token))
+
+                for item in data.get('items', []):
+                    yield self._item(item)
@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from ..database import DBMuziek
+from . import Playlist
+from .cache import ResponseCache
+from .pagination import PLAYLIST_ITEM_FIELDS, Paginator
+from .session import create_session
+
+PAGES = 3
+
+
+class FakeToken:
+    headers = {'Authorization': 'Bearer test', 'Accept': 'application/json'}
+
+
+class PagesHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        query = dict(parse_qsl(urlparse(self.path).query))
+        self.server.requests.append(query)
+        page = int(query.get('pageToken', 0))
+        data = {'items': [{'kind': 'youtube#playlistItem', 'snippet': {
+            'title': f'Song {page}-{i}', 'resourceId': {'videoId': f'video{page}-{i:04}'}}} for i in range(2)]}
+        if page + 1 < PAGES:
+            data['nextPageToken'] = str(page + 1)
+
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_paginator(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PagesHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/playlistItems'
+    monkeypatch.setattr(sys.modules[Playlist.__module__], 'URL_PLAYLIST_ITEMS', url)
+
+    try:
+        with create_session() as session:
+            # The first item is yielded before the last pages are fetched.
+            pages = Paginator(session, FakeToken(), url, {'playlistId': 'list'}, lambda item: item['snippet']['title'],
+                              PLAYLIST_ITEM_FIELDS)
+            songs = iter(pages)
+            assert next(songs) == 'Song 0-0'
+            assert len(server.requests) <= 2
+            assert list(songs) == ['Song 0-1', 'Song 1-0', 'Song 1-1', 'Song 2-0', 'Song 2-1']
+            assert pages.pages == PAGES
+            assert all(query['fields'] == PLAYLIST_ITEM_FIELDS and query['maxResults'] == '50'
+                       for query in server.requests)
+
+            # Every page is kept, the songs are fetched once.
+            server.requests.clear()
+            playlist = Playlist(FakeToken(), session, kind='youtube#playlist', id='list',
+                                snippet={'title': 'list', 'description': '', 'channelTitle': 'me'})
+            assert [song.id for song in playlist.songs] == [f'video{p}-{i:04}' for p in range(PAGES) for i in range(2)]
+            assert len(list(playlist.iter_songs())) == 2 * PAGES
+            assert len(server.requests) == PAGES
+
+        # The cache is only used by the thread iterating, the thread prefetching never opens a connection.
+        with DBMuziek('./temp-yt-pages.db') as db, create_session() as session:
+            pages = Paginator(session, FakeToken(), url, {'playlistId': 'list'}, lambda item: item['snippet']['title'],
+                              PLAYLIST_ITEM_FIELDS, ResponseCache(db))
+            assert len(list(pages)) == 2 * PAGES
+            assert len(db._pool._connections) == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_paginator_cleanup():
+    os.remove('./temp-yt-pages.db')
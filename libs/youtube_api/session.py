@@ -0,0 +1,90 @@
+from typing import Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..__version__ import __title__, __version__
+from ..logger import get_logger
+
+logger = get_logger('youtube-api')
+
+# The connections kept open by host, the requests beyond wait for one of them.
+POOL_SIZE = 4
+# The hosts whose connections are kept: the API, the OAuth2 server and a spare one.
+POOL_HOSTS = 3
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+# The statuses worth retrying, the API being momentarily unavailable or asking to slow down.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def create_session(pool_size: int = POOL_SIZE, retries: int = RETRIES,
+                   retry_statuses: Iterable[int] = RETRY_STATUSES) -> requests.Session:
+    """Creates the HTTP client used for every request to Google, its connections are kept alive and reused.
+
+    :param pool_size: The maximum amount of connections open to a host.
+    :param retries: How many times a request failing because of the network or the server is sent again.
+    :param retry_statuses: The statuses of the answers retried, only for the requests safe to send twice.
+    :return: The session, to be closed once it isn't needed anymore.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=tuple(retry_statuses),
+        # A POST could be applied twice, it's only sent again if it didn't reach the server.
+        allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Google only compresses the answers of the clients whose user agent contains "gzip".
+    session.headers.update({
+        "Accept-Encoding": "gzip",
+        "User-Agent": f"{__title__}/{__version__} (gzip)"
+    })
+    return session
+
+
+class YoutubeAPIError(RuntimeError):
+    def __init__(self, status: int, message: str, reasons: Iterable[str] = (), retry_after: Optional[str] = None):
+        """An error answered by the API.
+
+        :param status: The HTTP status of the answer.
+        :param message: The message of the error.
+        :param reasons: The reasons of the errors, like "quotaExceeded".
+        :param retry_after: The Retry-After header of the answer, in seconds.
+        """
+        self.status = status
+        reasons = list(reasons)
+        self.reasons = set(reasons)
+        self.retry_after = retry_after
+        super().__init__(f'{status}: {message} - {", ".join(reasons)}')
+
+
+def check_answer(r: requests.Response, action: str) -> dict:
+    """Returns the data of an answer of the API.
+
+    :param r: The answer.
+    :param action: What was being done, for the logs.
+    :PRE: _
+    :POST: Returns the data of the answer.
+    :raises YoutubeAPIError if the API answered an error.
+    """
+    try:
+        data = r.json()
+    except ValueError:
+        data = {}
+    if not r.ok:
+        logger.error(f"An error occured while {action}: {data}")
+        error = data.get('error', {})
+        if not isinstance(error, dict):
+            error = {'message': error}
+        reasons = [e.get('reason', '') for e in error.get('errors', [])]
+        raise YoutubeAPIError(error.get('code', r.status_code), error.get('message', 'Unknown'), reasons,
+                              r.headers.get('Retry-After'))
+    return data
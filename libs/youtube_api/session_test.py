@@ -0,0 +1,45 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .session import create_session
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.server.requests += 1
+        # The first request fails, like an API momentarily unavailable.
+        status = 503 if self.server.requests == 1 else 200
+        body = b'{"items": []}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_session():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    server.connections = set()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/playlists"
+
+    try:
+        with create_session() as session:
+            assert "gzip" in session.headers["User-Agent"]
+            for _ in range(20):
+                with session.get(url) as r:
+                    assert r.json() == {"items": []}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # The failed request has been retried, and every request went through the same connection.
+    assert server.requests == 21
+    assert len(server.connections) == 1
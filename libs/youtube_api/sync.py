@@ -0,0 +1,154 @@
+"""Two-way sync of a local playlist with a YouTube playlist.
+
+The songs are compared by video, the videos synced the last time are stored in the database. A video in only one of
+the playlists has either been added there since, or removed from the other one if it was synced: comparing both
+playlists with the last sync tells which, and only those changes are applied on the other side.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..database import DBMuziek, name_key
+from . import Playlist, PlaylistItem, YoutubeAPI, parseVideoId
+
+# The genre of the songs created from a YouTube playlist, the sync doesn't ask the user.
+DEFAULT_GENRE = 'Unknown'
+
+
+def plan_sync(local: List[str], remote: List[str], synced: Iterable[str]) -> Dict[str, List[str]]:
+    """Compares both playlists with the last sync.
+
+    :param local: The videos of the local playlist.
+    :param remote: The videos of the YouTube playlist.
+    :param synced: The videos in both playlists after the last sync.
+    :PRE: _
+    :POST: Returns the videos, in the order of their playlist:
+           upload: added locally, remove_remote: removed locally,
+           download: added on YouTube, remove_local: removed on YouTube,
+           kept: in both playlists, forgotten: removed from both playlists.
+    """
+    synced = set(synced)
+    local_set, remote_set = set(local), set(remote)
+    return {
+        'upload': [video for video in local if video not in remote_set and video not in synced],
+        'remove_remote': [video for video in remote if video not in local_set and video in synced],
+        'download': [video for video in remote if video not in local_set and video not in synced],
+        'remove_local': [video for video in local if video not in remote_set and video in synced],
+        'kept': [video for video in local if video in remote_set],
+        'forgotten': [video for video in synced if video not in local_set and video not in remote_set],
+    }
+
+
+def create_songs(db: DBMuziek, items: List[PlaylistItem], song_info: Callable[[str], Tuple[str, str]],
+                 playlist_songs: Optional[Dict[str, int]] = None) -> List[int]:
+    """Returns the local songs of videos, the ones missing are created. Doesn't commit the transaction.
+
+    :param db: The database used.
+    :param items: The songs of the YouTube playlist.
+    :param song_info: Returns the author and the title of a song from the title of its video.
+    :param playlist_songs: The song of each video already in the local playlist, used before the other songs.
+    :PRE: The database object needs to be connected.
+    :POST: Returns the id of the song of each video, in the same order.
+    """
+    songs = {}
+    for song_id, link in db.get_songs_links() or []:
+        try:
+            songs.setdefault(parseVideoId(link), song_id)
+        except (ValueError, TypeError):
+            continue
+    songs.update(playlist_songs or {})
+
+    missing = list({item.id: item for item in items if item.id not in songs}.values())
+    if missing:
+        infos = [song_info(item.title) for item in missing]
+        group_ids = db.bulk_create_groups((author, [author]) for author, _ in infos)
+        song_ids = db.bulk_create_songs([{
+            "name": title,
+            "link": item.url,
+            "genre": DEFAULT_GENRE,
+            "duration": None,
+            "group_id": group_ids[name_key(author)],
+            "featuring": []
+        } for item, (author, title) in zip(missing, infos)])
+        songs.update((item.id, song_id) for item, song_id in zip(missing, song_ids))
+
+    return [songs[item.id] for item in items]
+
+
+def sync_playlist(db: DBMuziek, yt: YoutubeAPI, playlist_id: int, playlist: Playlist,
+                  song_info: Callable[[str], Tuple[str, str]]) -> dict:
+    """Applies the changes of each playlist since the last sync to the other one.
+
+    :param db: The database used.
+    :param yt: The client of the API.
+    :param playlist_id: The id of the local playlist.
+    :param playlist: The YouTube playlist.
+    :param song_info: Returns the author and the title of a song from the title of its video.
+    :PRE: The database object needs to be connected, both playlists need to exist.
+    :POST: Both playlists have the same videos, except the ones that couldn't be changed,
+           they'll be tried again the next time. The local songs without a valid link are left alone.
+           A change of a video is applied to every song of the playlist with this video, on both sides.
+           Returns the amount of songs uploaded, downloaded, removed from each side, and the errors by song.
+    """
+    yt_playlist_id, synced = db.get_sync_state(playlist_id)
+    reset = yt_playlist_id != playlist.id
+    if reset:
+        synced = {}
+
+    local: Dict[str, List[dict]] = {}
+    invalid = []
+    for song in db.get_playlist_songs(playlist_id):
+        try:
+            local.setdefault(parseVideoId(song['link'] or ''), []).append(song)
+        except ValueError:
+            invalid.append(song['song_name'])
+
+    remote: Dict[str, List[PlaylistItem]] = {}
+    for item in playlist.iter_songs():
+        remote.setdefault(item.id, []).append(item)
+
+    plan = plan_sync(list(local), list(remote), synced)
+    report = {'uploaded': 0, 'downloaded': 0, 'removed_remote': 0, 'removed_local': 0, 'invalid': invalid,
+              'errors': []}
+    changed = {video: remote[video][0].item_id for video in plan['kept']
+               if synced.get(video) not in {item.item_id for item in remote[video]}}
+    removed = set(plan['forgotten'])
+
+    if plan['remove_remote']:
+        items = [item for video in plan['remove_remote'] for item in remote[video]]
+        errors = yt.remove_songs(playlist, items)
+        failed = set()
+        for item, error in zip(items, errors):
+            if error is None:
+                report['removed_remote'] += 1
+            else:
+                failed.add(item.id)
+                report['errors'].append((item.title, error))
+        # A video is only forgotten once every song with it is removed, the others are tried again.
+        removed.update(video for video in plan['remove_remote'] if video not in failed)
+
+    if plan['upload']:
+        songs = [(video, song) for video in plan['upload'] for song in local[video]]
+        results = yt.add_songs(playlist, [(video, f"{song['group_name']} - {song['song_name']}")
+                                          for video, song in songs])
+        for (video, song), result in zip(songs, results):
+            if isinstance(result, PlaylistItem):
+                changed.setdefault(video, result.item_id)
+                report['uploaded'] += 1
+            else:
+                report['errors'].append((song['song_name'], result))
+
+    with db.connection:
+        unlinked = [song['song_id'] for video in plan['remove_local'] for song in local[video]]
+        db.bulk_unlink_playlist(playlist_id, unlinked)
+        removed.update(plan['remove_local'])
+        report['removed_local'] = len(unlinked)
+
+        if plan['download']:
+            items = [item for video in plan['download'] for item in remote[video]]
+            playlist_songs = {video: songs[0]['song_id'] for video, songs in local.items()}
+            db.bulk_link_playlist(playlist_id, create_songs(db, items, song_info, playlist_songs))
+            changed.update((video, remote[video][0].item_id) for video in plan['download'])
+            report['downloaded'] = len(items)
+
+        db.update_sync_state(playlist_id, playlist.id, changed, removed, reset)
+
+    return report
@@ -0,0 +1,202 @@
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from ..database import DBMuziek
+from . import YoutubeAPI
+from .sync import plan_sync, sync_playlist
+
+
+def split_title(title):
+    author, name = title.split(' - ')
+    return author, name
+
+
+class PlaylistHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def reply(self, status, data=None):
+        body = b'' if data is None else json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.reply(200, {'items': list(self.server.items)})
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        video_id = data['snippet']['resourceId']['videoId']
+        with self.server.lock:
+            self.server.writes.append(('POST', video_id))
+            item = self.server.add(video_id, f'Artist - Song {video_id[0]}')
+            item = dict(item, snippet=dict(item['snippet'], position=len(self.server.items) - 1))
+        self.reply(200, item)
+
+    def do_DELETE(self):
+        item_id = dict(parse_qsl(urlparse(self.path).query))['id']
+        with self.server.lock:
+            self.server.writes.append(('DELETE', item_id))
+            self.server.items = [item for item in self.server.items if item['id'] != item_id]
+        self.reply(204)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PlaylistServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), PlaylistHandler)
+        self.lock = threading.Lock()
+        self.items = []
+        self.writes = []
+        self.ids = itertools.count()
+
+    def add(self, video_id, title):
+        item = {'kind': 'youtube#playlistItem', 'id': f'item-{video_id}-{next(self.ids)}',
+                'snippet': {'title': title, 'resourceId': {'kind': 'youtube#video', 'videoId': video_id}}}
+        self.items.append(item)
+        return item
+
+    def videos(self):
+        return {item['snippet']['resourceId']['videoId'] for item in self.items}
+
+
+def video(letter):
+    return letter * 11
+
+
+def local_videos(db, playlist_id):
+    return {urlparse(song['link']).query[2:] for song in db.get_playlist_songs(playlist_id)}
+
+
+def test_plan_sync():
+    plan = plan_sync(['a', 'b', 'c', 'e'], ['b', 'c', 'd', 'f'], ['a', 'b', 'd', 'g'])
+    assert plan == {
+        'upload': ['e'],
+        'remove_remote': ['d'],
+        'download': ['f'],
+        'remove_local': ['a'],
+        'kept': ['b', 'c'],
+        'forgotten': ['g'],
+    }
+
+
+def test_sync(monkeypatch):
+    server = PlaylistServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(sys.modules[YoutubeAPI.__module__], 'URL_PLAYLIST_ITEMS',
+                        f'http://127.0.0.1:{server.server_address[1]}/playlistItems')
+
+    try:
+        with DBMuziek('./temp-sync.db') as db:
+            for key, value in (('code', 'code'), ('access', 'token'), ('expires_in', 3600),
+                               ('expires_at', time.time() + 3600)):
+                db.set_setting(f'yt.oauth2.{key}', value)
+            group_id = db.create_group('Artist', ['Artist'])
+            songs = {letter: db.create_song(f'Song {letter}', f'https://www.youtube.com/watch?v={video(letter)}',
+                                            'pop', None, group_id, []) for letter in 'ab'}
+            playlist_id = db.create_playlist('mix', 'me')
+            db.bulk_link_playlist(playlist_id, songs.values())
+            db.commit()
+            server.add(video('c'), 'Émile - Song c')
+            server.add(video('b'), 'Artist - Song b')
+
+            with YoutubeAPI(db) as yt:
+                playlist = yt._playlist({'kind': 'youtube#playlist', 'id': 'mix', 'snippet': {
+                    'title': 'mix', 'description': '', 'channelTitle': 'me'}})
+
+                # The first sync merges both playlists.
+                report = sync_playlist(db, yt, playlist_id, playlist, split_title)
+                assert (report['uploaded'], report['downloaded']) == (1, 1)
+                assert server.videos() == local_videos(db, playlist_id) == {video('a'), video('b'), video('c')}
+                assert db.get_group('Émile') is not None
+                assert set(db.get_sync_state(playlist_id)[1]) == {video('a'), video('b'), video('c')}
+
+                # Only the changes since are applied.
+                db.bulk_unlink_playlist(playlist_id, [songs['b']])
+                db.commit()
+                server.items = [item for item in server.items if item['snippet']['resourceId']['videoId'] != video('c')]
+                server.add(video('d'), 'Artist - Song d')
+                server.writes.clear()
+                playlist._songs = None
+
+                report = sync_playlist(db, yt, playlist_id, playlist, split_title)
+                assert (report['removed_remote'], report['removed_local'], report['downloaded']) == (1, 1, 1)
+                assert [method for method, _ in server.writes] == ['DELETE']
+                assert server.videos() == local_videos(db, playlist_id) == {video('a'), video('d')}
+
+                # Nothing changed.
+                server.writes.clear()
+                playlist._songs = None
+                report = sync_playlist(db, yt, playlist_id, playlist, split_title)
+                assert report['uploaded'] == report['downloaded'] == 0
+                assert report['removed_remote'] == report['removed_local'] == 0
+                assert server.writes == []
+                assert set(db.get_sync_state(playlist_id)[1]) == {video('a'), video('d')}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_sync_duplicates(monkeypatch):
+    server = PlaylistServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(sys.modules[YoutubeAPI.__module__], 'URL_PLAYLIST_ITEMS',
+                        f'http://127.0.0.1:{server.server_address[1]}/playlistItems')
+
+    try:
+        with DBMuziek('./temp-sync-duplicates.db') as db:
+            for key, value in (('code', 'code'), ('access', 'token'), ('expires_in', 3600),
+                               ('expires_at', time.time() + 3600)):
+                db.set_setting(f'yt.oauth2.{key}', value)
+            group_id = db.create_group('Artist', ['Artist'])
+            # Two local songs share the video a, the video b is twice in the YouTube playlist.
+            songs = [db.create_song(name, f'https://www.youtube.com/watch?v={video("a")}', 'pop', None, group_id, [])
+                     for name in ('Song a', 'Song a (live)')]
+            playlist_id = db.create_playlist('mix', 'me')
+            db.bulk_link_playlist(playlist_id, songs)
+            db.commit()
+            server.add(video('b'), 'Artist - Song b')
+            server.add(video('b'), 'Artist - Song b')
+
+            with YoutubeAPI(db) as yt:
+                playlist = yt._playlist({'kind': 'youtube#playlist', 'id': 'mix', 'snippet': {
+                    'title': 'mix', 'description': '', 'channelTitle': 'me'}})
+                report = sync_playlist(db, yt, playlist_id, playlist, split_title)
+                assert (report['uploaded'], report['downloaded']) == (2, 2)
+                assert len(db.get_playlist_songs(playlist_id)) == 3
+
+                # Every song with a video removed on the other side is removed.
+                db.bulk_unlink_playlist(playlist_id, [song['song_id'] for song in db.get_playlist_songs(playlist_id)
+                                                      if song['song_name'] == 'Song b'])
+                db.commit()
+                server.items = [item for item in server.items if item['snippet']['resourceId']['videoId'] != video('a')]
+                playlist._songs = None
+                report = sync_playlist(db, yt, playlist_id, playlist, split_title)
+                assert (report['removed_remote'], report['removed_local']) == (2, 2)
+                assert server.videos() == local_videos(db, playlist_id) == set()
+
+                # Nothing is uploaded or removed again.
+                server.writes.clear()
+                playlist._songs = None
+                report = sync_playlist(db, yt, playlist_id, playlist, split_title)
+                assert report['uploaded'] == report['removed_remote'] == report['removed_local'] == 0
+                assert server.writes == []
+                assert db.get_sync_state(playlist_id)[1] == {}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_sync_cleanup():
+    os.remove('./temp-sync.db')
+    os.remove('./temp-sync-duplicates.db')
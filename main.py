@@ -1,23 +1,27 @@
 """Keep your music organized.
 
 Usage:
-  muziek [-d <PATH>]
-  muziek [-d <PATH>] add (song | group | album)
-  muziek [-d <PATH>] playlist <name> [-D | -e | -i | -s <song>...]
-  muziek [-d <PATH>] list songs [-g <genre>] [-n <name>] [-G group]
-  muziek [-d <PATH>] list group <name>
-  muziek [-d <PATH>] list album <name>
-  muziek [-d <PATH>] list (playlists | groups | albums)
-  muziek [-d <PATH>] download song <name>
-  muziek [-d <PATH>] youtube list [<name>]
-  muziek [-d <PATH>] youtube import <name>
-  muziek [-d <PATH>] youtube export <name>
+  muziek [-d <PATH>] [-p <profile>]
+  muziek [-d <PATH>] [-p <profile>] add (song | group | album) [--refresh]
+  muziek [-d <PATH>] [-p <profile>] playlist <name> [-D [--refresh] | -e | -i | -s <song>...]
+  muziek [-d <PATH>] [-p <profile>] list songs [-g <genre>] [-n <name>] [-G group]
+  muziek [-d <PATH>] [-p <profile>] list group <name>
+  muziek [-d <PATH>] [-p <profile>] list album <name>
+  muziek [-d <PATH>] [-p <profile>] list (playlists | groups | albums)
+  muziek [-d <PATH>] [-p <profile>] download song <name> [--refresh]
+  muziek [-d <PATH>] [-p <profile>] downloads (verify | space)
+  muziek [-d <PATH>] [-p <profile>] retag --all
+  muziek [-d <PATH>] [-p <profile>] youtube list [<name>]
+  muziek [-d <PATH>] [-p <profile>] youtube import <name>
+  muziek [-d <PATH>] [-p <profile>] youtube export <name>
+  muziek [-d <PATH>] [-p <profile>] youtube sync <name>
   muziek -h | --help
   muziek --version
 
 Options:
   -h --help             Show this screen.
   -d --database <PATH>  Path to the local storage [default: muziek.db].
+  -p --profile <profile>  Connection profile (default, performance or safe), remembered by the database.
   -s --song <song>      Song(s) to add to the playlist.
   -D --download         Download all the songs included in the playlist.
   -e --export           Exports the playlist.
@@ -25,6 +29,8 @@ Options:
   -g --genre <genre>    Filter the songs listed based on the genre.
   -G --group <group>    Filter the songs listed based on the group's name.
   -n --name <name>      Filter the songs listed based on the song's name.
+  --refresh             Fetch the videos information again instead of reading it from the cache.
+  --all                 Write the tags of every song downloaded.
   --version             Show version.
 """
 
@@ -32,7 +38,7 @@ import docopt
 
 from libs import __version__
 from libs import console_interface as cli
-from libs.database import DBMuziek
+from libs.database import PROFILES, DBMuziek
 from libs.logger import setup_logger
 
 if __name__ == "__main__":
@@ -41,11 +47,14 @@ if __name__ == "__main__":
     args = docopt.docopt(__doc__, version=__version__)
     filters = {k.lstrip('-'): v for k, v in args.items() if k.startswith('--')}
 
-    with DBMuziek(args['--database']) as db:
+    if args['--profile'] is not None and args['--profile'] not in PROFILES:
+        exit(f"Unknown profile {args['--profile']!r}, expected one of: {', '.join(PROFILES)}.")
+
+    with DBMuziek(args['--database'], args['--profile']) as db:
         try:
             if args['add']:
                 if args['song']:
-                    cli.add_song(db)
+                    cli.add_song(db, refresh=args['--refresh'])
                 elif args['group']:
                     cli.add_group(db)
                 elif args['album']:
@@ -58,6 +67,8 @@ if __name__ == "__main__":
                     cli.import_from_yt(db, args['<name>'])
                 elif args['export']:
                     cli.export_to_yt(db, args['<name>'])
+                elif args['sync']:
+                    cli.sync_yt_playlist(db, args['<name>'])
 
             elif args['list']:
                 if args['songs']:
@@ -75,7 +86,7 @@ if __name__ == "__main__":
 
             elif args['playlist']:
                 if args['--download']:
-                    cli.download_playlist(db, args["<name>"])
+                    cli.download_playlist(db, args["<name>"], args['--refresh'])
                 if args['--import']:
                     cli.import_playlist(db, args['<name>'])
                 elif args['--export']:
@@ -85,9 +96,18 @@ if __name__ == "__main__":
                 else:
                     cli.add_song_playlist(db, args['<name>'], args['--song'])
 
+            elif args['downloads']:
+                if args['verify']:
+                    cli.verify_downloads(db)
+                elif args['space']:
+                    cli.downloads_space(db)
+
+            elif args['retag']:
+                cli.retag_songs(db)
+
             elif args['download']:
                 if args['song']:
-                    cli.download_song(db, args['<name>'])
+                    cli.download_song(db, args['<name>'], refresh=args['--refresh'])
 
             else:
                 from libs import graphical_interface as gui